@@ -0,0 +1,115 @@
+# benchmarks/api_throughput.py
+# Thông lượng /cameras và /camera-files khi nhiều request đồng thời, gọi thẳng app FastAPI
+# trong tiến trình (httpx.ASGITransport, không chạy sự kiện startup nên không mở camera).
+# Mặc định MongoDB là bản giả lập trong tiến trình (benchmarks/mongo_standin.py) với độ trễ
+# mỗi thao tác --latency; --mongo-uri thì đo với server thật (dữ liệu mẫu ghi vào DB --db-name).
+# Chạy cùng lệnh trên hai commit để so trước / sau.
+#   cd be && python -m benchmarks.api_throughput --concurrency 200 --requests 2000 --latency 0.005
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+
+def seed(database, cameras: int, clips: int):
+    for name in ("cameras", "rooms", "clips"):
+        database[name].delete_many({})
+    room_id = database["rooms"].insert_one({"name": "bench room"}).inserted_id
+    camera_ids = database["cameras"].insert_many([
+        {"url": f"rtsp://10.0.0.{i % 250 + 1}:554/stream{i}", "room_id": room_id} for i in range(cameras)
+    ]).inserted_ids
+    now = datetime.now()
+    database["clips"].insert_many([{
+        "camera_id": camera_ids[0],
+        "room_id": str(room_id),
+        "video_path": f"data/output/bench/clip_{i}.avi",
+        "started_at": now - timedelta(seconds=30 * i),
+        "ended_at": now - timedelta(seconds=30 * i - 20),
+        "triggers": ["weapon"] if i % 3 == 0 else ["person_at_door"],
+        "duration": 20.0,
+        "frame_count": 500,
+    } for i in range(clips)])
+    return str(camera_ids[0])
+
+
+async def run(app, path: str, requests: int, concurrency: int):
+    import httpx
+
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        await one()  # làm nóng (tạo client, pool)
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "req_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005, help="giây chờ mỗi thao tác của MongoDB giả lập")
+    parser.add_argument("--cameras", type=int, default=50)
+    # Server thật đọc đúng một trang theo index (camera_id, started_at, _id); mongomock thì quét và
+    # sắp xếp cả collection trong tiến trình này, nên mặc định chỉ gieo hơn một trang một chút
+    parser.add_argument("--clips", type=int, default=60)
+    parser.add_argument("--limit", type=int, default=50, help="số clip mỗi trang /camera-files")
+    parser.add_argument("--mongo-uri", default=None, help="đo với MongoDB thật thay vì bản giả lập")
+    parser.add_argument("--db-name", default="surveillance_bench")
+    args = parser.parse_args()
+
+    import config
+    if args.mongo_uri:
+        import pymongo
+        config.MONGO_URI = args.mongo_uri
+        config.DB_NAME = args.db_name
+        database = pymongo.MongoClient(args.mongo_uri)[args.db_name]
+    else:
+        from benchmarks.mongo_standin import install
+        database = install(args.latency)[config.DB_NAME]
+    camera_id = seed(database, args.cameras, args.clips)
+
+    from main import app
+
+    print(f"{args.requests} request, {args.concurrency} đồng thời, "
+          f"{'MongoDB ' + args.mongo_uri if args.mongo_uri else f'MongoDB giả lập trễ {args.latency * 1000:.1f} ms'}")
+    paths = ("/cameras", f"/camera-files?camera_id={camera_id}&limit={args.limit}")
+
+    async def run_all():
+        # Một event loop cho mọi lần đo: client MongoDB bất đồng bộ gắn với loop tạo ra nó
+        return [(path, await run(app, path, args.requests, args.concurrency)) for path in paths]
+
+    for path, result in asyncio.run(run_all()):
+        print(f"{path.split('?')[0]:14s} {result['req_s']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+              f"p95 {result['p95_ms']:7.1f} ms  lỗi {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
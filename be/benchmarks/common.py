@@ -0,0 +1,22 @@
+# benchmarks/common.py
+from pathlib import Path
+
+import cv2
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_VIDEO = ROOT / "data" / "test-video" / "istockphoto-1369567112-640_adpp_is.mp4"
+
+
+def read_frames(video, limit=None, stride=1):
+    cap = cv2.VideoCapture(str(video))
+    frames = []
+    index = 0
+    while limit is None or len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % stride == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
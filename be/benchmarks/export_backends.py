@@ -0,0 +1,94 @@
+# benchmarks/export_backends.py
+# Export mô hình sang ONNX / OpenVINO, kiểm tra kết quả khớp với PyTorch và so sánh độ trễ.
+#   cd be && python -m benchmarks.export_backends --formats onnx openvino
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from config import MODEL_WEIGHTS, INFERENCE_IMGSZ
+from object_detection.allowed_classes import ALLOWED_CLASSES
+from object_detection.backends import create_backend, backend_model_path
+from benchmarks.common import DEFAULT_VIDEO, read_frames
+from object_detection.spatial import count_matches
+
+EXPORT_FORMATS = {"onnx": "onnxruntime", "openvino": "openvino"}
+
+
+def export(weights, fmt, imgsz):
+    from ultralytics import YOLO
+    target = Path(backend_model_path(EXPORT_FORMATS[fmt], weights))
+    if target.exists():
+        print(f"[INFO] ♻️ Đã có {target}, bỏ qua export")
+        return
+    print(f"[INFO] 📤 Export {weights} -> {fmt}")
+    # dynamic=True để backend có thể chạy theo batch giữa các camera
+    YOLO(weights).export(format=fmt, imgsz=imgsz, dynamic=True)
+
+
+def run(backend, frames, classes, batch_size):
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        outputs.extend(backend.predict(frames[i:i + batch_size], classes))
+    elapsed = time.perf_counter() - start
+    return [r.boxes.data.cpu().numpy() for r in outputs], 1000 * elapsed / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export + parity + latency cho các backend suy luận")
+    parser.add_argument("--weights", default=MODEL_WEIGHTS)
+    parser.add_argument("--formats", nargs="+", default=["onnx"], choices=list(EXPORT_FORMATS))
+    parser.add_argument("--video", default=str(DEFAULT_VIDEO))
+    parser.add_argument("--frames", type=int, default=32)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--imgsz", type=int, default=INFERENCE_IMGSZ)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for fmt in args.formats:
+        export(args.weights, fmt, args.imgsz)
+
+    frames = read_frames(args.video, limit=args.frames, stride=5)
+    if not frames:
+        print(f"[ERROR] ❌ Không đọc được frame từ {args.video}")
+        return
+
+    backends = {"ultralytics": create_backend("ultralytics", args.weights)}
+    for fmt in args.formats:
+        name = EXPORT_FORMATS[fmt]
+        try:
+            backends[name] = create_backend(name, args.weights)
+        except ImportError as e:
+            print(f"[WARNING] ⚠️ Bỏ qua {name}: {e}")
+
+    names = backends["ultralytics"].names
+    classes = [i for i, name in names.items() if name.lower() in ALLOWED_CLASSES]
+
+    # Khởi động để không tính thời gian nạp/biên dịch lần đầu
+    for backend in backends.values():
+        backend.predict(frames[:1], classes)
+
+    reference = None
+    print(f"[INFO] 🎞 {len(frames)} frame từ {args.video}")
+    for name, backend in backends.items():
+        for batch_size in args.batch:
+            boxes, latency = run(backend, frames, classes, batch_size)
+            line = f"[INFO] ⏱ {name:<12} batch={batch_size:<2} {latency:8.1f} ms/frame"
+            if reference is None:
+                reference = boxes
+            else:
+                total = sum(len(b) for b in reference)
+                matched = sum(count_matches(r, b, args.iou) for r, b in zip(reference, boxes))
+                extra = sum(len(b) for b in boxes) - matched
+                parity = matched / total if total else 1.0
+                line += f" | khớp PyTorch: {parity:.3f} ({matched}/{total}, thừa {extra})"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/mongo_standin.py
+# MongoDB giả lập trong tiến trình cho benchmark API: dữ liệu nằm trong mongomock,
+# mỗi thao tác chờ thêm `latency` giây như một vòng mạng tới server thật và chiếm một
+# kết nối của pool (maxPoolSize) trong lúc chờ. Bản đồng bộ chờ bằng time.sleep (chặn
+# luồng), bản bất đồng bộ bằng asyncio.sleep (nhả event loop) — đúng như hai driver thật.
+#   from benchmarks.mongo_standin import install; install(latency=0.005)  # trước khi import main
+import asyncio
+import threading
+import time
+
+import mongomock
+import pymongo
+
+_backend = mongomock.MongoClient()
+_DEFAULT_POOL_SIZE = 100  # như pymongo
+
+
+class _SyncCollection:
+    def __init__(self, collection, client):
+        self._collection = collection
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._client.pool:
+                time.sleep(self._client.latency)
+                return attr(*args, **kwargs)
+        return call
+
+
+class _AsyncCursor:
+    def __init__(self, cursor, client):
+        self._cursor = cursor
+        self._client = client
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        async with self._client.pool:
+            await asyncio.sleep(self._client.latency)
+            docs = list(self._cursor)
+        return docs if length is None else docs[:length]
+
+    async def __aiter__(self):
+        for doc in await self.to_list():
+            yield doc
+
+
+class _AsyncCollection:
+    def __init__(self, collection, client):
+        self._collection = collection
+        self._client = client
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs), self._client)
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            async with self._client.pool:
+                await asyncio.sleep(self._client.latency)
+                return attr(*args, **kwargs)
+        return call
+
+
+class _Database:
+    def __init__(self, database, client, collection_type):
+        self._database = database
+        self._client = client
+        self._collection_type = collection_type
+
+    def __getitem__(self, name):
+        return self._collection_type(self._database[name], self._client)
+
+    __getattr__ = __getitem__
+
+
+class StandInMongoClient:
+    latency = 0.0
+
+    def __init__(self, *args, maxPoolSize=_DEFAULT_POOL_SIZE, **kwargs):
+        self.pool = threading.BoundedSemaphore(maxPoolSize or _DEFAULT_POOL_SIZE)
+
+    def __getitem__(self, name):
+        return _Database(_backend[name], self, _SyncCollection)
+
+    def close(self):
+        pass
+
+
+class StandInAsyncMongoClient:
+    latency = 0.0
+
+    def __init__(self, *args, maxPoolSize=_DEFAULT_POOL_SIZE, **kwargs):
+        self.max_pool_size = maxPoolSize or _DEFAULT_POOL_SIZE
+        self._pool = None
+
+    @property
+    def pool(self):
+        # Semaphore tạo trong event loop đang chạy
+        if self._pool is None:
+            self._pool = asyncio.Semaphore(self.max_pool_size)
+        return self._pool
+
+    def __getitem__(self, name):
+        return _Database(_backend[name], self, _AsyncCollection)
+
+    async def close(self):
+        pass
+
+
+def install(latency: float = 0.0):
+    """Thay MongoClient / AsyncMongoClient của pymongo bằng bản giả lập; gọi trước khi import main."""
+    StandInMongoClient.latency = latency
+    StandInAsyncMongoClient.latency = latency
+    pymongo.MongoClient = StandInMongoClient
+    pymongo.AsyncMongoClient = StandInAsyncMongoClient
+    return _backend
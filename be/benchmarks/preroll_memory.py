@@ -0,0 +1,61 @@
+# benchmarks/preroll_memory.py
+# So sánh bộ nhớ pre-roll cũ (deque 2 ảnh BGR mỗi frame) với PreRollBuffer lưu JPEG cho N camera.
+#   cd be && python -m benchmarks.preroll_memory --cameras 16 --width 1920 --height 1080
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from recording.preroll import PreRollBuffer
+from utils.frame import Frame
+from benchmarks.common import DEFAULT_VIDEO, read_frames
+
+FPS = 25
+BUFFER_SECONDS = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-roll memory benchmark")
+    parser.add_argument("--video", default=str(DEFAULT_VIDEO))
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    slots = BUFFER_SECONDS * FPS
+    frames = [cv2.resize(f, (args.width, args.height)) for f in read_frames(args.video, limit=slots)]
+    if not frames:
+        print(f"[ERROR] ❌ Không đọc được frame từ {args.video}")
+        return
+    # JPEG như client gửi lên qua /ws/video
+    jpegs = [cv2.imencode(".jpg", f)[1].tobytes() for f in frames]
+
+    # Bộ đệm cũ: mỗi slot giữ bản sao raw + bản sao annotated
+    old_bytes = sum(2 * frames[i % len(frames)].nbytes for i in range(slots))
+
+    buffer = PreRollBuffer(BUFFER_SECONDS, FPS)
+    for i in range(slots):
+        image = frames[i % len(frames)]
+        buffer.append(Frame("bench", image.copy(), i, time.time(), jpeg=jpegs[i % len(jpegs)]))
+    new_bytes = buffer.nbytes
+
+    start = time.perf_counter()
+    decoded = sum(1 for _ in buffer.drain())
+    decode_ms = 1000 * (time.perf_counter() - start)
+
+    print(f"[INFO] 🎞 {args.width}x{args.height}, {slots} frame pre-roll mỗi camera")
+    print(f"[INFO] 💾 Mỗi camera: cũ {old_bytes / 2**20:8.1f} MB | JPEG {new_bytes / 2**20:6.1f} MB"
+          f" | giảm {old_bytes / max(new_bytes, 1):.0f}x")
+    for n in args.cameras:
+        print(f"[INFO] 📷 {n:>3} camera: cũ {n * old_bytes / 2**30:6.2f} GB | JPEG {n * new_bytes / 2**30:6.2f} GB")
+    print(f"[INFO] ⏱ Giải mã {decoded} frame khi bắt đầu ghi: {decode_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
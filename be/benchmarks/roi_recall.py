@@ -0,0 +1,101 @@
+# benchmarks/roi_recall.py
+# Đo cái giá về recall của chế độ cắt vùng chuyển động (ROI) so với chạy cả frame.
+#   cd be && python -m benchmarks.roi_recall --video data/test-video/<clip>.mp4
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from config import MODEL_WEIGHTS, INFERENCE_BACKEND
+from object_detection.model_registry import get_model_pool
+from object_detection.roi import MotionRoiGate, merge_crop_results
+from benchmarks.common import DEFAULT_VIDEO
+from object_detection.spatial import count_matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ROI gating recall benchmark")
+    parser.add_argument("--video", default=str(DEFAULT_VIDEO))
+    parser.add_argument("--weights", default=MODEL_WEIGHTS)
+    parser.add_argument("--backend", default=INFERENCE_BACKEND)
+    parser.add_argument("--stride", type=int, default=5, help="chỉ đo mỗi N frame")
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    pool = get_model_pool(args.weights, args.backend)
+    # Cùng bộ lọc lớp với Detector trong production
+    class_ids = pool.class_table.allowed_ids
+    gate = MotionRoiGate()
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"[ERROR] ❌ Không mở được video: {args.video}")
+        return
+
+    stats = {"frames": 0, "full": 0, "cropped": 0, "skipped": 0, "baseline_boxes": 0, "matched": 0,
+             "baseline_time": 0.0, "roi_time": 0.0, "pixels_full": 0, "pixels_roi": 0}
+    index = 0
+    with pool.acquire() as backend:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            index += 1
+            if index % args.stride:
+                continue
+
+            now = index / (cap.get(cv2.CAP_PROP_FPS) or 25)
+            h, w = frame.shape[:2]
+
+            start = time.perf_counter()
+            baseline = backend.predict([frame], class_ids)[0].boxes.data.cpu().numpy()
+            baseline_elapsed = time.perf_counter() - start
+            stats["baseline_time"] += baseline_elapsed
+            stats["pixels_full"] += w * h
+
+            start = time.perf_counter()
+            regions = gate.regions(frame, now)
+            if regions is None:
+                candidate = baseline  # cùng một lần chạy cả frame
+                stats["full"] += 1
+                stats["pixels_roi"] += w * h
+                stats["roi_time"] += time.perf_counter() - start + baseline_elapsed
+            elif not regions:
+                candidate = np.zeros((0, 6))
+                stats["skipped"] += 1
+                stats["roi_time"] += time.perf_counter() - start
+            else:
+                crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+                crop_results = backend.predict(crops, class_ids)
+                candidate = merge_crop_results(frame, regions, crop_results, pool.names).boxes.data.cpu().numpy()
+                stats["cropped"] += 1
+                stats["pixels_roi"] += sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+                stats["roi_time"] += time.perf_counter() - start
+
+            stats["frames"] += 1
+            stats["baseline_boxes"] += len(baseline)
+            stats["matched"] += count_matches(baseline, candidate, args.iou)
+
+    cap.release()
+    if not stats["frames"]:
+        print("[ERROR] ❌ Không đọc được frame nào")
+        return
+
+    recall = stats["matched"] / stats["baseline_boxes"] if stats["baseline_boxes"] else 1.0
+    print(f"[INFO] 🎞 Video: {args.video} | frame đo: {stats['frames']} (stride {args.stride})")
+    print(f"[INFO] 🧭 Cả frame: {stats['full']} | Cắt vùng: {stats['cropped']} | Bỏ qua: {stats['skipped']}")
+    print(f"[INFO] 🎯 Recall so với cả frame: {recall:.3f} ({stats['matched']}/{stats['baseline_boxes']} box)")
+    print(f"[INFO] 🖼 Tỉ lệ pixel suy luận: {stats['pixels_roi'] / stats['pixels_full']:.3f}")
+    print(f"[INFO] ⏱ Thời gian trung bình / frame: cả frame {1000 * stats['baseline_time'] / stats['frames']:.1f} ms"
+          f" | ROI {1000 * stats['roi_time'] / stats['frames']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
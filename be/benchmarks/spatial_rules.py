@@ -0,0 +1,80 @@
+# benchmarks/spatial_rules.py
+# So sánh luật người–vũ khí / người–cửa kiểu vòng lặp cũ (map(int, box.xyxy[0]) trên tensor)
+# với bản ma trận NumPy trong object_detection/spatial.py.
+#   cd be && python -m benchmarks.spatial_rules
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from object_detection.spatial import overlap_matrix, centers_inside
+
+
+def random_boxes(n, rng, size=1920):
+    xy = rng.uniform(0, size, (n, 2))
+    wh = rng.uniform(10, 200, (n, 2))
+    return np.concatenate([xy, xy + wh], axis=1).astype(np.float32)
+
+
+def loop_weapon(person_xyxy, weapon_xyxy):
+    # Giống vòng lặp cũ: mỗi cặp đều chuyển tensor -> int trên host
+    for p in person_xyxy:
+        px1, py1, px2, py2 = map(int, p)
+        for w in weapon_xyxy:
+            wx1, wy1, wx2, wy2 = map(int, w)
+            if not (wx2 < px1 or wx1 > px2 or wy2 < py1 or wy1 > py2):
+                return True
+    return False
+
+
+def loop_door(person_xyxy, door_xyxy):
+    for p in person_xyxy:
+        px1, py1, px2, py2 = map(int, p)
+        pcx, pcy = (px1 + px2) // 2, (py1 + py2) // 2
+        for d in door_xyxy:
+            dx1, dy1, dx2, dy2 = map(int, d)
+            if dx1 <= pcx <= dx2 and dy1 <= pcy <= dy2:
+                return True
+    return False
+
+
+def vector_weapon(person_xyxy, weapon_xyxy):
+    return bool(overlap_matrix(person_xyxy, weapon_xyxy).any())
+
+
+def vector_door(person_xyxy, door_xyxy):
+    return bool(centers_inside(person_xyxy, door_xyxy).any())
+
+
+def bench(fn, *args, number):
+    return 1e6 * min(timeit.repeat(lambda: fn(*args), number=number, repeat=3)) / number
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'boxes':>6} | {'weapon loop':>12} {'weapon vec':>11} | {'door loop':>10} {'door vec':>9}  (µs, trường hợp xấu nhất)")
+    for n in (10, 50, 100, 200, 400):
+        # Đặt vật thể ở xa nhau để vòng lặp phải duyệt hết mọi cặp
+        person = random_boxes(n, rng)
+        other = random_boxes(n, rng) + 5000
+        person_t, other_t = torch.from_numpy(person), torch.from_numpy(other)
+
+        number = max(1, 2000 // (n * n) + 1)
+        row = [
+            bench(loop_weapon, person_t, other_t, number=number),
+            bench(vector_weapon, person, other, number=200),
+            bench(loop_door, person_t, other_t, number=number),
+            bench(vector_door, person, other, number=200),
+        ]
+        assert loop_weapon(person_t, other_t) == vector_weapon(person, other)
+        print(f"{n:>6} | {row[0]:>12.1f} {row[1]:>11.1f} | {row[2]:>10.1f} {row[3]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,238 @@
+# camera_manager.py
 import asyncio
-from collections import namedtuple
-from queue import Queue
+import time
 from threading import Thread
 
-CameraTask = namedtuple("CameraTask", ["thread", "queue"])
+import cv2
+import numpy as np
 
-registry: dict[str, CameraTask] = {}
\ No newline at end of file
+from config import MOTION_CHECK_INTERVAL
+from object_detection.detector import Detector
+from object_detection.detection_worker import DetectionWorker
+from ingest.worker import IngestWorker
+from sharding.frame_ring import FrameRing
+from utils import metrics
+from utils.db import camera_metadata
+from utils.frame import Frame
+
+
+class CameraSession:
+    """Pipeline của một camera: nhận frame, detection và ghi clip, sống độc lập với viewer.
+
+    Một camera chỉ có một session dù có bao nhiêu viewer; mỗi viewer chỉ đọc JPEG đã
+    mã hoá (dùng chung theo profile) từ detector. Session tiếp tục chạy khi không còn
+    viewer nào và chỉ dừng khi gọi stop_session() (xoá camera, tắt server...).
+    Frame đến từ client qua WebSocket (ingest) hoặc do backend tự đọc URL camera
+    (start_ingest); cả hai đi vào cùng một pipeline.
+    """
+
+    def __init__(self, cam_id: str, recorder, metadata: dict):
+        self.cam_id = cam_id
+        self.detector = Detector(cam_id)
+        self.detection_worker = DetectionWorker(self.detector)
+        # Frame cho recorder đi qua vòng cố định (tham chiếu, không sao chép): ghi không bao giờ chờ,
+        # recorder chậm thì bỏ frame cũ. Recorder cùng tiến trình nên không cần shared memory
+        self.frame_ring = FrameRing(cam_id=cam_id)
+        self.viewers = 0
+        self.frame_count = 0
+        self.started_at = time.time()
+        self.last_frame_at = None
+        self.ingest_worker = None
+
+        self.recorder_thread = Thread(target=recorder, args=(cam_id, self.frame_ring, self.detector, metadata), daemon=True)
+        self.recorder_thread.start()
+        self.detect_task = asyncio.get_running_loop().create_task(self._detect_loop())
+
+    @property
+    def running(self):
+        return self.detector.running
+
+    @property
+    def ingesting(self):
+        return self.ingest_worker is not None
+
+    def attach(self):
+        self.viewers += 1
+        metrics.set_value(self.cam_id, "viewers", self.viewers)
+
+    def detach(self):
+        self.viewers = max(0, self.viewers - 1)
+        metrics.set_value(self.cam_id, "viewers", self.viewers)
+
+    def start_ingest(self, url: str):
+        # Backend tự đọc camera; gọi lại với URL mới thì thay worker cũ
+        self.stop_ingest()
+        self.ingest_worker = IngestWorker(self.cam_id, url, self.ingest_image)
+
+    def stop_ingest(self):
+        worker, self.ingest_worker = self.ingest_worker, None
+        if worker is not None:
+            worker.stop()
+
+    def ingest(self, data: bytes, timestamp: float = None) -> bool:
+        """Nhận một frame JPEG từ client: giải mã rồi đưa vào pipeline."""
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return False
+        self.ingest_image(image, data, timestamp)
+        return True
+
+    def ingest_image(self, image, jpeg: bytes = None, timestamp: float = None):
+        """Cập nhật frame mới nhất cho detector/stream và đưa cho recorder."""
+        self.frame_count += 1
+        self.last_frame_at = time.time() if timestamp is None else timestamp
+
+        # Một Frame bất biến dùng chung cho detector, stream và recorder (không sao chép)
+        frame = Frame(self.cam_id, image, self.frame_count, self.last_frame_at, jpeg=jpeg)
+        metrics.incr(self.cam_id, "frames_received")
+
+        # Cập nhật frame cho detector
+        with self.detector.lock:
+            self.detector.latest_frame = frame
+
+        # Đưa frame vào vòng cho recorder (slot cũ nhất bị ghi đè, không chặn)
+        self.frame_ring.publish(frame)
+
+        if self.frame_count % 100 == 0:
+            print(f"[DEBUG] 📊 Đã nhận {self.frame_count} frames cho camera {self.cam_id}")
+
+    def get_latest_stream_jpeg(self, profile=None):
+        return self.detector.get_latest_stream_jpeg(profile)
+
+    async def _detect_loop(self):
+        detector = self.detector
+        try:
+            detect_count = 0
+            last_submit_time = 0
+            last_motion_seq = None
+            while detector.running:
+                with detector.lock:
+                    latest = detector.latest_frame
+
+                if latest is not None:
+                    frame = latest.image
+                    now = time.time()
+                    if latest.seq != last_motion_seq:
+                        # Đo chuyển động trên bản thu nhỏ để chọn nhịp detection; resize / so sánh
+                        # chạy trong thread để không giữ event loop của server
+                        last_motion_seq = latest.seq
+                        interval = await asyncio.to_thread(detector.detect_rate.update, frame, detector.is_abnormal, now)
+                    else:
+                        # Chưa có frame mới: không đo lại cùng một ảnh
+                        interval = detector.detect_rate.refresh(detector.is_abnormal, now)
+                    detector.DETECT_INTERVAL = interval
+                    metrics.set_value(self.cam_id, "detect_interval", interval)
+
+                    if now - last_submit_time >= interval:
+                        # Đưa frame mới nhất cho worker; nếu worker còn bận thì frame cũ bị thay thế
+                        self.detection_worker.submit(frame)
+                        last_submit_time = now
+                        detect_count += 1
+
+                        if detect_count % 10 == 0:
+                            dropped = metrics.get_camera(self.cam_id).get("detect_frames_dropped", 0)
+                            print(f"[DEBUG] 🔍 Đã gửi {detect_count} frame detection (bỏ qua {dropped}). Abnormal: {detector.is_abnormal}, chu kỳ: {interval}s")
+
+                await asyncio.sleep(MOTION_CHECK_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[ERROR] detect_loop: {e}")
+        finally:
+            detector.running = False
+            print(f"[INFO] 🛑 Detect loop stopped for {self.cam_id}")
+
+    def status(self):
+        return {
+            "cam_id": self.cam_id,
+            "running": self.running,
+            "viewers": self.viewers,
+            "frames": self.frame_count,
+            "last_frame_at": self.last_frame_at,
+            "is_abnormal": self.detector.is_abnormal,
+            "ingest_url": self.ingest_worker.url if self.ingest_worker else None,
+            "ingest_connected": bool(self.ingest_worker and self.ingest_worker.connected),
+            "uptime": round(time.time() - self.started_at, 1),
+        }
+
+    async def stop(self):
+        print(f"[INFO] 🧹 Dừng session camera: {self.cam_id}")
+        await asyncio.to_thread(self.stop_ingest)
+        self.detector.running = False
+        self.detect_task.cancel()
+        await asyncio.gather(self.detect_task, return_exceptions=True)
+        await asyncio.to_thread(self.detection_worker.stop)
+        # Chỉ đóng sự cố khi không còn detection nào đang chạy, nếu không lần detect dở dang
+        # có thể mở lại sự cố mà không ai đóng
+        self.detector.cleanup()
+
+        # Đợi recorder thread kết thúc
+        if self.recorder_thread.is_alive():
+            print("[INFO] ⏳ Waiting for recorder thread to finish...")
+            await asyncio.to_thread(self.recorder_thread.join, 5)
+            if self.recorder_thread.is_alive():
+                print("[WARNING] ⚠️ Recorder thread didn't finish in time")
+        self.frame_ring.close()
+        print(f"[INFO] ✅ Resources for {self.cam_id} cleaned up.")
+
+
+registry: dict[str, CameraSession] = {}
+_creating: dict[str, asyncio.Lock] = {}
+
+# Khác None khi chạy chế độ nhiều tiến trình: session trong registry là RemoteSession
+supervisor = None
+
+
+def enable_sharding(processes: int):
+    global supervisor
+    if supervisor is None:
+        from sharding.supervisor import ShardSupervisor
+        supervisor = ShardSupervisor(processes)
+    return supervisor
+
+
+async def get_or_create_session(cam_id: str, recorder) -> CameraSession:
+    # Gọi trên event loop của server; session đã dừng (lỗi, bị xoá) thì tạo lại
+    session = registry.get(cam_id)
+    if session is not None and session.running:
+        return session
+
+    # Tạo session trên worker phải await: khoá theo camera để hai viewer vào cùng lúc
+    # không khởi động camera hai lần
+    async with _creating.setdefault(cam_id, asyncio.Lock()):
+        session = registry.get(cam_id)
+        if session is None or not session.running:
+            if session is not None:
+                # Session cũ đã chết (detect loop lỗi...) vẫn còn ingest, vòng frame và sự cố mở:
+                # dọn hết trước khi tạo session mới cho cùng camera
+                print(f"[INFO] ♻️ Session camera {cam_id} đã dừng, dọn trước khi tạo lại")
+                try:
+                    await session.stop()
+                except Exception as e:
+                    print(f"[ERROR] Lỗi khi dừng session cũ của {cam_id}: {e}")
+                registry.pop(cam_id, None)
+            print(f"[INFO] 🎬 Tạo session cho camera: {cam_id}")
+            if supervisor is not None:
+                session = await asyncio.to_thread(supervisor.start_camera, cam_id)
+            else:
+                # Tên camera / phòng cho thư mục clip, tra qua client bất đồng bộ
+                session = CameraSession(cam_id, recorder, await camera_metadata(cam_id))
+            registry[cam_id] = session
+    return session
+
+
+async def stop_session(cam_id: str) -> bool:
+    session = registry.pop(cam_id, None)
+    if session is None:
+        return False
+    await session.stop()
+    return True
+
+
+async def stop_all():
+    global supervisor
+    for cam_id in list(registry):
+        await stop_session(cam_id)
+    if supervisor is not None:
+        await asyncio.to_thread(supervisor.shutdown)
+        supervisor = None
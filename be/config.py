@@ -4,14 +4,116 @@ DB_NAME = "surveillance"
 COLLECTION_EVENTS = "events"
 COLLECTION_CAMERAS = "cameras"
 COLLECTION_ROOMS = "rooms"
+COLLECTION_CLIPS = "clips"  # danh mục clip đã ghi, mỗi clip một document
+
+# Client MongoDB bất đồng bộ dùng chung cho các endpoint REST (utils/db.py)
+MONGO_POOL_SIZE = 50  # số kết nối tối đa trong pool
+MONGO_TIMEOUT_MS = 5000  # thời gian tối đa cho mỗi thao tác (kể cả chọn server, chờ kết nối trong pool)
+# Client đồng bộ của các luồng nền (utils/logger.py): MongoDB mất kết nối thì báo lỗi sau chừng này
+# thay vì chặn 30 s mặc định; event sink còn giới hạn mỗi lần ghi / tra phòng theo MONGO_TIMEOUT_MS
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 3000
 
 # Video clip ghi lại khi có đối tượng
 ABNORMAL_END_DELAY = 3  # giây chờ trước khi kết thúc video nếu không còn bất thường
 
 VIDEO_OUTPUT_DIR = "data/output"
+
+# Ghi sự kiện vào MongoDB theo lô trên luồng nền (utils/event_sink.py)
+EVENT_QUEUE_SIZE = 10000  # sự kiện chờ ghi tối đa; đầy thì ghi tạm ra file
+EVENT_BATCH_SIZE = 100  # số sự kiện tối đa mỗi lần insert_many
+EVENT_FLUSH_INTERVAL = 1.0  # giây tối đa một sự kiện nằm chờ trong hàng đợi
+EVENT_ROOM_CACHE_TTL = 300.0  # giây giữ room_id của camera trong cache
+EVENT_SPILL_PATH = "data/event_spill.jsonl"  # file tạm khi MongoDB không ghi được
+EVENT_SPILL_RETRY = 30.0  # giây giữa hai lần thử ghi lại file tạm
+
+# Gộp các lần luật kích hoạt thành sự cố (camera, luật, track id): một document cho mỗi sự cố
+INCIDENT_CLOSE_AFTER = 5.0  # giây không kích hoạt lại thì đóng sự cố
+INCIDENT_UPDATE_INTERVAL = 5.0  # giây tối thiểu giữa hai lần cập nhật document của một sự cố
 VIDEO_CLIP_DURATION = 10  # seconds
 FPS = 5  # khi ở chế độ liên tục
 dangerous_animals = ["dog", "cat", "snake", "lion", "cow"]
 POSE_SUSPICIOUS_ANGLE_THRESHOLD = 45 
 POSE_KEYPOINTS_PERSON = ["nose", "left_shoulder", "right_shoulder", "left_hip", "right_hip"]
 
+
+# Mô hình YOLO dùng chung cho toàn bộ tiến trình (nạp một lần, không nạp lại theo từng WebSocket)
+MODEL_WEIGHTS = "yolov8l-oiv7.pt"
+INFERENCE_WORKERS = 1  # số bản mô hình suy luận song song tối đa (mỗi bản là một bản sao trọng số trong RAM)
+TRACKER_CONFIG = "bytetrack.yaml"  # cấu hình tracker riêng cho từng camera
+
+# Gộp batch suy luận giữa các camera
+INFERENCE_BATCH_SIZE = 8  # số frame tối đa trong một lần predict
+INFERENCE_BATCH_WAIT = 0.05  # giây chờ tối đa để gom thêm frame vào batch
+
+# Tần suất detection thích ứng theo chuyển động / trạng thái bất thường (giây giữa hai lần detection)
+DETECT_INTERVAL_ACTIVE = 0.25  # trần tần suất khi có chuyển động hoặc đang bất thường
+DETECT_INTERVAL_NORMAL = 1.0
+DETECT_INTERVAL_IDLE = 5.0  # cảnh tĩnh
+MOTION_CHECK_INTERVAL = 0.2  # giây giữa hai lần so sánh frame
+MOTION_FRAME_WIDTH = 160  # chiều rộng ảnh thu nhỏ để so sánh frame
+MOTION_PIXEL_THRESHOLD = 25  # chênh lệch mức xám để coi là pixel thay đổi
+MOTION_RATIO_THRESHOLD = 0.01  # tỉ lệ pixel thay đổi để coi là có chuyển động
+MOTION_HOLD_SECONDS = 2.0  # giữ tần suất cao sau chuyển động cuối
+IDLE_AFTER_SECONDS = 10.0  # không chuyển động lâu hơn mức này thì chuyển sang chế độ tĩnh
+
+# Cắt vùng chuyển động (ROI) trước khi chạy YOLO
+ROI_GATING_ENABLED = False  # bật để chỉ suy luận trên vùng có chuyển động
+ROI_FRAME_WIDTH = 320  # chiều rộng ảnh thu nhỏ cho background subtraction
+ROI_PADDING = 32  # pixel (theo frame gốc) nới rộng quanh mỗi vùng
+ROI_MIN_SIZE = 160  # cạnh nhỏ nhất của một vùng cắt (pixel theo frame gốc)
+ROI_MIN_AREA_RATIO = 0.0005  # vùng chuyển động nhỏ hơn tỉ lệ này bị bỏ qua
+ROI_MAX_COVERAGE = 0.6  # nếu các vùng phủ quá tỉ lệ này thì chạy cả frame
+ROI_FULL_FRAME_INTERVAL = 15.0  # giây, định kỳ chạy cả frame để bắt vật thể đứng yên
+
+# Backend suy luận: "ultralytics" (PyTorch), "onnxruntime" hoặc "openvino".
+# File ONNX/OpenVINO được suy ra từ MODEL_WEIGHTS theo tên export của ultralytics
+# (yolov8l-oiv7.onnx, yolov8l-oiv7_openvino_model/) — tạo bằng benchmarks/export_backends.py
+INFERENCE_BACKEND = "ultralytics"
+INFERENCE_IMGSZ = 640
+INFERENCE_CONF = 0.25
+INFERENCE_IOU = 0.7
+INFERENCE_MAX_DET = 300
+
+# Cascade hai tầng: mô hình nhỏ sàng lọc, chỉ frame có ứng viên mới chạy mô hình OIV7 lớn
+SCREENING_MODEL_WEIGHTS = "yolov8n.pt"  # COCO: person, knife, scissors, bear... trong ALLOWED_CLASSES
+CASCADE_ENABLED = False  # mặc định cho mọi camera
+CASCADE_CAMERAS = {}  # cam_id -> True/False, ghi đè CASCADE_ENABLED cho từng camera
+
+# Ghi clip bất đồng bộ
+CLIP_WRITER_QUEUE_SIZE = 250  # số frame tối đa chờ ghi cho mỗi clip; đầy thì bỏ frame mới
+RECORDING_CONTAINER = "mp4v"  # "mjpeg": ghi thẳng JPEG của client vào AVI, không mã hoá lại
+# Clip đạt dung lượng này thì đóng và ghi tiếp sang clip mới (AVI 1.0 dùng kích thước 32-bit,
+# nhiều trình phát đã không đọc được file trên ~1 GiB)
+CLIP_SEGMENT_BYTES = 1000 * 1024 * 1024
+
+# Chuyển clip MJPEG sang H.264 khi máy rảnh
+TRANSCODE_ENABLED = False
+TRANSCODE_IDLE_SECONDS = 30.0  # chỉ chạy khi không có clip nào đang ghi trong khoảng này
+TRANSCODE_THREADS = 1
+TRANSCODE_CRF = 23
+TRANSCODE_DELETE_SOURCE = True
+
+# Stream ra cho viewer: mặc định và giới hạn khi thích ứng theo backpressure
+STREAM_DEFAULT_FPS = 30
+STREAM_MIN_FPS = 2
+STREAM_MIN_QUALITY = 40
+STREAM_QUALITY_STEP = 15
+STREAM_SLOW_SEND_RATIO = 0.5  # send_bytes chiếm hơn tỉ lệ này của chu kỳ frame thì coi là chậm
+STREAM_RECOVER_AFTER = 30  # số lần gửi nhanh liên tiếp trước khi nâng lại chất lượng
+
+# Backend tự đọc camera (RTSP / MJPEG / HTTP / file) thay vì chờ client đẩy frame lên
+SERVER_INGEST_ENABLED = False  # True: mở session + ingest cho mọi camera khi khởi động server
+INGEST_RECONNECT_MIN = 1.0  # giây chờ trước lần kết nối lại đầu tiên
+INGEST_RECONNECT_MAX = 30.0  # backoff tăng gấp đôi tới mức này
+INGEST_TIMEOUT = 10.0  # giây: mở kết nối / không nhận được frame nào thì kết nối lại
+INGEST_SNAPSHOT_FPS = 5  # nhịp lấy ảnh với nguồn HTTP chỉ trả một JPEG mỗi lần gọi
+INGEST_FILE_REALTIME = True  # nguồn file phát theo fps của video (False: đọc nhanh nhất có thể)
+
+# Chia camera cho nhiều tiến trình worker (0: chạy mọi camera trong tiến trình FastAPI)
+CAMERA_WORKER_PROCESSES = 0
+SHARD_JPEG_SLOT_BYTES = 4 * 1024 * 1024  # dung lượng tối đa một JPEG trao đổi qua shared memory
+SHARD_POLL_INTERVAL = 0.005  # giây giữa hai lần kiểm tra slot có frame mới
+SHARD_CONTROL_TIMEOUT = 30.0  # giây chờ worker trả lời lệnh điều khiển
+SHARD_START_TIMEOUT = 180.0  # giây chờ lệnh start: lần đầu worker còn phải nạp torch và trọng số mô hình
+# Vòng frame giữa luồng nhận frame và recorder (mỗi camera một vòng, slot chỉ giữ tham chiếu)
+FRAME_RING_SLOTS = 8
@@ -0,0 +1,142 @@
+# ingest/sources.py
+import os
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+from config import INGEST_TIMEOUT, INGEST_SNAPSHOT_FPS, INGEST_FILE_REALTIME
+
+SOI, EOI = b"\xff\xd8", b"\xff\xd9"
+
+
+class SourceEnded(Exception):
+    """Nguồn đã hết dữ liệu hoặc mất kết nối; worker sẽ kết nối lại theo backoff."""
+
+
+class CaptureSource:
+    """RTSP, file video, webcam và các URL khác mà OpenCV/FFmpeg mở được."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.is_file = os.path.exists(url)
+        if url == "0":
+            self.cap = cv2.VideoCapture(0)
+        else:
+            params = []
+            for name, value in (("CAP_PROP_OPEN_TIMEOUT_MSEC", INGEST_TIMEOUT), ("CAP_PROP_READ_TIMEOUT_MSEC", INGEST_TIMEOUT)):
+                if hasattr(cv2, name):
+                    params += [getattr(cv2, name), int(value * 1000)]
+            self.cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, params) if params and not self.is_file else cv2.VideoCapture(url)
+        if not self.cap.isOpened():
+            raise SourceEnded(f"Không mở được nguồn: {url}")
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        # File phát theo nhịp thật để giống camera (dùng khi test offline)
+        self.frame_interval = 1.0 / fps if self.is_file and INGEST_FILE_REALTIME and fps > 0 else 0.0
+        self.next_frame_at = time.time()
+
+    def read(self):
+        if self.frame_interval:
+            delay = self.next_frame_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_frame_at = max(self.next_frame_at + self.frame_interval, time.time() - self.frame_interval)
+
+        ok, image = self.cap.read()
+        if not ok or image is None:
+            raise SourceEnded(f"Hết frame hoặc mất kết nối: {self.url}")
+        return image, None
+
+    def close(self):
+        self.cap.release()
+
+
+class MjpegHttpSource:
+    """Luồng multipart/x-mixed-replace (IP Webcam /video...): giữ nguyên JPEG của camera.
+
+    JPEG gốc được dùng lại cho stream/pre-roll/ghi MJPEG nên không phải mã hoá lại.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    MAX_BUFFER = 8 * 1024 * 1024
+
+    def __init__(self, response):
+        self.response = response
+        self.buffer = bytearray()
+
+    def read(self):
+        while True:
+            start = self.buffer.find(SOI)
+            end = self.buffer.find(EOI, start + 2) if start >= 0 else -1
+            if end >= 0:
+                jpeg = bytes(self.buffer[start:end + 2])
+                del self.buffer[:end + 2]
+                image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if image is not None:
+                    return image, jpeg
+                continue
+
+            if start > 0:
+                del self.buffer[:start]
+            if len(self.buffer) > self.MAX_BUFFER:
+                self.buffer.clear()
+
+            chunk = self.response.read1(self.CHUNK_SIZE) if hasattr(self.response, "read1") else self.response.read(self.CHUNK_SIZE)
+            if not chunk:
+                raise SourceEnded("Luồng MJPEG đã đóng")
+            self.buffer += chunk
+
+    def close(self):
+        self.response.close()
+
+
+class SnapshotHttpSource:
+    """URL trả về một ảnh JPEG mỗi lần gọi (shot.jpg...): lấy lại theo INGEST_SNAPSHOT_FPS."""
+
+    def __init__(self, url: str, first_response):
+        self.url = url
+        self.pending = first_response
+        self.interval = 1.0 / INGEST_SNAPSHOT_FPS
+        self.last_fetch = 0.0
+
+    def read(self):
+        if self.pending is None:
+            delay = self.last_fetch + self.interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.pending = urllib.request.urlopen(self.url, timeout=INGEST_TIMEOUT)
+        self.last_fetch = time.time()
+        with self.pending as response:
+            jpeg = response.read()
+        self.pending = None
+
+        image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise SourceEnded(f"Ảnh không hợp lệ từ {self.url}")
+        return image, jpeg
+
+    def close(self):
+        if self.pending is not None:
+            self.pending.close()
+            self.pending = None
+
+
+def open_source(url: str):
+    """Chọn cách đọc theo URL: HTTP thì xem Content-Type, còn lại để OpenCV/FFmpeg mở."""
+    if urlparse(url).scheme in ("http", "https"):
+        try:
+            response = urllib.request.urlopen(url, timeout=INGEST_TIMEOUT)
+        except OSError as e:
+            raise SourceEnded(f"Không kết nối được {url}: {e}") from e
+
+        content_type = response.headers.get("Content-Type", "").lower()
+        if content_type.startswith("multipart/"):
+            return MjpegHttpSource(response)
+        if content_type.startswith("image/"):
+            return SnapshotHttpSource(url, response)
+        # Video qua HTTP (mp4, hls...) để FFmpeg xử lý
+        response.close()
+    return CaptureSource(url)
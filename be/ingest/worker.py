@@ -0,0 +1,82 @@
+# ingest/worker.py
+import threading
+import time
+
+from config import INGEST_RECONNECT_MIN, INGEST_RECONNECT_MAX
+from object_detection.detection_worker import LatestFrameSlot
+from utils import metrics
+from .sources import open_source, SourceEnded
+
+
+class IngestWorker:
+    """Đọc một camera ngay tại backend và đưa frame vào pipeline của session.
+
+    Luồng đọc chỉ lo giải mã và đặt frame vào hộp thư sâu 1 (LatestFrameSlot), nên
+    buffer của RTSP/MJPEG không bị dồn khi pipeline chậm; luồng thứ hai lấy frame mới
+    nhất và gọi `on_frame(image, jpeg, timestamp)`. Mất kết nối hoặc hết file thì mở
+    lại với backoff tăng gấp đôi từ INGEST_RECONNECT_MIN tới INGEST_RECONNECT_MAX.
+    """
+
+    def __init__(self, cam_id: str, url: str, on_frame):
+        self.cam_id = cam_id
+        self.url = url
+        self.on_frame = on_frame
+        self.slot = LatestFrameSlot()
+        self.running = True
+        self.connected = False
+        self.stop_event = threading.Event()
+
+        self.reader = threading.Thread(target=self._read_loop, name=f"ingest-{cam_id}", daemon=True)
+        self.pump = threading.Thread(target=self._pump_loop, name=f"ingest-pump-{cam_id}", daemon=True)
+        self.reader.start()
+        self.pump.start()
+
+    def _read_loop(self):
+        backoff = INGEST_RECONNECT_MIN
+        while self.running:
+            source = None
+            try:
+                source = open_source(self.url)
+                print(f"[INFO] 📡 Đã kết nối nguồn {self.url} cho camera {self.cam_id} ({type(source).__name__})")
+                while self.running:
+                    image, jpeg = source.read()
+                    if not self.connected:
+                        self.connected = True
+                        backoff = INGEST_RECONNECT_MIN
+                    metrics.incr(self.cam_id, "ingest_frames")
+                    if self.slot.put((image, jpeg, time.time())):
+                        metrics.incr(self.cam_id, "ingest_frames_dropped")
+            except SourceEnded as e:
+                print(f"[WARNING] ⚠️ {e}")
+            except Exception as e:
+                metrics.incr(self.cam_id, "ingest_errors")
+                print(f"[ERROR] Lỗi đọc nguồn {self.url}: {e}")
+            finally:
+                self.connected = False
+                if source is not None:
+                    source.close()
+
+            if not self.running:
+                break
+            metrics.incr(self.cam_id, "ingest_reconnects")
+            print(f"[INFO] 🔁 Kết nối lại {self.url} sau {backoff:.0f}s")
+            self.stop_event.wait(backoff)
+            backoff = min(backoff * 2, INGEST_RECONNECT_MAX)
+        print(f"[INFO] 🛑 Ingest reader stopped for {self.cam_id}")
+
+    def _pump_loop(self):
+        while self.running:
+            item = self.slot.take(timeout=1)
+            if item is None:
+                continue
+            try:
+                self.on_frame(*item)
+            except Exception as e:
+                print(f"[ERROR] Lỗi khi đưa frame vào pipeline cho cam {self.cam_id}: {e}")
+
+    def stop(self, timeout=5):
+        self.running = False
+        self.stop_event.set()
+        self.slot.close()
+        self.pump.join(timeout)
+        self.reader.join(timeout)
@@ -1,21 +1,18 @@
 # main.py
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
-import queue
-from fastapi import FastAPI, Query, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Query, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from bson import ObjectId
-from pymongo import MongoClient
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
 from pydantic import BaseModel
-from threading import Thread
 import os
 import cv2
-import numpy as np
 import time
 import asyncio
-from collections import deque
-from urllib.parse import urlparse
-from utils.logger import log_event
-from urllib.parse import urlparse
+import json
 
 # --- Block code đảm bảo import hoạt động đáng tin cậy ---
 FILE = Path(__file__).resolve()
@@ -24,23 +21,45 @@ if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 # -----------------------------------------------------------
 
-from config import MONGO_URI, DB_NAME, COLLECTION_CAMERAS, COLLECTION_EVENTS, COLLECTION_ROOMS, VIDEO_OUTPUT_DIR
-from object_detection.detector import Detector
-from utils.logger import setup_logger
+from config import VIDEO_OUTPUT_DIR
+from config import SERVER_INGEST_ENABLED, CAMERA_WORKER_PROCESSES
+from object_detection.inference_scheduler import get_inference_scheduler
+from utils import metrics
+import camera_manager
+from recording.recorder import video_recorder
+from streaming.profiles import StreamProfile, AdaptiveSender
+from recording.sidecar import sidecar_path, annotated_frames, export_annotated, read_sidecar, ANNOTATED_FILENAME
+from utils import db
+from utils.logger import setup_logger, get_event_sink, event_collection, clip_collection
+from utils.event_store import (
+    ensure_event_indexes, migrate_string_timestamps, event_filter, parse_time,
+    find_events, serialize_event,
+)
+from recording.catalog import ensure_clip_indexes, backfill_clips, clip_filter, find_clips
 
 print("🔥 Python path:", sys.executable)
 
 os.makedirs(VIDEO_OUTPUT_DIR, exist_ok=True)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tạo index và chuyển dữ liệu cũ ở nền, không chặn server khởi động
+    asyncio.get_running_loop().run_in_executor(None, prepare_event_collection)
+    await start_camera_pipelines()
+    try:
+        yield
+    finally:
+        await stop_camera_sessions()
+
+app = FastAPI(lifespan=lifespan)
 logger = setup_logger("main")
 
-# Kết nối MongoDB
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-camera_col = db[COLLECTION_CAMERAS]
-event_col = db[COLLECTION_EVENTS]
-room_col = db[COLLECTION_ROOMS]
+# Endpoint đọc / ghi MongoDB qua client bất đồng bộ dùng chung (utils/db.py), không chiếm threadpool
+@app.exception_handler(PyMongoError)
+async def mongo_error_handler(request: Request, exc: PyMongoError):
+    # Hết timeoutMS hoặc mất kết nối: báo lỗi ngay thay vì treo request
+    logger.error(f"Lỗi MongoDB tại {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Database unavailable."})
 
 # Pydantic Models
 class CameraIn(BaseModel):
@@ -59,41 +78,41 @@ def root(): return {"status": "API is running"}
 
 # --- Quản lý Phòng (ĐÃ KHÔI PHỤC ĐẦY ĐỦ) ---
 @app.get("/rooms")
-def list_rooms():
-    rooms = list(room_col.find())
+async def list_rooms():
+    rooms = await db.rooms().find().to_list()
     return [{"id": str(r["_id"]), "name": r["name"]} for r in rooms]
 
 @app.post("/rooms")
-def add_room(room: RoomIn):
-    if room_col.find_one({"name": room.name}):
+async def add_room(room: RoomIn):
+    if await db.rooms().find_one({"name": room.name}):
         raise HTTPException(status_code=400, detail=f"Room with name '{room.name}' already exists.")
-    result = room_col.insert_one({"name": room.name})
+    result = await db.rooms().insert_one({"name": room.name})
     logger.info(f"🚪 Đã thêm phòng: {room.name}")
     return {"id": str(result.inserted_id), "name": room.name}
 
 @app.put("/rooms/{room_id}")
-def update_room(room_id: str, room: RoomIn):
+async def update_room(room_id: str, room: RoomIn):
     try:
         object_id = ObjectId(room_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid room_id format.")
-    existing_room = room_col.find_one({"name": room.name})
+    existing_room = await db.rooms().find_one({"name": room.name})
     if existing_room and existing_room["_id"] != object_id:
         raise HTTPException(status_code=400, detail=f"Room with name '{room.name}' already exists.")
-    result = room_col.update_one({"_id": object_id}, {"$set": {"name": room.name}})
+    result = await db.rooms().update_one({"_id": object_id}, {"$set": {"name": room.name}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Room not found.")
     logger.info(f"✏️ Đã cập nhật phòng {room_id} thành '{room.name}'")
-    updated_room = room_col.find_one({"_id": object_id})
+    updated_room = await db.rooms().find_one({"_id": object_id})
     return {"id": str(updated_room["_id"]), "name": updated_room["name"]}
 
 @app.delete("/rooms/{room_id}")
-def delete_room(room_id: str):
+async def delete_room(room_id: str):
     try:
         object_id = ObjectId(room_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid room_id format.")
-    result = room_col.delete_one({"_id": object_id})
+    result = await db.rooms().delete_one({"_id": object_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Room not found.")
     logger.info(f"🚪 Đã xóa phòng: {room_id}")
@@ -102,729 +121,361 @@ def delete_room(room_id: str):
 
 # --- Quản lý Camera (ĐÃ KHÔI PHỤC ĐẦY ĐỦ) ---
 @app.post("/add-camera")
-def add_camera(camera: CameraIn):
+async def add_camera(camera: CameraIn):
     if camera.url == "local":
         camera.url = "0"
-    cam_id = camera_col.insert_one({"url": camera.url, "room_id": ObjectId(camera.room_id)}).inserted_id
+    result = await db.cameras().insert_one({"url": camera.url, "room_id": ObjectId(camera.room_id)})
+    cam_id = result.inserted_id
     logger.info(f"📷 Thêm camera: {camera.url} vào phòng {camera.room_id}")
+    if SERVER_INGEST_ENABLED:
+        await start_server_ingest(str(cam_id), camera.url)
     return {"status": "added", "url": camera.url, "id": str(cam_id), "room_id": camera.room_id}
 
 @app.get("/cameras")
-def list_cameras():
-    cams = list(camera_col.find({}, {"url": 1, "room_id": 1}))
+async def list_cameras():
+    cams = await db.cameras().find({}, {"url": 1, "room_id": 1}).to_list()
     return [{"id": str(c["_id"]), "url": c["url"], "room_id": str(c.get("room_id", ""))} for c in cams]
 
 @app.delete("/delete-camera")
-def delete_camera(camera: CameraDeleteIn):
-    result = camera_col.delete_one({"url": camera.url})
-    if result.deleted_count == 0:
+async def delete_camera(camera: CameraDeleteIn):
+    cam = await db.cameras().find_one_and_delete({"url": camera.url})
+    if cam is None:
         raise HTTPException(status_code=404, detail="Camera not found")
+    # Camera bị xoá thì dừng luôn pipeline của nó
+    await camera_manager.stop_session(str(cam["_id"]))
+    get_event_sink().invalidate_camera(cam["_id"])
     logger.info(f"🗑️ Đã xóa camera: {camera.url}")
     return {"status": "deleted", "url": camera.url}
 
 @app.put("/cameras/{camera_id}")
-def update_camera(camera_id: str, camera_data: CameraUpdateIn):
+async def update_camera(camera_id: str, camera_data: CameraUpdateIn):
     try:
         object_id = ObjectId(camera_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid camera_id format.")
-    result = camera_col.update_one({"_id": object_id}, {"$set": {"url": camera_data.url}})
+    result = await db.cameras().update_one({"_id": object_id}, {"$set": {"url": camera_data.url}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Camera not found.")
     logger.info(f"✏️ Đã cập nhật URL camera {camera_id}")
-    updated_camera = camera_col.find_one({"_id": object_id})
+    # Đang tự đọc camera này thì chuyển sang URL mới
+    session = camera_manager.registry.get(camera_id)
+    if session is not None and session.ingesting:
+        await start_server_ingest(camera_id, camera_data.url)
+    updated_camera = await db.cameras().find_one({"_id": object_id})
     return {"id": str(updated_camera["_id"]), "url": updated_camera["url"], "room_id": str(updated_camera.get("room_id", ""))}
 
 
 # --- QUẢN LÝ FILE SỰ KIỆN ---
-@app.get("/camera-files")
-def camera_files(camera_id: str = Query(...), limit: int = Query(50)):
+def _parse_filters(camera_id, event_type, since, until):
+    # event_type có thể gồm nhiều loại cách nhau dấu phẩy
     try:
-        query = {"camera_id": ObjectId(camera_id)}
-    except Exception:
+        if camera_id is not None:
+            ObjectId(camera_id)
+        event_types = [t.strip() for t in event_type.split(",") if t.strip()] if event_type else None
+        return event_types, parse_time(since), parse_time(until)
+    except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid camera_id format.")
-    events = event_col.find(query)
-    video_paths = []
-    for event in events:
-        path = event.get("video_path")
-        if path and isinstance(path, str) and path.strip():
-            if path not in video_paths:
-                video_paths.append(path.replace("\\", "/"))
-    return {"videos": video_paths}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time filter: {e}")
+
+def _event_query(camera_id=None, room_id=None, event_type=None, since=None, until=None) -> dict:
+    event_types, since, until = _parse_filters(camera_id, event_type, since, until)
+    return event_filter(camera_id, room_id, event_types, since, until)
+
+@app.get("/camera-files")
+async def camera_files(camera_id: str = Query(...), limit: int = Query(50), cursor: str = Query(None),
+                 since: str = Query(None), until: str = Query(None),
+                 event_type: str = Query(None), room_id: str = Query(None)):
+    """Clip của camera, mới nhất trước, đọc từ danh mục clips (event_type lọc theo luật kích hoạt clip)."""
+    triggers, since, until = _parse_filters(camera_id, event_type, since, until)
+    try:
+        clips, next_cursor = await find_clips(db.clips(), clip_filter(camera_id, room_id, triggers, since, until), limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "videos": [clip["video_path"].replace("\\", "/") for clip in clips],
+        "clips": [serialize_event(clip) for clip in clips],
+        "next_cursor": next_cursor,
+    }
+
+@app.get("/events")
+async def list_events(camera_id: str = Query(None), room_id: str = Query(None), event_type: str = Query(None),
+                since: str = Query(None), until: str = Query(None),
+                limit: int = Query(100), cursor: str = Query(None)):
+    """Sự kiện / sự cố mới nhất trước, lọc theo camera, phòng, loại và khoảng thời gian (ISO 8601)."""
+    query = _event_query(camera_id, room_id, event_type, since, until)
+    try:
+        docs, next_cursor = await find_events(db.events(), query, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"events": [serialize_event(doc) for doc in docs], "next_cursor": next_cursor}
+
+def _clip_fs_path(video_path: str) -> Path:
+    # Chỉ động tới file nằm trong thư mục video của hệ thống
+    fs_path = Path(video_path).resolve()
+    if Path(VIDEO_OUTPUT_DIR).resolve() not in fs_path.parents:
+        raise HTTPException(status_code=400, detail="video_path is outside the video directory.")
+    return fs_path
+
+def _resolve_clip_path(video_path: str) -> Path:
+    fs_path = _clip_fs_path(video_path)
+    if not fs_path.exists():
+        raise HTTPException(status_code=404, detail="Video not found.")
+    return fs_path
 
 @app.delete("/camera-files")
-def delete_camera_file(camera_id: str = Query(...), video_path: str = Query(...)):
+async def delete_camera_file(camera_id: str = Query(...), video_path: str = Query(...)):
     try:
-        res = event_col.delete_many({"camera_id": ObjectId(camera_id), "video_path": video_path})
+        camera_obj_id = ObjectId(camera_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid camera_id format.")
-    fs_path = Path(video_path)
+    fs_path = _clip_fs_path(video_path)
+    # /camera-files trả đường dẫn dạng "/"; sự kiện của clip cũ (trước khi có danh mục) vẫn giữ
+    # đường dẫn kiểu Windows như lúc ghi
+    video_path = video_path.replace("\\", "/")
+    paths = [video_path, video_path.replace("/", "\\")]
+    # Chỉ xoá clip có trong danh mục của đúng camera này
+    clip = await db.clips().find_one({"camera_id": camera_obj_id, "video_path": {"$in": paths}}, {"_id": 1})
+    if clip is None:
+        raise HTTPException(status_code=404, detail="Clip not found.")
+
     if fs_path.exists():
         try:
-            annotated_path = fs_path.parent / "abnormal_annotated.mp4"
             fs_path.unlink()
-            if annotated_path.exists():
-                annotated_path.unlink()
+            # Sidecar box và bản annotated (clip cũ hoặc bản đã export) nằm cùng thư mục
+            for extra_path in (sidecar_path(fs_path), fs_path.parent / ANNOTATED_FILENAME):
+                if extra_path.exists():
+                    extra_path.unlink()
             logger.info(f"📹 Đã xóa file video: {video_path} và file chú thích.")
         except OSError as e:
+            # Chưa xoá gì trong DB: clip vẫn còn trong danh mục để thử lại
             logger.error(f"Lỗi khi xóa file {video_path}: {e}")
             raise HTTPException(status_code=500, detail=f"Error deleting file: {e}")
-    return {"deletedCount": res.deleted_count}
 
+    res = await db.events().delete_many({"camera_id": camera_obj_id, "video_path": {"$in": paths}})
+    deleted = await db.clips().delete_one({"_id": clip["_id"]})
+    return {"deletedCount": res.deleted_count, "clipDeleted": deleted.deleted_count == 1}
+
+@app.get("/camera-files/annotated")
+def annotated_camera_file(video_path: str = Query(...), mode: str = Query("stream")):
+    """Dựng video chú thích từ clip sạch + sidecar: mode=stream phát MJPEG, mode=export trả file mp4."""
+    fs_path = _resolve_clip_path(video_path)
+    sidecar = sidecar_path(fs_path)
+
+    if mode == "export":
+        annotated_path = fs_path.parent / ANNOTATED_FILENAME
+        # Clip đã có bản annotated (định dạng cũ hoặc export trước đó) thì dùng lại
+        if not annotated_path.exists() or (sidecar.exists() and sidecar.stat().st_mtime > annotated_path.stat().st_mtime):
+            frame_count = export_annotated(fs_path, annotated_path)
+            logger.info(f"🎞 Đã export {frame_count} frames chú thích: {annotated_path}")
+        return FileResponse(str(annotated_path), media_type="video/mp4", filename=ANNOTATED_FILENAME)
+
+    if mode != "stream":
+        raise HTTPException(status_code=400, detail="mode must be 'stream' or 'export'.")
+
+    fps = read_sidecar(sidecar)[0].get("fps", 25) if sidecar.exists() else 25
+
+    def mjpeg():
+        for frame in annotated_frames(fs_path):
+            ok, jpeg = cv2.imencode(".jpg", frame)
+            if ok:
+                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg.tobytes() + b"\r\n"
+            time.sleep(1 / fps)
+
+    return StreamingResponse(mjpeg(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+
+def _worker_statuses():
+    # Chế độ nhiều tiến trình: metrics và thống kê suy luận nằm ở từng worker
+    return camera_manager.supervisor.status() if camera_manager.supervisor else None
+
+@app.get("/inference-stats")
+def inference_stats():
+    workers = _worker_statuses()
+    if workers is not None:
+        return {f"worker-{w['worker']}": w.get("inference") or w.get("error") for w in workers}
+    return get_inference_scheduler().get_stats()
+
+@app.get("/metrics")
+def get_metrics():
+    cameras = metrics.snapshot()
+    workers = _worker_statuses()
+    if workers is not None:
+        for worker in workers:
+            for cam_id, values in worker.get("metrics", {}).items():
+                merged = cameras.setdefault(cam_id, {})
+                for name, value in values.items():
+                    merged[name] = merged.get(name, 0) + value
+    for values in cameras.values():
+        received = values.get("frames_received", 0)
+        if received:
+            values["copies_per_frame"] = round(values.get("frame_copies", 0) / received, 3)
+        sent = values.get("stream_frames_sent", 0)
+        if sent:
+            values["stream_encodes_per_sent"] = round(values.get("stream_encodes", 0) / sent, 3)
+    events = get_event_sink().stats()
+    if workers is not None:
+        for worker in workers:
+            for name, value in (worker.get("events") or {}).items():
+                events[name] = events.get(name, 0) + value
+        return {"cameras": cameras, "events": events,
+                "inference": {f"worker-{w['worker']}": w.get("inference") or w.get("error") for w in workers}}
+    return {"cameras": cameras, "events": events, "inference": get_inference_scheduler().get_stats()}
 
-# --- HỆ THỐNG XỬ LÝ VIDEO MỚI ---
-DETECTOR_MAP = {}
-RECORDER_THREADS = {}
-FRAME_QUEUES = {}
-
-def video_recorder(cam_id: str, frame_queue: queue.Queue, detector: Detector):
-    out_clean = out_annotated = None
-    video_path = ""
-    FPS = 25
-    BUFFER_SECONDS = 10
-    buffer_frames = deque(maxlen=BUFFER_SECONDS * FPS)
-
-    is_recording = False
-    abnormal_last_time = 0
-    start_time = None
-    folder_path = ""
-    frame_count = 0
-
-    def save_clip():
-        nonlocal out_clean, out_annotated, video_path, folder_path, frame_count
-        if not folder_path or not video_path:
-            print("[ERROR] ❌ Không có đường dẫn để lưu clip.")
-            return False
-
-        success = True
-        
-        # Đóng các VideoWriter an toàn
-        try:
-            if out_clean:
-                out_clean.release()
-                out_clean = None
-                print(f"[INFO] 🎞 Đã đóng writer cho clean video")
-        except Exception as e:
-            print(f"[ERROR] Lỗi khi đóng clean video writer: {e}")
-            success = False
 
-        try:
-            if out_annotated:
-                out_annotated.release()
-                out_annotated = None
-                print(f"[INFO] 🎞 Đã đóng writer cho annotated video")
-        except Exception as e:
-            print(f"[ERROR] Lỗi khi đóng annotated video writer: {e}")
-            success = False
-
-        # Chờ một chút để đảm bảo file được flush
-        time.sleep(0.5)
-
-        # Kiểm tra file đã được tạo và có kích thước hợp lý
-        clean_path = os.path.join(folder_path, "abnormal_clean.mp4")
-        annotated_path = os.path.join(folder_path, "abnormal_annotated.mp4")
-        
-        files_status = []
-        for file_path, file_type in [(clean_path, "clean"), (annotated_path, "annotated")]:
-            if os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-                if file_size > 0:
-                    files_status.append(f"✅ {file_type}: {file_size} bytes")
-                    print(f"[INFO] ✅ File {file_type} đã lưu thành công: {file_path} ({file_size} bytes)")
-                else:
-                    files_status.append(f"❌ {file_type}: file trống")
-                    print(f"[WARNING] ⚠️ File {file_type} trống: {file_path}")
-                    success = False
-            else:
-                files_status.append(f"❌ {file_type}: không tồn tại")
-                print(f"[ERROR] ❌ Không tìm thấy file {file_type}: {file_path}")
-                success = False
-
-        print(f"[INFO] 📊 Tổng số frame đã ghi: {frame_count}")
-        print(f"[INFO] 📁 Trạng thái files: {' | '.join(files_status)}")
-        
-        if success:
-            print(f"[INFO] 🎞 Clip lưu thành công tại: {video_path}")
-        else:
-            print(f"[ERROR] ❌ Một số file không được lưu đúng cách")
-            
-        return success
-
-    def stop_recording(reason: str):
-        nonlocal is_recording, abnormal_last_time, start_time, video_path, folder_path, frame_count
-        if is_recording:
-            print(f"[DEBUG] 🛑 Dừng ghi video ({reason}): {video_path}")
-            print(f"[DEBUG] 📊 Tổng frame đã ghi trước khi dừng: {frame_count}")
-            
-            save_success = save_clip()
-            is_recording = False
-            
-            # Chỉ log event nếu lưu thành công
-            if save_success and os.path.exists(video_path):
-                try:
-                    log_event("abnormal_end", 1.0, cam_id, video_path=video_path)
-                    print(f"[INFO] ✅ Đã log sự kiện kết thúc cho: {video_path}")
-                except Exception as e:
-                    print(f"[ERROR] Lỗi khi log event: {e}")
-            else:
-                print("[ERROR] ❌ Không thể log sự kiện vì file video không được lưu thành công.")
-            
-            # Reset counters
-            frame_count = 0
-
-    # Khởi tạo biến trạng thái
-    is_recording = False
-    abnormal_last_time = 0
-    start_time = None
-    video_path = ""
-    folder_path = ""
-    frame_count = 0
-
-    # Metadata camera
+# --- HỆ THỐNG XỬ LÝ VIDEO MỚI ---
+# Pipeline mỗi camera do camera_manager quản lý; WebSocket chỉ gửi frame vào và nhận stream ra
+@app.get("/sessions")
+def list_sessions():
+    return [session.status() for session in camera_manager.registry.values()]
+
+@app.delete("/sessions/{cam_id}")
+async def stop_camera_session(cam_id: str):
+    if not await camera_manager.stop_session(cam_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return {"status": "stopped", "cam_id": cam_id}
+
+async def start_server_ingest(cam_id: str, url: str):
+    session = await camera_manager.get_or_create_session(cam_id, video_recorder)
+    # start_ingest chờ worker cũ dừng nên chạy ngoài event loop
+    await asyncio.to_thread(session.start_ingest, url)
+    return session
+
+@app.post("/sessions/{cam_id}/ingest")
+async def start_camera_ingest(cam_id: str):
     try:
-        camera_obj_id = ObjectId(cam_id)
-        camera_doc = camera_col.find_one({"_id": camera_obj_id})
-        if not camera_doc:
-            raise ValueError(f"Không tìm thấy camera với ID: {cam_id}")
-
-        url = camera_doc.get("url", "")
-        parsed_url = urlparse(url)
-        hostname = parsed_url.hostname or "unknown_host"
-        port = parsed_url.port or ""
-        camera_name = f"camera_{hostname.replace('.', '_')}_{port}".strip("_")
-
-        room_name = "unknown_room"
-        room_id = camera_doc.get("room_id")
-        if room_id:
-            room_doc = room_col.find_one({"_id": room_id})
-            if room_doc:
-                room_name = room_doc.get("name", "unknown_room").replace(" ", "_")
-
+        object_id = ObjectId(cam_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid camera_id format.")
+    camera_doc = await db.cameras().find_one({"_id": object_id})
+    if not camera_doc:
+        raise HTTPException(status_code=404, detail="Camera not found.")
+    session = await start_server_ingest(cam_id, camera_doc["url"])
+    return session.status()
+
+@app.delete("/sessions/{cam_id}/ingest")
+async def stop_camera_ingest(cam_id: str):
+    session = camera_manager.registry.get(cam_id)
+    if session is None or not session.ingesting:
+        raise HTTPException(status_code=404, detail="Ingest not running.")
+    await asyncio.to_thread(session.stop_ingest)
+    return session.status()
+
+def prepare_event_collection():
+    # Chạy một lần trên luồng nền nên dùng client đồng bộ của utils/logger.py
+    try:
+        ensure_event_indexes(event_collection)
+        converted = migrate_string_timestamps(event_collection)
+        if converted:
+            logger.info(f"🕒 Đã chuyển {converted} trường thời gian của sự kiện sang datetime")
+        ensure_clip_indexes(clip_collection)
+        backfilled = backfill_clips(event_collection, clip_collection)
+        if backfilled:
+            logger.info(f"🗂 Đã dựng danh mục cho {backfilled} clip cũ từ sự kiện")
     except Exception as e:
-        print(f"[ERROR] Lỗi lấy metadata camera: {e}")
-        camera_name = f"camera_{cam_id[:6]}"
-        room_name = "unknown_room"
-
-    print(f"[INFO] 🎥 Bắt đầu video recorder cho camera: {camera_name} trong phòng: {room_name}")
-
-    while detector.running:
-        try:
-            frame_info = frame_queue.get(timeout=1)
-            raw_frame = frame_info["frame"]
-            timestamp = frame_info["timestamp"]
-
-            if raw_frame is None or raw_frame.size == 0:
-                print("[WARNING] ⚠️ Frame rỗng, bỏ qua")
-                continue
-
-            annotated = detector.get_latest_annotated_frame()
-            if annotated is None:
-                annotated = raw_frame.copy()
-
-            # Thêm frame vào buffer
-            buffer_frames.append({
-                "raw": raw_frame.copy(),
-                "annotated": annotated.copy()
-            })
-
-            if detector.is_abnormal:
-                abnormal_last_time = time.time()
-
-                if not is_recording:
-                    is_recording = True
-                    start_time = timestamp
-                    frame_count = 0
-
-                    # Tạo đường dẫn thư mục
-                    date_str = time.strftime("%Y-%m-%d", time.localtime(timestamp))
-                    time_str = time.strftime("%H-%M-%S", time.localtime(timestamp))
-                    folder_path = os.path.join(VIDEO_OUTPUT_DIR, room_name, camera_name, date_str, time_str)
-                    
-                    try:
-                        os.makedirs(folder_path, exist_ok=True)
-                        print(f"[INFO] 📁 Tạo thư mục thành công: {folder_path}")
-                    except Exception as e:
-                        print(f"[ERROR] Không thể tạo thư mục: {folder_path}, lỗi: {e}")
-                        continue
-
-                    # Thiết lập đường dẫn file
-                    path_clean = os.path.join(folder_path, "abnormal_clean.mp4").replace("\\", "/")
-                    path_annotated = os.path.join(folder_path, "abnormal_annotated.mp4").replace("\\", "/")
-                    video_path = path_clean
-
-                    # Khởi tạo VideoWriter
-                    h, w = raw_frame.shape[:2]
-                    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-                    
-                    try:
-                        out_clean = cv2.VideoWriter(path_clean, fourcc, FPS, (w, h))
-                        out_annotated = cv2.VideoWriter(path_annotated, fourcc, FPS, (w, h))
-                        
-                        # Kiểm tra xem VideoWriter có được khởi tạo thành công không
-                        if not out_clean.isOpened():
-                            print(f"[ERROR] ❌ Không thể khởi tạo VideoWriter cho: {path_clean}")
-                            continue
-                        if not out_annotated.isOpened():
-                            print(f"[ERROR] ❌ Không thể khởi tạo VideoWriter cho: {path_annotated}")
-                            continue
-                            
-                        print(f"[DEBUG] 🎥 Bắt đầu ghi abnormal: {path_clean}")
-                        print(f"[DEBUG] 📂 Bắt đầu ghi vào thư mục: {folder_path}")
-                        
-                        # Log sự kiện bắt đầu
-                        try:
-                            log_event("abnormal_start", 1.0, cam_id, video_path=video_path)
-                        except Exception as e:
-                            print(f"[ERROR] Lỗi khi log event start: {e}")
-
-                        # Ghi buffer frames
-                        for bf in buffer_frames:
-                            try:
-                                out_clean.write(bf["raw"])
-                                out_annotated.write(bf["annotated"])
-                                frame_count += 1
-                            except Exception as e:
-                                print(f"[ERROR] Lỗi khi ghi buffer frame: {e}")
-                                
-                    except Exception as e:
-                        print(f"[ERROR] Lỗi khi khởi tạo VideoWriter: {e}")
-                        continue
-
-                # Ghi frame hiện tại
-                if is_recording and out_clean and out_annotated:
-                    try:
-                        out_clean.write(raw_frame)
-                        out_annotated.write(annotated)
-                        frame_count += 1
-                        
-                        # Log tiến trình mỗi 100 frame
-                        if frame_count % 100 == 0:
-                            print(f"[DEBUG] 📊 Đã ghi {frame_count} frames")
-                            
-                    except Exception as e:
-                        print(f"[ERROR] Lỗi khi ghi frame: {e}")
-
-            elif is_recording:
-                # Kiểm tra xem có nên dừng ghi không
-                if time.time() - abnormal_last_time >= 3:
-                    stop_recording("3s không còn bất thường")
-
-        except queue.Empty:
-            # Mất kết nối khi đang ghi
-            if is_recording and (time.time() - abnormal_last_time >= 3):
-                stop_recording("mất kết nối khi đang ghi")
-            continue
-        except Exception as e:
-            print(f"[ERROR] Lỗi trong video recorder loop: {e}")
-            if is_recording:
-                stop_recording("lỗi trong quá trình ghi")
-            continue
-
-    # Cleanup khi thoát
-    if is_recording:
-        stop_recording("kết thúc chương trình")
-    
-    print(f"[INFO] 🏁 Video recorder cho camera {cam_id} đã kết thúc")
+        logger.error(f"Lỗi khi tạo index / chuyển dữ liệu sự kiện: {e}")
+
+async def start_camera_pipelines():
+    if CAMERA_WORKER_PROCESSES > 0:
+        # Pipeline camera chạy trong các tiến trình worker, tiến trình này chỉ lo API và phát stream
+        await asyncio.to_thread(camera_manager.enable_sharding, CAMERA_WORKER_PROCESSES)
+
+    # Backend tự đọc mọi camera đã lưu, không cần client đẩy frame
+    if not SERVER_INGEST_ENABLED:
+        return
+    for cam in await db.cameras().find({}, {"url": 1}).to_list():
+        if cam.get("url"):
+            await start_server_ingest(str(cam["_id"]), cam["url"])
+
+async def stop_camera_sessions():
+    await camera_manager.stop_all()
+    # Ghi nốt sự kiện còn trong hàng đợi
+    await asyncio.to_thread(get_event_sink().close)
+    await db.close()
 
 @app.websocket("/ws/video")
-async def websocket_video(websocket: WebSocket, cam_id: str = Query(...)):
+async def websocket_video(websocket: WebSocket, cam_id: str = Query(...),
+                          width: int = Query(None), height: int = Query(None),
+                          quality: int = Query(None), fps: float = Query(None)):
     await websocket.accept()
     print(f"[INFO] 🔌 WebSocket connected for camera: {cam_id}")
 
-    detector = Detector(cam_id)
-    frame_queue = queue.Queue(maxsize=300)
+    # Nhiều viewer của cùng camera dùng chung một session (một detector, một recorder)
+    session = await camera_manager.get_or_create_session(cam_id, video_recorder)
+    session.attach()
 
-    DETECTOR_MAP[cam_id] = detector
-    FRAME_QUEUES[cam_id] = frame_queue
+    # Profile stream do viewer yêu cầu; có thể đổi giữa chừng bằng tin nhắn text {"type": "profile", ...}
+    sender = AdaptiveSender(StreamProfile(width, height, quality, fps))
+    print(f"[INFO] 📐 Stream profile cho {cam_id}: {sender.requested} ({session.viewers} viewer)")
 
-    recorder_thread = Thread(target=video_recorder, args=(cam_id, frame_queue, detector), daemon=True)
-    recorder_thread.start()
-    RECORDER_THREADS[cam_id] = recorder_thread
+    def handle_control_message(text: str):
+        try:
+            message = json.loads(text)
+            if message.get("type") == "profile":
+                sender.set_profile(StreamProfile.from_message(message))
+                print(f"[INFO] 📐 Đổi stream profile cho {cam_id}: {sender.requested}")
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"[WARNING] ⚠️ Tin nhắn điều khiển không hợp lệ từ {cam_id}: {e}")
 
     async def receive_loop():
+        # Viewer có thể đồng thời là nguồn frame (client đẩy JPEG lên) hoặc chỉ xem
         try:
-            while detector.running:
-                data = await websocket.receive_bytes()
-                frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
-                if frame is not None:
-                    timestamp = time.time()
-                    
-                    # Cập nhật frame cho detector
-                    with detector.lock:
-                        detector.latest_raw_frame = frame.copy()
-                    
-                    # Đưa frame vào queue cho recorder
-                    try:
-                        frame_queue.put_nowait({
-                            "frame": frame.copy(),
-                            "timestamp": timestamp
-                        })
-                    except queue.Full:
-                        # Nếu queue đầy, bỏ qua frame cũ nhất
-                        try:
-                            frame_queue.get_nowait()
-                            frame_queue.put_nowait({
-                                "frame": frame.copy(),
-                                "timestamp": timestamp
-                            })
-                        except queue.Empty:
-                            pass
-                    
-                    # Log định kỳ để debug
-                    if hasattr(receive_loop, 'frame_count'):
-                        receive_loop.frame_count += 1
-                    else:
-                        receive_loop.frame_count = 1
-                    
-                    if receive_loop.frame_count % 100 == 0:
-                        print(f"[DEBUG] 📊 Đã nhận {receive_loop.frame_count} frames từ client")
-                        
+            while session.running:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                if message.get("text") is not None:
+                    handle_control_message(message["text"])
+                elif message.get("bytes"):
+                    session.ingest(message["bytes"])
         except WebSocketDisconnect:
             print(f"[INFO] 📱 Client disconnected: {cam_id}")
         except Exception as e:
             print(f"[ERROR] receive_loop: {e}")
         finally:
-            detector.running = False
             print(f"[INFO] 🛑 Receive loop stopped for {cam_id}")
 
-    async def detect_loop():
-        try:
-            detect_count = 0
-            while detector.running:
-                with detector.lock:
-                    frame = detector.latest_raw_frame.copy() if detector.latest_raw_frame is not None else None
-                    
-                if frame is not None:
-                    # Chạy detection trong thread riêng
-                    Thread(target=detector.detect_on_frame, args=(frame,), daemon=True).start()
-                    detect_count += 1
-                    
-                    if detect_count % 10 == 0:
-                        print(f"[DEBUG] 🔍 Đã chạy {detect_count} lần detection. Abnormal: {detector.is_abnormal}")
-                        
-                await asyncio.sleep(detector.DETECT_INTERVAL)
-        except Exception as e:
-            print(f"[ERROR] detect_loop: {e}")
-        finally:
-            detector.running = False
-            print(f"[INFO] 🛑 Detect loop stopped for {cam_id}")
-
     async def stream_loop():
         try:
             stream_count = 0
-            while detector.running:
-                with detector.lock:
-                    frame = detector.latest_raw_frame.copy() if detector.latest_raw_frame is not None else None
-                    
-                if frame is not None:
-                    annotated = detector.get_latest_annotated_frame()
-                    if annotated is None:
-                        annotated = frame
-                        
-                    _, jpeg = cv2.imencode(".jpg", annotated)
-                    await websocket.send_bytes(jpeg.tobytes())
+            last_key = None
+            while session.running:
+                # Chỉ gửi khi có frame mới hoặc box đổi; detector cache JPEG theo profile và (seq, boxes_version)
+                key, jpeg = session.get_latest_stream_jpeg(sender.profile)
+                last_sent = jpeg is not None and key != last_key
+                if last_sent:
+                    start = time.time()
+                    await websocket.send_bytes(jpeg)
+                    sender.record_send(time.time() - start)
+                    last_key = key
                     stream_count += 1
-                    
+                    metrics.incr(cam_id, "stream_frames_sent")
+                    metrics.incr(cam_id, "stream_bytes_sent", len(jpeg))
+                    metrics.set_value(cam_id, "stream_level", sender.level)
+                    metrics.set_value(cam_id, "stream_fps", round(sender.fps, 2))
+
                     if stream_count % 100 == 0:
                         print(f"[DEBUG] 📺 Đã stream {stream_count} frames")
-                        
-                await asyncio.sleep(1 / 30)
+
+                # Vừa gửi thì chờ theo fps hiệu lực của viewer, chưa có frame mới thì hỏi lại sau 1/30 s
+                await asyncio.sleep(sender.interval if last_sent else 1 / 30)
         except WebSocketDisconnect:
             print(f"[INFO] 📱 Client disconnected during streaming: {cam_id}")
         except Exception as e:
             print(f"[ERROR] stream_loop: {e}")
         finally:
-            detector.running = False
             print(f"[INFO] 🛑 Stream loop stopped for {cam_id}")
 
+    tasks = [asyncio.create_task(receive_loop()), asyncio.create_task(stream_loop())]
     try:
         print(f"[INFO] 🚀 Starting WebSocket loops for {cam_id}")
-        await asyncio.gather(
-            receive_loop(),
-            detect_loop(),
-            stream_loop()
-        )
+        # Một trong hai vòng lặp dừng (mất kết nối, session bị dừng) thì đóng kết nối này
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
     except Exception as e:
         print(f"[ERROR] WebSocket error for {cam_id}: {e}")
     finally:
-        print(f"[INFO] 🧹 Cleaning up WebSocket: {cam_id}")
-        detector.cleanup()
-        detector.running = False
-        
-        # Đợi recorder thread kết thúc
-        if recorder_thread.is_alive():
-            print(f"[INFO] ⏳ Waiting for recorder thread to finish...")
-            recorder_thread.join(timeout=5)
-            if recorder_thread.is_alive():
-                print(f"[WARNING] ⚠️ Recorder thread didn't finish in time")
-        
-        # Cleanup resources
-        DETECTOR_MAP.pop(cam_id, None)
-        FRAME_QUEUES.pop(cam_id, None)
-        RECORDER_THREADS.pop(cam_id, None)
-        
-        print(f"[INFO] ✅ Resources for {cam_id} cleaned up.")
-
-
-def video_recorder(cam_id: str, frame_queue: queue.Queue, detector: Detector):
-    """Improved video recorder with better error handling and logging"""
-    out_clean = out_annotated = None
-    video_path = ""
-    FPS = 25
-    BUFFER_SECONDS = 10
-    buffer_frames = deque(maxlen=BUFFER_SECONDS * FPS)
-
-    is_recording = False
-    abnormal_last_time = 0
-    start_time = None
-    folder_path = ""
-    frame_count = 0
-    total_frames_received = 0
-
-    def save_clip():
-        nonlocal out_clean, out_annotated, video_path, folder_path, frame_count
-        if not folder_path or not video_path:
-            print(f"[ERROR] ❌ Không có đường dẫn để lưu clip. folder_path: {folder_path}, video_path: {video_path}")
-            return False
-
-        success = True
-        
-        print(f"[INFO] 💾 Đang lưu clip với {frame_count} frames...")
-        
-        # Đóng các VideoWriter an toàn
-        try:
-            if out_clean:
-                out_clean.release()
-                out_clean = None
-                print(f"[INFO] 🎞 Đã đóng writer cho clean video")
-        except Exception as e:
-            print(f"[ERROR] Lỗi khi đóng clean video writer: {e}")
-            success = False
-
-        try:
-            if out_annotated:
-                out_annotated.release()
-                out_annotated = None
-                print(f"[INFO] 🎞 Đã đóng writer cho annotated video")
-        except Exception as e:
-            print(f"[ERROR] Lỗi khi đóng annotated video writer: {e}")
-            success = False
-
-        # Chờ một chút để đảm bảo file được flush
-        time.sleep(0.5)
-
-        # Kiểm tra file đã được tạo và có kích thước hợp lý
-        clean_path = os.path.join(folder_path, "abnormal_clean.mp4")
-        annotated_path = os.path.join(folder_path, "abnormal_annotated.mp4")
-        
-        files_status = []
-        for file_path, file_type in [(clean_path, "clean"), (annotated_path, "annotated")]:
-            if os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-                if file_size > 0:
-                    files_status.append(f"✅ {file_type}: {file_size} bytes")
-                    print(f"[INFO] ✅ File {file_type} đã lưu thành công: {file_path} ({file_size} bytes)")
-                else:
-                    files_status.append(f"❌ {file_type}: file trống")
-                    print(f"[WARNING] ⚠️ File {file_type} trống: {file_path}")
-                    success = False
-            else:
-                files_status.append(f"❌ {file_type}: không tồn tại")
-                print(f"[ERROR] ❌ Không tìm thấy file {file_type}: {file_path}")
-                success = False
-
-        print(f"[INFO] 📊 Tổng số frame đã ghi: {frame_count}")
-        print(f"[INFO] 📁 Trạng thái files: {' | '.join(files_status)}")
-        print(f"[INFO] 🎞 Clip lưu tại: {video_path}")
-        
-        if success:
-            print(f"[INFO] ✅ Clip lưu thành công tại: {video_path}")
-        else:
-            print(f"[ERROR] ❌ Một số file không được lưu đúng cách")
-            
-        return success
-
-    def stop_recording(reason: str):
-        nonlocal is_recording, abnormal_last_time, start_time, video_path, folder_path, frame_count
-        if is_recording:
-            print(f"[DEBUG] 🛑 Dừng ghi video ({reason}): {video_path}")
-            print(f"[DEBUG] 📊 Tổng frame đã ghi trước khi dừng: {frame_count}")
-            
-            save_success = save_clip()
-            is_recording = False
-            
-            # Chỉ log event nếu lưu thành công
-            if save_success and os.path.exists(video_path):
-                try:
-                    log_event("abnormal_end", 1.0, cam_id, video_path=video_path)
-                    print(f"[INFO] ✅ Đã log sự kiện kết thúc cho: {video_path}")
-                except Exception as e:
-                    print(f"[ERROR] Lỗi khi log event: {e}")
-            else:
-                print("[ERROR] ❌ Không thể log sự kiện vì file video không được lưu thành công.")
-            
-            # Reset counters
-            frame_count = 0
-
-    # Khởi tạo metadata camera
-    try:
-        camera_obj_id = ObjectId(cam_id)
-        camera_doc = camera_col.find_one({"_id": camera_obj_id})
-        if not camera_doc:
-            raise ValueError(f"Không tìm thấy camera với ID: {cam_id}")
-
-        url = camera_doc.get("url", "")
-        parsed_url = urlparse(url)
-        hostname = parsed_url.hostname or "unknown_host"
-        port = parsed_url.port or ""
-        camera_name = f"camera_{hostname.replace('.', '_')}_{port}".strip("_")
-
-        room_name = "unknown_room"
-        room_id = camera_doc.get("room_id")
-        if room_id:
-            room_doc = room_col.find_one({"_id": room_id})
-            if room_doc:
-                room_name = room_doc.get("name", "unknown_room").replace(" ", "_")
-
-        print(f"[INFO] 🎥 Video recorder metadata - Camera: {camera_name}, Room: {room_name}")
-
-    except Exception as e:
-        print(f"[ERROR] Lỗi lấy metadata camera: {e}")
-        camera_name = f"camera_{cam_id[:6]}"
-        room_name = "unknown_room"
-
-    print(f"[INFO] 🎥 Bắt đầu video recorder cho camera: {camera_name} trong phòng: {room_name}")
-
-    # Main recording loop
-    while detector.running:
-        try:
-            frame_info = frame_queue.get(timeout=1)
-            raw_frame = frame_info["frame"]
-            timestamp = frame_info["timestamp"]
-            total_frames_received += 1
-
-            if raw_frame is None or raw_frame.size == 0:
-                print("[WARNING] ⚠️ Frame rỗng, bỏ qua")
-                continue
-
-            # Log định kỳ để debug
-            if total_frames_received % 500 == 0:
-                print(f"[DEBUG] 📊 Recorder đã nhận {total_frames_received} frames, đang ghi: {is_recording}")
-
-            annotated = detector.get_latest_annotated_frame()
-            if annotated is None:
-                annotated = raw_frame.copy()
-
-            # Thêm frame vào buffer
-            buffer_frames.append({
-                "raw": raw_frame.copy(),
-                "annotated": annotated.copy()
-            })
-
-            # Kiểm tra trạng thái abnormal
-            if detector.is_abnormal:
-                abnormal_last_time = time.time()
-
-                if not is_recording:
-                    print(f"[INFO] 🚨 Bắt đầu ghi video do phát hiện bất thường")
-                    is_recording = True
-                    start_time = timestamp
-                    frame_count = 0
-
-                    # Tạo đường dẫn thư mục
-                    date_str = time.strftime("%Y-%m-%d", time.localtime(timestamp))
-                    time_str = time.strftime("%H-%M-%S", time.localtime(timestamp))
-                    folder_path = os.path.join(VIDEO_OUTPUT_DIR, room_name, camera_name, date_str, time_str)
-                    
-                    try:
-                        os.makedirs(folder_path, exist_ok=True)
-                        print(f"[INFO] 📁 Tạo thư mục thành công: {folder_path}")
-                    except Exception as e:
-                        print(f"[ERROR] Không thể tạo thư mục: {folder_path}, lỗi: {e}")
-                        continue
-
-                    # Thiết lập đường dẫn file
-                    path_clean = os.path.join(folder_path, "abnormal_clean.mp4").replace("\\", "/")
-                    path_annotated = os.path.join(folder_path, "abnormal_annotated.mp4").replace("\\", "/")
-                    video_path = path_clean
-
-                    print(f"[INFO] 📂 Video paths:")
-                    print(f"  Clean: {path_clean}")
-                    print(f"  Annotated: {path_annotated}")
-
-                    # Khởi tạo VideoWriter
-                    h, w = raw_frame.shape[:2]
-                    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-                    
-                    try:
-                        out_clean = cv2.VideoWriter(path_clean, fourcc, FPS, (w, h))
-                        out_annotated = cv2.VideoWriter(path_annotated, fourcc, FPS, (w, h))
-                        
-                        # Kiểm tra xem VideoWriter có được khởi tạo thành công không
-                        if not out_clean.isOpened():
-                            print(f"[ERROR] ❌ Không thể khởi tạo VideoWriter cho: {path_clean}")
-                            continue
-                        if not out_annotated.isOpened():
-                            print(f"[ERROR] ❌ Không thể khởi tạo VideoWriter cho: {path_annotated}")
-                            continue
-                            
-                        print(f"[INFO] 🎥 VideoWriter khởi tạo thành công cho {w}x{h} @ {FPS}fps")
-                        
-                        # Log sự kiện bắt đầu
-                        try:
-                            log_event("abnormal_start", 1.0, cam_id, video_path=video_path)
-                        except Exception as e:
-                            print(f"[ERROR] Lỗi khi log event start: {e}")
-
-                        # Ghi buffer frames
-                        buffer_count = 0
-                        for bf in buffer_frames:
-                            try:
-                                out_clean.write(bf["raw"])
-                                out_annotated.write(bf["annotated"])
-                                buffer_count += 1
-                                frame_count += 1
-                            except Exception as e:
-                                print(f"[ERROR] Lỗi khi ghi buffer frame: {e}")
-                        
-                        print(f"[INFO] 📼 Đã ghi {buffer_count} frames từ buffer")
-                                
-                    except Exception as e:
-                        print(f"[ERROR] Lỗi khi khởi tạo VideoWriter: {e}")
-                        continue
-
-                # Ghi frame hiện tại
-                if is_recording and out_clean and out_annotated:
-                    try:
-                        out_clean.write(raw_frame)
-                        out_annotated.write(annotated)
-                        frame_count += 1
-                        
-                        # Log tiến trình mỗi 100 frame
-                        if frame_count % 100 == 0:
-                            print(f"[DEBUG] 📊 Đã ghi {frame_count} frames")
-                            
-                    except Exception as e:
-                        print(f"[ERROR] Lỗi khi ghi frame: {e}")
-
-            elif is_recording:
-                # Kiểm tra xem có nên dừng ghi không
-                if time.time() - abnormal_last_time >= 3:
-                    stop_recording("3s không còn bất thường")
-
-        except queue.Empty:
-            # Timeout - kiểm tra xem có nên dừng ghi không
-            if is_recording and abnormal_last_time > 0 and (time.time() - abnormal_last_time >= 3):
-                stop_recording("timeout - mất kết nối")
-            continue
-        except Exception as e:
-            print(f"[ERROR] Lỗi trong video recorder loop: {e}")
-            if is_recording:
-                stop_recording("lỗi trong quá trình ghi")
-            continue
-
-    # Cleanup khi thoát
-    if is_recording:
-        stop_recording("kết thúc chương trình")
-    
-    print(f"[INFO] 🏁 Video recorder cho camera {cam_id} đã kết thúc. Tổng frames nhận: {total_frames_received}")
\ No newline at end of file
+        for task in tasks:
+            task.cancel()
+        session.detach()
+        # Session vẫn chạy tiếp (detection + ghi clip) khi viewer rời đi
+        print(f"[INFO] 🔌 Viewer rời camera {cam_id}, còn {session.viewers} viewer")
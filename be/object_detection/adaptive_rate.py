@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+
+from config import (
+    DETECT_INTERVAL_ACTIVE, DETECT_INTERVAL_NORMAL, DETECT_INTERVAL_IDLE,
+    MOTION_FRAME_WIDTH, MOTION_PIXEL_THRESHOLD, MOTION_RATIO_THRESHOLD,
+    MOTION_HOLD_SECONDS, IDLE_AFTER_SECONDS
+)
+
+
+class FrameDifferencer:
+    """Đo chuyển động rẻ bằng cách so sánh hai bản thu nhỏ, xám liên tiếp."""
+
+    def __init__(self, width: int = MOTION_FRAME_WIDTH, pixel_threshold: int = MOTION_PIXEL_THRESHOLD):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.prev = None
+
+    def motion_ratio(self, frame) -> float:
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        prev, self.prev = self.prev, gray
+        if prev is None or prev.shape != gray.shape:
+            # Frame đầu tiên: coi như có chuyển động để chạy detection ngay
+            return 1.0
+        diff = cv2.absdiff(gray, prev)
+        return np.count_nonzero(diff > self.pixel_threshold) / diff.size
+
+
+class AdaptiveDetectRate:
+    """Chọn khoảng cách giữa hai lần detection theo chuyển động và trạng thái bất thường."""
+
+    def __init__(self):
+        self.differencer = FrameDifferencer()
+        self.min_interval = DETECT_INTERVAL_ACTIVE
+        self.interval = DETECT_INTERVAL_NORMAL
+        self.last_motion_time = 0
+        self.motion_ratio = 0.0
+
+    def update(self, frame, is_abnormal: bool, now: float) -> float:
+        """Đo chuyển động của frame mới rồi chọn lại chu kỳ."""
+        self.motion_ratio = self.differencer.motion_ratio(frame)
+        if self.motion_ratio >= MOTION_RATIO_THRESHOLD:
+            self.last_motion_time = now
+        return self.refresh(is_abnormal, now)
+
+    def refresh(self, is_abnormal: bool, now: float) -> float:
+        """Chọn lại chu kỳ theo thời gian trôi qua, không đo chuyển động (chưa có frame mới)."""
+        since_motion = now - self.last_motion_time
+        if is_abnormal or since_motion <= MOTION_HOLD_SECONDS:
+            self.interval = DETECT_INTERVAL_ACTIVE
+        elif since_motion >= IDLE_AFTER_SECONDS:
+            self.interval = DETECT_INTERVAL_IDLE
+        else:
+            self.interval = DETECT_INTERVAL_NORMAL
+        return self.interval
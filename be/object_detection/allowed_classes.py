@@ -1,3 +1,5 @@
+import numpy as np
+
 ALLOWED_CLASSES = [
     'person', 'axe', 'chainsaw', 'dagger', 'hammer', 'knife', 'scissors', 'screwdriver', 'sword', 'rifle', 'shotgun', 'handgun', 'missile', 'bomb', 'weapon', 
     'bear', 'bull', 'crocodile', 'leopard', 'lion', 'tiger', 'scorpion', 'snake', 'door'
@@ -11,3 +13,39 @@ WEAPON_CLASSES = {
     "axe", "chainsaw", "dagger", "drill", "hammer", "knife", "scissors", 
     "screwdriver", "sword", "rifle", "shotgun", "handgun", "missile", "bomb", "weapon"
 }
+
+# Mã nhóm dùng cho tra cứu vector theo class id
+CATEGORY_OTHER = 0
+CATEGORY_HUMAN = 1
+CATEGORY_WEAPON = 2
+CATEGORY_ANIMAL = 3
+CATEGORY_DOOR = 4
+
+
+class ClassTable:
+    """Bảng tra class id -> nhóm / nhãn, biên dịch một lần cho mỗi mô hình đã nạp."""
+
+    def __init__(self, names):
+        size = max(names) + 1 if names else 0
+        allowed = set(ALLOWED_CLASSES)
+
+        self.labels = [str(i) for i in range(size)]
+        self.category = np.full(size, CATEGORY_OTHER, dtype=np.int8)
+        self.allowed_ids = []
+
+        for class_id, name in names.items():
+            label = name.lower()
+            self.labels[class_id] = name
+            if label in allowed:
+                self.allowed_ids.append(class_id)
+            if label in HUMAN_CLASSES:
+                self.category[class_id] = CATEGORY_HUMAN
+            elif label in WEAPON_CLASSES:
+                self.category[class_id] = CATEGORY_WEAPON
+            elif label in DANGEROUS_ANIMALS:
+                self.category[class_id] = CATEGORY_ANIMAL
+            elif label == "door":
+                self.category[class_id] = CATEGORY_DOOR
+
+    def categorize(self, cls):
+        return self.category[np.asarray(cls, dtype=np.int64)]
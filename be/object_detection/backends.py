@@ -0,0 +1,242 @@
+import ast
+import copy
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+import yaml
+from ultralytics.engine.results import Results
+
+from config import INFERENCE_IMGSZ, INFERENCE_CONF, INFERENCE_IOU, INFERENCE_MAX_DET
+
+
+class InferenceBackend(ABC):
+    """Giao diện chung: predict(frames, classes) -> list[Results] giống hệt đường ultralytics.
+
+    Nhờ vậy tracker, _group_boxes và draw_boxes không cần biết backend nào đang chạy.
+    `names` (id lớp -> tên) là của từng mô hình, gán trong __init__.
+    """
+
+    name = "base"
+
+    def __init__(self, names: dict):
+        self.names = names
+
+    @abstractmethod
+    def predict(self, frames, classes=None):
+        ...
+
+    def clone(self):
+        # Bản dùng cho worker suy luận thứ hai trở đi
+        return self
+
+
+class UltralyticsBackend(InferenceBackend):
+    name = "ultralytics"
+
+    def __init__(self, weights: str):
+        from ultralytics import YOLO
+        self.model = YOLO(weights)
+        super().__init__(self.model.names)
+
+    def predict(self, frames, classes=None):
+        return self.model.predict(
+            frames,
+            classes=classes,
+            imgsz=INFERENCE_IMGSZ,
+            conf=INFERENCE_CONF,
+            iou=INFERENCE_IOU,
+            max_det=INFERENCE_MAX_DET,
+            verbose=False
+        )
+
+    def clone(self):
+        # Predictor của ultralytics không an toàn khi dùng chung giữa các luồng
+        clone = copy.copy(self)
+        clone.model = copy.deepcopy(self.model)
+        return clone
+
+
+def letterbox(frame, size):
+    h, w = frame.shape[:2]
+    th, tw = size
+    ratio = min(th / h, tw / w)
+    nh, nw = int(round(h * ratio)), int(round(w * ratio))
+    top, left = (th - nh) // 2, (tw - nw) // 2
+
+    canvas = np.full((th, tw, 3), 114, dtype=np.uint8)
+    resized = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nh, nw) != (h, w) else frame
+    canvas[top:top + nh, left:left + nw] = resized
+    return canvas, ratio, (left, top)
+
+
+class ExportedYoloBackend(InferenceBackend):
+    """Tiền/hậu xử lý dùng chung cho mô hình YOLOv8 đã export (ONNX, OpenVINO)."""
+
+    def __init__(self, names, imgsz, dynamic_batch: bool, end2end: bool = False):
+        super().__init__(names)
+        self.imgsz = imgsz
+        self.dynamic_batch = dynamic_batch
+        self.end2end = end2end
+
+    @abstractmethod
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        ...
+
+    def predict(self, frames, classes=None):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+
+        blobs, transforms = [], []
+        for frame in frames:
+            canvas, ratio, pad = letterbox(frame, self.imgsz)
+            blobs.append(canvas[:, :, ::-1].transpose(2, 0, 1))  # BGR -> RGB, HWC -> CHW
+            transforms.append((ratio, pad))
+        batch = np.ascontiguousarray(np.stack(blobs), dtype=np.float32) / 255.0
+
+        if self.dynamic_batch:
+            outputs = self._infer(batch)
+        else:
+            outputs = np.concatenate([self._infer(batch[i:i + 1]) for i in range(len(batch))])
+
+        allowed = np.asarray(classes, dtype=np.int64) if classes is not None else None
+        return [
+            self._postprocess(output, frame, ratio, pad, allowed)
+            for output, frame, (ratio, pad) in zip(outputs, frames, transforms)
+        ]
+
+    def _postprocess(self, output, frame, ratio, pad, allowed):
+        if self.end2end:
+            # Đầu ra (N, 6): x1, y1, x2, y2, conf, cls — mô hình đã tự NMS
+            boxes, scores, cls = output[:, :4], output[:, 4], output[:, 5].astype(np.int64)
+        else:
+            # Đầu ra (4 + nc, N): cx, cy, w, h, điểm theo từng lớp
+            pred = output.T
+            class_scores = pred[:, 4:]
+            cls = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(cls)), cls]
+            cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+            boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+
+        keep = scores >= INFERENCE_CONF
+        if allowed is not None:
+            keep &= np.isin(cls, allowed)
+        boxes, scores, cls = boxes[keep], scores[keep], cls[keep]
+
+        if len(boxes) and not self.end2end:
+            xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+            idx = cv2.dnn.NMSBoxesBatched(xywh.tolist(), scores.tolist(), cls.tolist(), INFERENCE_CONF, INFERENCE_IOU)
+            idx = np.asarray(idx, dtype=np.int64).reshape(-1)[:INFERENCE_MAX_DET]
+            boxes, scores, cls = boxes[idx], scores[idx], cls[idx]
+
+        # Bỏ letterbox để về toạ độ frame gốc
+        h, w = frame.shape[:2]
+        boxes = boxes.copy()
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / ratio).clip(0, w)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / ratio).clip(0, h)
+
+        data = np.concatenate([boxes, scores[:, None], cls[:, None].astype(np.float32)], axis=1)
+        return Results(frame, path="", names=self.names, boxes=torch.from_numpy(data.astype(np.float32)))
+
+
+def _parse_names(raw):
+    return {int(k): v for k, v in (ast.literal_eval(raw) if isinstance(raw, str) else raw).items()}
+
+
+def _parse_imgsz(raw):
+    imgsz = ast.literal_eval(raw) if isinstance(raw, str) else raw
+    return tuple(imgsz) if isinstance(imgsz, (list, tuple)) else (imgsz, imgsz)
+
+
+class OnnxRuntimeBackend(ExportedYoloBackend):
+    name = "onnxruntime"
+
+    def __init__(self, path: str):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Cần cài onnxruntime để dùng INFERENCE_BACKEND='onnxruntime'") from e
+
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        imgsz = _parse_imgsz(meta.get("imgsz", INFERENCE_IMGSZ))
+        if isinstance(model_input.shape[2], int):
+            imgsz = (model_input.shape[2], model_input.shape[3])
+        super().__init__(
+            names=_parse_names(meta["names"]),
+            imgsz=imgsz,
+            dynamic_batch=not isinstance(model_input.shape[0], int),
+            end2end=meta.get("end2end", "False") == "True",
+        )
+
+    def _infer(self, batch):
+        # InferenceSession.run an toàn khi gọi đồng thời nên clone() dùng chung session
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(ExportedYoloBackend):
+    name = "openvino"
+
+    def __init__(self, path: str):
+        try:
+            import openvino as ov
+        except ImportError as e:
+            raise ImportError("Cần cài openvino để dùng INFERENCE_BACKEND='openvino'") from e
+
+        model_dir = Path(path)
+        xml = next(model_dir.glob("*.xml")) if model_dir.is_dir() else model_dir
+        with open(xml.parent / "metadata.yaml", encoding="utf-8") as f:
+            meta = yaml.safe_load(f)
+
+        core = ov.Core()
+        model = core.read_model(str(xml))
+        model_input = model.inputs[0].get_partial_shape()
+        self.compiled = core.compile_model(model, "CPU", {"PERFORMANCE_HINT": "THROUGHPUT"})
+        self.request = self.compiled.create_infer_request()
+
+        imgsz = _parse_imgsz(meta.get("imgsz", INFERENCE_IMGSZ))
+        if model_input[2].is_static:
+            imgsz = (model_input[2].get_length(), model_input[3].get_length())
+        super().__init__(
+            names=_parse_names(meta["names"]),
+            imgsz=imgsz,
+            dynamic_batch=model_input[0].is_dynamic,
+            end2end=bool(meta.get("end2end", False)),
+        )
+
+    def _infer(self, batch):
+        return self.request.infer({0: batch})[0]
+
+    def clone(self):
+        # Mô hình đã biên dịch dùng chung, mỗi worker một infer request
+        clone = copy.copy(self)
+        clone.request = self.compiled.create_infer_request()
+        return clone
+
+
+BACKENDS = {
+    "ultralytics": UltralyticsBackend,
+    "onnxruntime": OnnxRuntimeBackend,
+    "openvino": OpenVinoBackend,
+}
+
+
+def backend_model_path(backend: str, weights: str) -> str:
+    # Theo quy ước tên file khi export bằng ultralytics: model.onnx, model_openvino_model/
+    path = Path(weights)
+    if backend == "onnxruntime" and path.suffix == ".pt":
+        return str(path.with_suffix(".onnx"))
+    if backend == "openvino" and path.suffix == ".pt":
+        return str(path.with_name(f"{path.stem}_openvino_model"))
+    return weights
+
+
+def create_backend(backend: str, weights: str) -> InferenceBackend:
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend suy luận không hợp lệ: {backend} (hỗ trợ: {', '.join(BACKENDS)})")
+    return BACKENDS[backend](backend_model_path(backend, weights))
@@ -0,0 +1,21 @@
+from config import SCREENING_MODEL_WEIGHTS, CASCADE_ENABLED, CASCADE_CAMERAS
+from .inference_scheduler import get_inference_scheduler
+
+
+def cascade_enabled_for(cam_id: str) -> bool:
+    return CASCADE_CAMERAS.get(cam_id, CASCADE_ENABLED)
+
+
+class ScreeningStage:
+    """Tầng sàng lọc bằng mô hình nhỏ: chỉ trả lời frame có ứng viên đáng chạy mô hình lớn hay không.
+
+    Mô hình sàng lọc dùng chung cho mọi camera qua model pool / scheduler như mô hình chính.
+    """
+
+    def __init__(self, weights: str = SCREENING_MODEL_WEIGHTS):
+        self.scheduler = get_inference_scheduler(weights)
+        self.class_ids = self.scheduler.pool.class_table.allowed_ids
+
+    def has_candidates(self, frame) -> bool:
+        result = self.scheduler.submit(frame, self.class_ids).result()
+        return len(result.boxes) > 0
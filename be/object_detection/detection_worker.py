@@ -0,0 +1,70 @@
+import threading
+
+from utils import metrics
+
+
+class LatestFrameSlot:
+    """Hộp thư sâu 1: frame mới ghi đè frame cũ chưa được xử lý."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame = None
+        self.closed = False
+
+    def put(self, frame) -> bool:
+        # Trả về True nếu đã ghi đè một frame chưa kịp xử lý (tức là bị bỏ qua)
+        with self.cond:
+            dropped = self.frame is not None
+            self.frame = frame
+            self.cond.notify()
+            return dropped
+
+    def take(self, timeout=None):
+        with self.cond:
+            if self.frame is None and not self.closed:
+                self.cond.wait(timeout)
+            frame, self.frame = self.frame, None
+            return frame
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class DetectionWorker:
+    """Một luồng detection sống suốt phiên camera thay cho mỗi tick một Thread mới.
+
+    Nếu suy luận chậm hơn nhịp gửi frame, các frame trung gian bị bỏ qua thay vì
+    xếp hàng, và được đếm vào `detect_frames_dropped`.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.cam_id = detector.cam_id
+        self.slot = LatestFrameSlot()
+        self.thread = threading.Thread(target=self._run, name=f"detect-{self.cam_id}", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame):
+        metrics.incr(self.cam_id, "detect_frames_submitted")
+        if self.slot.put(frame):
+            metrics.incr(self.cam_id, "detect_frames_dropped")
+
+    def _run(self):
+        while self.detector.running:
+            frame = self.slot.take(timeout=1)
+            if frame is None:
+                continue
+            try:
+                self.detector.detect_on_frame(frame)
+                metrics.incr(self.cam_id, "detect_runs")
+            except Exception as e:
+                metrics.incr(self.cam_id, "detect_errors")
+                print(f"[ERROR] Lỗi detection cho cam {self.cam_id}: {e}")
+        print(f"[INFO] 🛑 Detection worker stopped for {self.cam_id}")
+
+    def stop(self, timeout=5):
+        self.slot.close()
+        if self.thread.is_alive():
+            self.thread.join(timeout=timeout)
@@ -3,37 +3,68 @@ import os
 import cv2
 import numpy as np
 from threading import Lock
-from ultralytics import YOLO
 from queue import Queue
 from utils.helpers import draw_boxes
 from utils.logger import log_event
-from .allowed_classes import ALLOWED_CLASSES, DANGEROUS_ANIMALS, WEAPON_CLASSES, HUMAN_CLASSES
-from config import VIDEO_OUTPUT_DIR
+from ultralytics.engine.results import Boxes
+from .allowed_classes import CATEGORY_HUMAN, CATEGORY_WEAPON, CATEGORY_ANIMAL, CATEGORY_DOOR
+from .model_registry import get_model_pool
+from .inference_scheduler import get_inference_scheduler
+from .tracker import CameraTracker
+from .adaptive_rate import AdaptiveDetectRate
+from .roi import MotionRoiGate, merge_crop_results
+from .cascade import ScreeningStage, cascade_enabled_for
+from .spatial import overlap_matrix, centers_inside
+from .incidents import IncidentTracker
+from utils import metrics
+from streaming.profiles import StreamProfile, render_preview
+from config import VIDEO_OUTPUT_DIR, ROI_GATING_ENABLED
+
+SOURCE_PROFILE = StreamProfile()
+STREAM_CACHE_PROFILES = 16  # số profile preview giữ lại cho mỗi camera
+
 
 class Detector:
-    def __init__(self, cam_id: str):
-        self.model = YOLO("yolov8l-oiv7.pt")
-        self.model = YOLO("yolov8l-oiv7.pt")
+    def __init__(self, cam_id: str, cascade: bool = None):
+        # Trọng số dùng chung cho cả tiến trình, tracker riêng cho từng camera
+        self.model_pool = get_model_pool()
+        self.scheduler = get_inference_scheduler()
+        self.class_table = self.model_pool.class_table
+        self.tracker = CameraTracker()
+        self.detect_rate = AdaptiveDetectRate()
+        self.roi_gate = MotionRoiGate() if ROI_GATING_ENABLED else None
+        if cascade is None:
+            cascade = cascade_enabled_for(cam_id)
+        self.screening = ScreeningStage() if cascade else None
+        self.incidents = IncidentTracker(cam_id)
         self.cam_id = cam_id
         self.running = True
         self.lock = Lock()
 
         self.should_record = False
-        self.latest_raw_frame = None
+        self.latest_frame = None  # utils.frame.Frame mới nhất, dùng chung read-only
         self.latest_boxes = None
+        self.previous_boxes = None
+        self.boxes_version = 0  # tăng mỗi khi latest_boxes đổi, để stream biết khi nào cần vẽ lại
+        self._stream_cache = {}  # profile.key -> ((frame.seq, boxes_version), jpeg) đã mã hoá gần nhất
         self.last_box_time = 0
         self.last_detect_time = 0
         self.last_abnormal_time = 0
         self.is_abnormal = False
 
         self.BOX_HOLD_DURATION = 1.0
-        self.DETECT_INTERVAL = 1
+        self.DETECT_INTERVAL = self.detect_rate.interval  # được AdaptiveDetectRate cập nhật liên tục
         self.ABNORMAL_END_DELAY = 5
         self.STAY_THRESHOLD = 10
 
         # Thêm biến tracking
         self.object_tracks = {}  # object_id: last_seen_time
 
+    @property
+    def latest_raw_frame(self):
+        frame = self.latest_frame
+        return frame.image if frame is not None else None
+
     def outside_working_hours(self):
         now = time.localtime()
         return now.tm_hour < 8 or now.tm_hour >= 8
@@ -41,24 +72,20 @@ class Detector:
     def detect_on_frame(self, frame):
         now = time.time()
 
-        if now - self.last_detect_time < self.DETECT_INTERVAL:
+        # Chặn trên tần suất detection; nhịp thực tế do AdaptiveDetectRate quyết định
+        if now - self.last_detect_time < self.detect_rate.min_interval:
             return
 
-        class_ids = [
-            i for i, name in self.model.names.items()
-            if name.lower() in ALLOWED_CLASSES
-        ]
+        results = self._run_inference(frame, self.class_table.allowed_ids, now)
+        self.incidents.sweep(now)
 
-        results = self.model.track(
-            frame,
-            persist=True,
-            classes=class_ids,
-            verbose=False
-        )
+        # Chuyển box về host một lần cho mỗi frame
+        boxes = results[0].boxes.cpu().numpy() if results else Boxes(np.zeros((0, 6), dtype=np.float32), frame.shape[:2])
 
         with self.lock:
-            if results and results[0].boxes:
-                self.latest_boxes = results[0].boxes
+            shown_boxes = self.latest_boxes
+            if len(boxes):
+                self.latest_boxes = boxes
                 self.previous_boxes = self.latest_boxes
                 self.last_box_time = now
             else:
@@ -67,6 +94,8 @@ class Detector:
                     self.latest_boxes = self.previous_boxes
                 else:
                     self.latest_boxes = None
+            if self.latest_boxes is not shown_boxes:
+                self.boxes_version += 1
 
 
         person_boxes, weapon_boxes, animal_boxes, door_boxes = [], [], [], []
@@ -79,43 +108,77 @@ class Detector:
             self.last_detect_time = now
             return
 
-        person_boxes, weapon_boxes, animal_boxes, door_boxes = self._group_boxes(results)
+        person_boxes, weapon_boxes, animal_boxes, door_boxes = self._group_boxes(boxes, now)
 
         is_currently_abnormal = False
-        is_currently_abnormal |= self._detect_dangerous_animal(animal_boxes)
-        is_currently_abnormal |= self._detect_person_outside_hours(person_boxes)
-        is_currently_abnormal |= self._detect_person_with_weapon(person_boxes, weapon_boxes)
+        is_currently_abnormal |= self._detect_dangerous_animal(animal_boxes, now)
+        is_currently_abnormal |= self._detect_person_outside_hours(person_boxes, now)
+        is_currently_abnormal |= self._detect_person_with_weapon(person_boxes, weapon_boxes, now)
         is_currently_abnormal |= self._detect_person_near_door(person_boxes, door_boxes, now)
 
         self._update_abnormal_state(is_currently_abnormal, now)
         self.last_detect_time = now
 
+    def _run_inference(self, frame, class_ids, now):
+        # Khi đang bất thường luôn chạy cả frame, không cắt vùng
+        regions = None
+        if self.roi_gate is not None and not self.is_abnormal:
+            regions = self.roi_gate.regions(frame, now)
+
+        if regions is not None and not regions:
+            # Cảnh tĩnh: bỏ qua suy luận
+            metrics.incr(self.cam_id, "roi_skipped")
+            return []
+
+        # Tầng 1: mô hình nhỏ sàng lọc; camera đang bất thường luôn lên thẳng mô hình lớn
+        if self.screening is not None and not self.is_abnormal:
+            metrics.incr(self.cam_id, "cascade_screen_runs")
+            if not self.screening.has_candidates(frame):
+                metrics.incr(self.cam_id, "cascade_screen_rejected")
+                return []
+
+        # Tầng 2: mô hình OIV7 lớn
+        if self.screening is not None:
+            metrics.incr(self.cam_id, "cascade_full_runs")
+
+        if regions is None:
+            # Gửi frame vào bộ lập lịch chung để gộp batch với các camera khác
+            result = self.scheduler.submit(frame, class_ids).result()
+            if self.roi_gate is not None:
+                metrics.incr(self.cam_id, "roi_full_frame")
+        else:
+            futures = [
+                self.scheduler.submit(frame[y1:y2, x1:x2], class_ids)
+                for x1, y1, x2, y2 in regions
+            ]
+            crop_results = [f.result() for f in futures]
+            result = merge_crop_results(frame, regions, crop_results, self.model_pool.names)
+            metrics.incr(self.cam_id, "roi_cropped")
+            metrics.incr(self.cam_id, "roi_regions", len(regions))
+
+        return [self.tracker.update(result)]
+
     def _handle_no_detection(self, now):
         if self.is_abnormal and (now - self.last_abnormal_time > self.ABNORMAL_END_DELAY):
             print(f"[INFO] 🛑 Kết thúc trạng thái bất thường cho cam {self.cam_id} do không có phát hiện.")
             self.is_abnormal = False
             log_event("abnormal_end", 1.0, self.cam_id, video_path="")
 
-    def _group_boxes(self, results):
-        person_boxes, weapon_boxes, animal_boxes, door_boxes = [], [], [], []
-        for r in results:
-            for box in r.boxes:
-                label = self.model.names[int(box.cls)].lower()
-                object_id = int(box.id) if hasattr(box, "id") and box.id is not None else None
-
-                if object_id is not None:
-                    self.object_tracks[object_id] = now
-
-                if label in HUMAN_CLASSES:
-                    person_boxes.append(box)
-                    print(f"[DETECT] 👤 Person detected with confidence: {float(box.conf):.2f} on cam {self.cam_id}")
-                elif label in WEAPON_CLASSES:
-                    weapon_boxes.append(box)
-                elif label in DANGEROUS_ANIMALS:
-                    animal_boxes.append(box)
-                elif label == "door":
-                    door_boxes.append(box)
-        return person_boxes, weapon_boxes, animal_boxes, door_boxes
+    def _group_boxes(self, boxes, now):
+        # Tra nhóm cho toàn bộ box một lần qua bảng class id thay vì so chuỗi từng box
+        categories = self.class_table.categorize(boxes.cls)
+
+        if boxes.is_track:
+            for object_id in boxes.id.astype(int).tolist():
+                self.object_tracks[object_id] = now
+
+        person_boxes = boxes[categories == CATEGORY_HUMAN]
+        weapon_boxes = boxes[categories == CATEGORY_WEAPON]
+        animal_boxes = boxes[categories == CATEGORY_ANIMAL]
+        door_boxes = boxes[categories == CATEGORY_DOOR]
+
+        for conf in person_boxes.conf:
+            print(f"[DETECT] 👤 Person detected with confidence: {conf:.2f} on cam {self.cam_id}")
 
         # Dọn dẹp object không còn xuất hiện
         EXPIRE_TIME = 30
@@ -123,55 +186,65 @@ class Detector:
             obj_id: last_time for obj_id, last_time in self.object_tracks.items()
             if now - last_time <= EXPIRE_TIME
         }
+        return person_boxes, weapon_boxes, animal_boxes, door_boxes
 
-        is_currently_abnormal = False
+    @staticmethod
+    def _track_ids(boxes):
+        # Không có tracker thì mọi box chung một sự cố cho mỗi luật
+        if boxes.is_track:
+            return boxes.id.astype(int).tolist()
+        return [None] * len(boxes)
 
+    def _hit_boxes(self, rule, boxes, now):
+        # Mỗi đối tượng (track id) là một sự cố riêng; lặp lại chỉ cập nhật sự cố đang mở
+        for track_id, conf in zip(self._track_ids(boxes), boxes.conf.tolist()):
+            self.incidents.hit(rule, float(conf), now, track_id)
+
+    def _detect_dangerous_animal(self, animal_boxes, now):
         # 1. Động vật nguy hiểm
         if animal_boxes:
-            log_event("dangerous_animal", float(animal_boxes[0].conf), self.cam_id, video_path="")
+            self._hit_boxes("dangerous_animal", animal_boxes, now)
             return True
         return False
 
-    def _detect_person_outside_hours(self, person_boxes):
+    def _detect_person_outside_hours(self, person_boxes, now):
+        # 2. Người xuất hiện ngoài giờ làm việc
         if person_boxes and self.outside_working_hours():
-            log_event("person_outside_working_hours", float(person_boxes[0].conf), self.cam_id, video_path="")
+            self._hit_boxes("person_outside_working_hours", person_boxes, now)
+            return True
+        return False
+
+    def _detect_person_with_weapon(self, person_boxes, weapon_boxes, now):
+        # 3. Người cầm vũ khí: vũ khí nào giao với ít nhất một người
+        if not len(person_boxes) or not len(weapon_boxes):
+            return False
+        held = overlap_matrix(person_boxes.xyxy, weapon_boxes.xyxy).any(axis=0)
+        if held.any():
+            self._hit_boxes("person_with_weapon", weapon_boxes[held], now)
             return True
         return False
 
-    def _detect_person_with_weapon(self, person_boxes, weapon_boxes):
-        for pbox in person_boxes:
-            px1, py1, px2, py2 = map(int, pbox.xyxy[0])
-            for wbox in weapon_boxes:
-                wx1, wy1, wx2, wy2 = map(int, wbox.xyxy[0])
-                if not (wx2 < px1 or wx1 > px2 or wy2 < py1 or wy1 > py2):
-                    log_event("person_with_weapon", float(wbox.conf), self.cam_id, video_path="")
-                    break
-            if is_currently_abnormal:
-                break
-
-        # 4. Người đứng gần cửa quá lâu
-        near_door = False
-        for pbox in person_boxes:
-            px1, py1, px2, py2 = map(int, pbox.xyxy[0])
-            pcx, pcy = (px1 + px2) // 2, (py1 + py2) // 2
-            for dbox in door_boxes:
-                dx1, dy1, dx2, dy2 = map(int, dbox.xyxy[0])
-                if dx1 <= pcx <= dx2 and dy1 <= pcy <= dy2:
-                    near_door = True
-                    break
-            if near_door:
-                break
-
-        if near_door:
+    def _detect_person_near_door(self, person_boxes, door_boxes, now):
+        # 4. Người đứng gần cửa quá lâu: tâm người nằm trong box cửa
+        near = (
+            centers_inside(person_boxes.xyxy, door_boxes.xyxy).any(axis=1)
+            if len(person_boxes) and len(door_boxes) else None
+        )
+
+        if near is not None and near.any():
             if not hasattr(self, "door_start_time"):
                 self.door_start_time = now
             elif now - self.door_start_time > self.STAY_THRESHOLD:
-                log_event("person_standing_too_long_near_door", 1.0, self.cam_id, video_path="")
+                for track_id, inside in zip(self._track_ids(person_boxes), near):
+                    if inside:
+                        self.incidents.hit("person_standing_too_long_near_door", 1.0, now, track_id)
                 return True
         else:
             if hasattr(self, "door_start_time"):
                 del self.door_start_time
+        return False
 
+    def _update_abnormal_state(self, is_currently_abnormal, now):
         if is_currently_abnormal:
             self.last_abnormal_time = now
             if not self.is_abnormal:
@@ -183,14 +256,43 @@ class Detector:
             log_event("abnormal_end", 1.0, self.cam_id, video_path="")
 
     def get_latest_annotated_frame(self):
+        # Không có box thì trả thẳng ảnh gốc read-only; chỉ bước vẽ box mới tạo bản sao
         with self.lock:
-            frame = self.latest_raw_frame.copy() if self.latest_raw_frame is not None else None
-            if frame is None:
+            if self.latest_frame is None:
                 return None
-            if self.latest_boxes:
-                frame = draw_boxes(frame, self.latest_boxes, self.model.names)
-            return frame
+            if not self.latest_boxes:
+                return self.latest_frame.image
+            frame = self.latest_frame.writable_copy()
+            return draw_boxes(frame, self.latest_boxes, self.class_table.labels)
+
+    def get_latest_stream_jpeg(self, profile=None):
+        """Trả về (key, jpeg) cho stream; key = (frame.seq, boxes_version).
+
+        Mỗi profile chỉ mã hoá lại khi frame hoặc box đổi, và bản preview được dùng chung
+        cho mọi viewer cùng profile. Không có box và không thu nhỏ thì gửi nguyên JPEG của client.
+        """
+        profile = profile or SOURCE_PROFILE
+        with self.lock:
+            frame, boxes, version = self.latest_frame, self.latest_boxes, self.boxes_version
+        if frame is None:
+            return None, None
+
+        key = (frame.seq, version)
+        cached = self._stream_cache.get(profile.key)
+        if cached is not None and cached[0] == key:
+            return cached
+
+        jpeg, encoded = render_preview(frame, boxes, self.class_table.labels, profile)
+        if jpeg is None:
+            return None, None
+        metrics.incr(self.cam_id, "stream_encodes" if encoded else "stream_passthrough")
+
+        if profile.key not in self._stream_cache and len(self._stream_cache) >= STREAM_CACHE_PROFILES:
+            self._stream_cache.clear()
+        self._stream_cache[profile.key] = (key, jpeg)
+        return key, jpeg
 
     def cleanup(self):
         print(f"Cleanup detector for cam {self.cam_id}")
+        self.incidents.close_all()
         
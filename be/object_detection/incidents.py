@@ -0,0 +1,114 @@
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from config import INCIDENT_CLOSE_AFTER, INCIDENT_UPDATE_INTERVAL
+from utils import metrics
+from utils.logger import get_event_sink, camera_ref
+
+
+def _dt(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts)
+
+
+class Incident:
+    __slots__ = ("id", "rule", "track_id", "first_seen", "last_seen", "peak", "hits", "persisted_at")
+
+    def __init__(self, rule: str, track_id, confidence: float, now: float):
+        self.id = ObjectId()
+        self.rule = rule
+        self.track_id = track_id
+        self.first_seen = now
+        self.last_seen = now
+        self.peak = confidence
+        self.hits = 1
+        self.persisted_at = 0.0
+
+
+class IncidentTracker:
+    """Gộp các lần một luật kích hoạt thành sự cố, khoá theo (camera, luật, track id).
+
+    Sự cố mở ở lần kích hoạt đầu tiên, được cập nhật tại chỗ (last_seen, độ tin cậy cao
+    nhất, số lần kích hoạt) tối đa mỗi `update_interval` giây và đóng khi luật không kích
+    hoạt lại trong `close_after` giây. Mỗi sự cố là một document trong collection events;
+    các cập nhật dùng $max / $setOnInsert nên thứ tự ghi trong lô không quan trọng.
+    Không có track id (tracker tắt) thì mỗi luật chỉ có một sự cố mở cho mỗi camera.
+    """
+
+    def __init__(self, cam_id: str, close_after: float = INCIDENT_CLOSE_AFTER,
+                 update_interval: float = INCIDENT_UPDATE_INTERVAL):
+        self.cam_id = cam_id
+        self.camera_id = camera_ref(cam_id)
+        self.close_after = close_after
+        self.update_interval = update_interval
+        self.open = {}  # (rule, track_id) -> Incident
+
+    def hit(self, rule: str, confidence: float, now: float = None, track_id=None):
+        now = time.time() if now is None else now
+        key = (rule, track_id)
+        incident = self.open.get(key)
+        if incident is None:
+            incident = self.open[key] = Incident(rule, track_id, confidence, now)
+            metrics.incr(self.cam_id, "incidents_opened")
+            print(f"[INFO] 🚩 Mở sự cố {rule} (track {track_id}) cho cam {self.cam_id}: {confidence:.2f}")
+        else:
+            incident.last_seen = now
+            incident.peak = max(incident.peak, confidence)
+            incident.hits += 1
+        metrics.incr(self.cam_id, "incident_hits")
+
+        if now - incident.persisted_at >= self.update_interval:
+            self._persist(incident, now)
+        return incident
+
+    def active_rules(self) -> set:
+        """Các luật đang có sự cố mở."""
+        return {rule for rule, _ in list(self.open)}
+
+    def sweep(self, now: float = None):
+        """Đóng các sự cố không còn kích hoạt trong `close_after` giây."""
+        now = time.time() if now is None else now
+        for key, incident in list(self.open.items()):
+            if now - incident.last_seen > self.close_after:
+                self._close(key, now)
+
+    def close_all(self, now: float = None):
+        now = time.time() if now is None else now
+        for key in list(self.open):
+            self._close(key, now)
+
+    def _close(self, key, now):
+        incident = self.open.pop(key, None)
+        if incident is None:
+            return
+        self._persist(incident, now, closed=True)
+        metrics.incr(self.cam_id, "incidents_closed")
+        print(f"[INFO] ✅ Đóng sự cố {incident.rule} (track {incident.track_id}) cho cam {self.cam_id}: "
+              f"{incident.hits} lần, cao nhất {incident.peak:.2f}, {incident.last_seen - incident.first_seen:.1f}s")
+
+    def _persist(self, incident: Incident, now: float, closed: bool = False):
+        incident.persisted_at = now
+        first_seen = _dt(incident.first_seen)
+        on_insert = {
+            "timestamp": first_seen,
+            "first_seen": first_seen,
+            "object": incident.rule,
+            "camera_id": self.camera_id,
+            "track_id": incident.track_id,
+            "video_path": "",
+        }
+        update = {
+            "$setOnInsert": on_insert,
+            "$max": {
+                "last_seen": _dt(incident.last_seen),
+                "confidence": round(incident.peak, 2),
+                "hit_count": incident.hits,
+            },
+        }
+        if closed:
+            update["$set"] = {"status": "closed", "closed_at": _dt(now)}
+        else:
+            on_insert["status"] = "open"
+        get_event_sink().submit_upsert(incident.id, update)
+        metrics.incr(self.cam_id, "incident_writes")
@@ -0,0 +1,125 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+from config import MODEL_WEIGHTS, INFERENCE_BACKEND, INFERENCE_BATCH_SIZE, INFERENCE_BATCH_WAIT
+from .model_registry import ModelPool, get_model_pool
+
+
+class InferenceRequest:
+    __slots__ = ("frame", "classes", "future", "submitted_at")
+
+    def __init__(self, frame, classes):
+        self.frame = frame
+        self.classes = tuple(classes) if classes is not None else None
+        self.future = Future()
+        self.submitted_at = time.time()
+
+
+class InferenceScheduler:
+    """Gom frame mới nhất của nhiều camera thành micro-batch và chạy một lần predict.
+
+    Mỗi worker của ModelPool có một luồng điều phối riêng. Kết quả được trả về
+    qua Future cho từng Detector; tracker vẫn nằm ở phía camera.
+    """
+
+    def __init__(self, pool: ModelPool, batch_size: int = INFERENCE_BATCH_SIZE,
+                 max_wait: float = INFERENCE_BATCH_WAIT):
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.requests = Queue()
+        self.lock = threading.Lock()
+
+        self.stats = {"batches": 0, "frames": 0, "detections": 0, "infer_seconds": 0.0}
+        self.started_at = time.time()
+
+        self.threads = []
+        for i in range(pool.size):
+            t = threading.Thread(target=self._run, name=f"inference-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, frame, classes=None) -> Future:
+        request = InferenceRequest(frame, classes)
+        self.requests.put(request)
+        return request.future
+
+    def _collect_batch(self):
+        first = self.requests.get()
+        batch = [first]
+        deadline = first.submitted_at + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                # Hết ngân sách chờ thì chỉ lấy thêm những frame đã có sẵn trong hàng đợi
+                if remaining <= 0:
+                    batch.append(self.requests.get_nowait())
+                else:
+                    batch.append(self.requests.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+
+            # Các camera dùng chung mô hình thường có cùng bộ lớp, nhưng vẫn tách nhóm cho chắc
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.classes, []).append(request)
+
+            for classes, requests in groups.items():
+                self._predict(requests, classes)
+
+    def _predict(self, requests, classes):
+        start = time.time()
+        try:
+            with self.pool.acquire() as backend:
+                results = backend.predict(
+                    [r.frame for r in requests],
+                    classes=list(classes) if classes is not None else None
+                )
+        except Exception as e:
+            print(f"[ERROR] Lỗi khi chạy batch suy luận ({len(requests)} frame): {e}")
+            for r in requests:
+                r.future.set_exception(e)
+            return
+
+        elapsed = time.time() - start
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["frames"] += len(requests)
+            self.stats["detections"] += sum(len(res.boxes) for res in results)
+            self.stats["infer_seconds"] += elapsed
+            batches = self.stats["batches"]
+
+        if batches % 100 == 0:
+            print(f"[DEBUG] 🧮 Suy luận batch: {self.get_stats()}")
+
+        for request, result in zip(requests, results):
+            request.future.set_result(result)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        uptime = max(time.time() - self.started_at, 1e-6)
+        stats["avg_batch_size"] = round(stats["frames"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["frames_per_sec"] = round(stats["frames"] / uptime, 2)
+        stats["detections_per_sec"] = round(stats["detections"] / uptime, 2)
+        return stats
+
+
+_schedulers: dict[tuple, InferenceScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_inference_scheduler(weights: str = MODEL_WEIGHTS, backend: str = INFERENCE_BACKEND) -> InferenceScheduler:
+    with _schedulers_lock:
+        scheduler = _schedulers.get((weights, backend))
+        if scheduler is None:
+            scheduler = InferenceScheduler(get_model_pool(weights, backend))
+            _schedulers[(weights, backend)] = scheduler
+        return scheduler
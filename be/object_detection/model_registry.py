@@ -0,0 +1,66 @@
+import threading
+from contextlib import contextmanager
+from queue import Queue
+
+from config import MODEL_WEIGHTS, INFERENCE_WORKERS, INFERENCE_BACKEND
+from .backends import InferenceBackend, create_backend
+from .allowed_classes import ClassTable
+
+
+class ModelPool:
+    """Một file trọng số được nạp đúng một lần cho cả tiến trình.
+
+    Các Detector mượn một worker suy luận qua `acquire()`; số worker bị giới hạn
+    bởi `size` nên bộ nhớ không tăng theo số camera.
+    """
+
+    def __init__(self, weights: str, size: int = INFERENCE_WORKERS, backend: str = INFERENCE_BACKEND):
+        self.weights = weights
+        self.backend = backend
+        self.size = max(1, size)
+        self.lock = threading.Lock()
+
+        print(f"[INFO] 📦 Nạp mô hình {weights} qua backend {backend} (dùng chung cho mọi camera)")
+        self._primary: InferenceBackend = create_backend(backend, weights)
+        self._created = 1
+        self._idle = Queue()
+        self._idle.put(self._primary)
+
+        # Bảng tra lớp biên dịch một lần, dùng chung cho detection và vẽ nhãn
+        self.class_table = ClassTable(self._primary.names)
+
+    @property
+    def names(self):
+        return self._primary.names
+
+    def _grow(self):
+        # Chỉ thêm worker khi có nhiều camera cùng chờ suy luận
+        with self.lock:
+            if self._created >= self.size:
+                return
+            self._created += 1
+        print(f"[INFO] ➕ Thêm worker suy luận #{self._created} cho {self.weights}")
+        self._idle.put(self._primary.clone())
+
+    @contextmanager
+    def acquire(self):
+        if self._idle.empty() and self._created < self.size:
+            self._grow()
+        backend = self._idle.get()
+        try:
+            yield backend
+        finally:
+            self._idle.put(backend)
+
+
+_pools: dict[tuple, ModelPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_model_pool(weights: str = MODEL_WEIGHTS, backend: str = INFERENCE_BACKEND) -> ModelPool:
+    with _pools_lock:
+        pool = _pools.get((weights, backend))
+        if pool is None:
+            pool = ModelPool(weights, backend=backend)
+            _pools[(weights, backend)] = pool
+        return pool
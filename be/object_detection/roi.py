@@ -0,0 +1,107 @@
+import time
+
+import cv2
+import torch
+from ultralytics.engine.results import Results
+
+from config import (
+    ROI_FRAME_WIDTH, ROI_PADDING, ROI_MIN_SIZE, ROI_MIN_AREA_RATIO,
+    ROI_MAX_COVERAGE, ROI_FULL_FRAME_INTERVAL
+)
+
+
+def _merge_regions(regions):
+    # Gộp các vùng chồng lấn cho tới khi không còn cặp nào giao nhau
+    regions = [list(r) for r in regions]
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        while regions:
+            x1, y1, x2, y2 = regions.pop()
+            i = 0
+            while i < len(regions):
+                a1, b1, a2, b2 = regions[i]
+                if not (a2 < x1 or a1 > x2 or b2 < y1 or b1 > y2):
+                    x1, y1, x2, y2 = min(x1, a1), min(y1, b1), max(x2, a2), max(y2, b2)
+                    regions.pop(i)
+                    merged = True
+                else:
+                    i += 1
+            out.append([x1, y1, x2, y2])
+        regions = out
+    return [tuple(r) for r in regions]
+
+
+def _expand(x1, y1, x2, y2, w, h):
+    x1, y1, x2, y2 = x1 - ROI_PADDING, y1 - ROI_PADDING, x2 + ROI_PADDING, y2 + ROI_PADDING
+    # Vùng quá nhỏ thì nới quanh tâm để YOLO còn đủ ngữ cảnh
+    for lo, hi, limit in ((0, 2, w), (1, 3, h)):
+        box = [x1, y1, x2, y2]
+        size = box[hi] - box[lo]
+        if size < ROI_MIN_SIZE:
+            grow = (ROI_MIN_SIZE - size) / 2
+            box[lo] -= grow
+            box[hi] += grow
+        x1, y1, x2, y2 = box
+    return (
+        int(max(0, x1)), int(max(0, y1)),
+        int(min(w, x2)), int(min(h, y2))
+    )
+
+
+class MotionRoiGate:
+    """Tìm vùng chuyển động bằng background subtraction để chỉ suy luận trên các vùng đó.
+
+    `regions()` trả về None khi cần chạy cả frame, danh sách rỗng khi cảnh tĩnh
+    (bỏ qua suy luận), hoặc các vùng (x1, y1, x2, y2) theo toạ độ frame gốc.
+    """
+
+    def __init__(self, width: int = ROI_FRAME_WIDTH):
+        self.width = width
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=16, detectShadows=False)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        self.last_full_frame_time = 0
+
+    def regions(self, frame, now=None):
+        now = time.time() if now is None else now
+        h, w = frame.shape[:2]
+        scale = self.width / w
+        small = cv2.resize(frame, (self.width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        mask = self.subtractor.apply(small)
+        if now - self.last_full_frame_time >= ROI_FULL_FRAME_INTERVAL:
+            self.last_full_frame_time = now
+            return None
+
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+        mask = cv2.dilate(mask, self.kernel, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_area = ROI_MIN_AREA_RATIO * mask.size
+        regions = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area:
+                continue
+            x, y, bw, bh = cv2.boundingRect(contour)
+            regions.append(_expand(x / scale, y / scale, (x + bw) / scale, (y + bh) / scale, w, h))
+
+        regions = _merge_regions(regions)
+        coverage = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) / float(w * h)
+        if coverage > ROI_MAX_COVERAGE:
+            self.last_full_frame_time = now
+            return None
+        return regions
+
+
+def merge_crop_results(frame, regions, crop_results, names):
+    # Dịch box từ toạ độ vùng cắt về toạ độ frame gốc và gộp thành một Results
+    data = []
+    for (x1, y1, _, _), result in zip(regions, crop_results):
+        boxes = result.boxes.data.clone()
+        if len(boxes):
+            boxes[:, [0, 2]] += x1
+            boxes[:, [1, 3]] += y1
+            data.append(boxes)
+    data = torch.cat(data) if data else torch.zeros((0, 6))
+    return Results(frame, path="", names=names, boxes=data)
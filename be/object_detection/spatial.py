@@ -0,0 +1,58 @@
+import numpy as np
+
+# Các phép so sánh box dạng ma trận: a (N, 4) và b (M, 4) theo xyxy -> kết quả (N, M)
+
+
+def overlap_matrix(a, b):
+    # Giao nhau kể cả chạm cạnh, giống điều kiện cũ: not (bx2 < ax1 or bx1 > ax2 or by2 < ay1 or by1 > ay2)
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    return (
+        (b[None, :, 2] >= a[:, None, 0]) & (b[None, :, 0] <= a[:, None, 2]) &
+        (b[None, :, 3] >= a[:, None, 1]) & (b[None, :, 1] <= a[:, None, 3])
+    )
+
+
+def centers_inside(a, b):
+    # Tâm của box a nằm trong box b
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    cx = (a[:, 0] + a[:, 2]) / 2
+    cy = (a[:, 1] + a[:, 3]) / 2
+    return (
+        (b[None, :, 0] <= cx[:, None]) & (cx[:, None] <= b[None, :, 2]) &
+        (b[None, :, 1] <= cy[:, None]) & (cy[:, None] <= b[None, :, 3])
+    )
+
+
+def iou_matrix(a, b):
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def count_matches(baseline, candidate, iou_threshold):
+    # Số box của baseline ghép được với candidate (N, 6: xyxy, conf, lớp): ghép tham lam theo IoU, chỉ ghép box cùng lớp
+    if len(baseline) == 0 or len(candidate) == 0:
+        return 0
+    ious = iou_matrix(baseline[:, :4], candidate[:, :4])
+    ious[baseline[:, 5][:, None] != candidate[:, 5][None, :]] = 0
+    matched = 0
+    used = set()
+    for i in range(len(baseline)):
+        order = np.argsort(-ious[i])
+        for j in order:
+            if ious[i, j] < iou_threshold:
+                break
+            if j not in used:
+                used.add(j)
+                matched += 1
+                break
+    return matched
@@ -0,0 +1,30 @@
+import torch
+import yaml
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+from config import TRACKER_CONFIG
+
+
+class CameraTracker:
+    """Trạng thái tracking của một camera, tách khỏi trọng số mô hình dùng chung."""
+
+    def __init__(self, tracker_config: str = TRACKER_CONFIG):
+        with open(check_yaml(tracker_config), encoding="utf-8") as f:
+            cfg = IterableSimpleNamespace(**yaml.safe_load(f))
+        self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg)
+
+    def update(self, result):
+        # Tương đương model.track(persist=True) nhưng tracker thuộc về camera, không thuộc predictor
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, result.orig_img)
+        if len(tracks) == 0:
+            return result
+        idx = tracks[:, -1].astype(int)
+        result = result[idx]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1], device=result.boxes.data.device))
+        return result
+
+    def reset(self):
+        self.tracker.reset()
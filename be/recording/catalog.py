@@ -0,0 +1,111 @@
+# recording/catalog.py
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from utils.event_store import (
+    CLIP_EVENT, MAX_PAGE_SIZE, after_cursor, decode_cursor, drop_replaced_indexes, encode_cursor, time_range,
+)
+
+def ensure_clip_indexes(clips):
+    """Tạo index cho danh mục clip (bỏ qua nếu đã có)."""
+    # Khớp thứ tự sắp xếp (started_at, _id) của find_clips: một trang là một lần đọc theo index
+    clips.create_index([("camera_id", ASCENDING), ("started_at", DESCENDING), ("_id", DESCENDING)], name="camera_started_id")
+    clips.create_index([("room_id", ASCENDING), ("started_at", DESCENDING), ("_id", DESCENDING)], name="room_started_id")
+    drop_replaced_indexes(clips, ["camera_started", "room_started"])
+    clips.create_index([("video_path", ASCENDING)], name="video_path", unique=True)
+
+
+def clip_document(clip, cam_id: str, room_id=None, triggers=(), camera_name=None, room_name=None) -> dict:
+    """Document danh mục cho một clip đã ghi xong (`clip` là ClipWriter đã đóng)."""
+    started_at = datetime.fromtimestamp(clip.first_timestamp) if clip.first_timestamp else None
+    ended_at = datetime.fromtimestamp(clip.last_timestamp) if clip.last_timestamp else None
+    return {
+        "camera_id": ObjectId(cam_id) if ObjectId.is_valid(cam_id) else cam_id,
+        "room_id": str(room_id) if room_id else None,
+        "camera_name": camera_name,
+        "room_name": room_name,
+        "video_path": clip.video_path,
+        "sidecar_path": clip.sidecar_path,
+        "codec": clip.container,  # mp4v hoặc mjpeg; đổi thành h264 sau khi chuyển mã
+        "fps": clip.fps,
+        "width": clip.width,
+        "height": clip.height,
+        "frame_count": clip.frame_count,
+        "duration": round(clip.frame_count / clip.fps, 2) if clip.fps else None,
+        "size_bytes": clip.size_bytes,
+        "started_at": started_at,
+        "ended_at": ended_at,
+        "triggers": sorted(triggers),
+        "created_at": datetime.now(),
+    }
+
+
+def save_clip(clips, clip, cam_id: str, room_id=None, triggers=(), camera_name=None, room_name=None):
+    """Ghi clip vào danh mục một lần khi lưu thành công; trả về _id hoặc None nếu lỗi."""
+    doc = clip_document(clip, cam_id, room_id, triggers, camera_name, room_name)
+    try:
+        inserted_id = clips.insert_one(doc).inserted_id
+    except PyMongoError as e:
+        print(f"[ERROR] Không ghi được clip {clip.video_path} vào danh mục: {e}")
+        return None
+    print(f"[INFO] 🗂 Đã thêm clip vào danh mục: {doc['duration']}s, {doc['frame_count']} frames, "
+          f"{doc['width']}x{doc['height']}, {doc['size_bytes'] // 1024} KB, kích hoạt bởi {doc['triggers']}")
+    return inserted_id
+
+
+def backfill_clips(events, clips) -> int:
+    """Dựng danh mục cho các clip ghi trước khi có collection clips, từ sự kiện có video_path.
+
+    Chỉ chạy khi danh mục còn trống; gộp và ghi hoàn toàn trên MongoDB ($merge).
+    Đường dẫn kiểu Windows (os.path.join cũ) được đổi sang "/" như clip mới ghi.
+    """
+    if clips.estimated_document_count() > 0:
+        return 0
+    events.aggregate([
+        {"$match": CLIP_EVENT},
+        {"$group": {
+            "_id": {"$replaceAll": {"input": "$video_path", "find": "\\", "replacement": "/"}},
+            "camera_id": {"$first": "$camera_id"},
+            "room_id": {"$first": "$room_id"},
+            "started_at": {"$min": "$timestamp"},
+            "ended_at": {"$max": "$timestamp"},
+        }},
+        {"$project": {
+            "_id": 0, "video_path": "$_id", "camera_id": 1, "room_id": 1, "started_at": 1, "ended_at": 1,
+            "triggers": {"$literal": []}, "backfilled": {"$literal": True},
+        }},
+        {"$merge": {"into": clips.name, "on": "video_path", "whenMatched": "keepExisting", "whenNotMatched": "insert"}},
+    ])
+    return clips.estimated_document_count()
+
+
+def clip_filter(camera_id=None, room_id=None, triggers=None, since=None, until=None) -> dict:
+    query = {}
+    if camera_id is not None:
+        query["camera_id"] = ObjectId(camera_id)
+    if room_id is not None:
+        query["room_id"] = str(room_id)
+    if triggers:
+        query["triggers"] = {"$in": list(triggers)}
+    if since is not None or until is not None:
+        query["started_at"] = time_range(since, until)
+    return query
+
+
+async def find_clips(clips, query: dict, limit: int, cursor: str = None):
+    """Một trang clip mới nhất trước, đọc thẳng theo index (camera_id, started_at, _id)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        started_at, key = decode_cursor(cursor)
+        if not ObjectId.is_valid(key):
+            raise ValueError("Cursor không hợp lệ")
+        query = {"$and": [query, after_cursor("started_at", "_id", (started_at, ObjectId(key)))]}
+    docs = await clips.find(query).sort([("started_at", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1).to_list()
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["started_at"], docs[-1]["_id"])
+    return docs, next_cursor
@@ -0,0 +1,277 @@
+# recording/clip_writer.py
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from config import CLIP_WRITER_QUEUE_SIZE, CLIP_SEGMENT_BYTES, RECORDING_CONTAINER
+from recording.mjpeg_avi import MjpegAviWriter
+from recording.preroll import PREROLL_JPEG_QUALITY
+from recording.sidecar import DetectionSidecar, SIDECAR_FILENAME
+from utils import metrics
+
+CLEAN_FILENAMES = {
+    "mp4v": "abnormal_clean.mp4",
+    # JPEG của client được ghi thẳng vào AVI, không giải mã/mã hoá lại
+    "mjpeg": "abnormal_clean.avi",
+}
+
+# Luồng ghi kiểm tra cờ đóng sau mỗi khoảng chờ này khi hàng đợi rỗng
+_CLOSE_POLL_SECONDS = 0.5
+
+# Số clip đang ghi và lúc clip cuối cùng kết thúc, để job nền biết khi nào máy rảnh
+_activity_lock = threading.Lock()
+_active_writers = 0
+_last_finished_at = time.time()
+
+
+def _set_active(delta: int):
+    global _active_writers, _last_finished_at
+    with _activity_lock:
+        _active_writers += delta
+        if delta < 0:
+            _last_finished_at = time.time()
+
+
+def idle_seconds() -> float:
+    """0 nếu còn clip đang ghi, ngược lại là số giây kể từ khi clip cuối cùng kết thúc."""
+    with _activity_lock:
+        return 0.0 if _active_writers else time.time() - _last_finished_at
+
+
+class ClipWriter:
+    """Ghi một clip trên luồng riêng với hàng đợi có giới hạn.
+
+    Recorder chỉ đẩy tham chiếu Frame + box vào hàng đợi; giải mã pre-roll, mã hoá,
+    ghi sidecar box, đóng file và kiểm tra kết quả đều chạy ở đây nên không chặn vòng
+    lặp đọc frame ring. Video chỉ ghi một bản sạch (mp4v, hoặc JPEG gốc trong AVI khi
+    container="mjpeg"); bản annotated được dựng lại từ sidecar khi cần.
+    Kết thúc clip sẽ gọi `on_finished(success, writer)`; writer giữ metadata của clip
+    (số frame, kích thước ảnh, thời điểm frame đầu/cuối, dung lượng file).
+    File đạt `segment_bytes` thì `full` chuyển True để recorder đóng clip và mở clip mới.
+    """
+
+    def __init__(self, cam_id: str, folder_path: str, fps: int, names=None, on_finished=None,
+                 queue_size: int = CLIP_WRITER_QUEUE_SIZE, container: str = RECORDING_CONTAINER,
+                 segment_bytes: int = CLIP_SEGMENT_BYTES):
+        if container not in CLEAN_FILENAMES:
+            raise ValueError(f"Container ghi clip không hợp lệ: {container} (hỗ trợ: {', '.join(CLEAN_FILENAMES)})")
+        self.cam_id = cam_id
+        self.container = container
+        self.folder_path = folder_path
+        self.fps = fps
+        self.names = names
+        self.on_finished = on_finished
+        self.segment_bytes = segment_bytes
+
+        self.clean_path = os.path.join(folder_path, CLEAN_FILENAMES[container]).replace("\\", "/")
+        self.sidecar_path = os.path.join(folder_path, SIDECAR_FILENAME).replace("\\", "/")
+        self.video_path = self.clean_path
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.out_clean = None
+        self.sidecar = DetectionSidecar(self.sidecar_path, fps, names)
+        self.frame_count = 0
+        self.dropped = 0
+        self.width = self.height = None
+        self.first_timestamp = self.last_timestamp = None
+        self.size_bytes = 0
+        self.full = False
+        self.failed = False
+        self.closed = False
+        self._closing = threading.Event()
+
+        # Luồng không phải daemon để clip vẫn được đóng đúng cách khi tiến trình dừng
+        _set_active(1)
+        self.thread = threading.Thread(target=self._run, name=f"clip-writer-{cam_id}")
+        self.thread.start()
+
+    def _put(self, item) -> bool:
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            metrics.incr(self.cam_id, "clip_frames_dropped")
+            return False
+        metrics.set_value(self.cam_id, "clip_queue_depth", self.queue.qsize())
+        return True
+
+    def write_preroll(self, entries):
+        if entries:
+            self._put(("preroll", entries, None))
+
+    def write(self, frame, boxes=None):
+        return self._put(("frame", frame, boxes))
+
+    def close(self):
+        # Không chặn: việc đóng file và kiểm tra diễn ra trên luồng ghi. Hàng đợi đầy thì
+        # không có chỗ cho None: luồng ghi vẫn ghi hết các frame còn lại rồi dừng theo cờ
+        if not self.closed:
+            self.closed = True
+            self._closing.set()
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def _open(self, frame):
+        h, w = frame.shape[:2]
+        self.width, self.height = w, h
+        if self.container == "mjpeg":
+            self.out_clean = MjpegAviWriter(self.clean_path, self.fps, w, h)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+            self.out_clean = cv2.VideoWriter(self.clean_path, fourcc, self.fps, (w, h))
+
+        # Kiểm tra xem VideoWriter có được khởi tạo thành công không
+        if not self.out_clean.isOpened():
+            print(f"[ERROR] ❌ Không thể khởi tạo VideoWriter cho: {self.clean_path}")
+            self.failed = True
+            return
+
+        try:
+            self.sidecar.open(w, h)
+        except OSError as e:
+            # Thiếu sidecar vẫn giữ được video sạch
+            print(f"[ERROR] Không thể tạo file sidecar {self.sidecar_path}: {e}")
+        print(f"[INFO] 🎥 VideoWriter khởi tạo thành công cho {w}x{h} @ {self.fps}fps")
+
+    def _write_frame(self, boxes, timestamp, image=None, jpeg=None):
+        start = time.perf_counter()
+        if image is None and (self.container != "mjpeg" or self.out_clean is None):
+            # mp4v cần ảnh BGR; với mjpeg chỉ giải mã frame đầu tiên để lấy kích thước
+            image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return
+
+        if self.out_clean is None and not self.failed:
+            self._open(image)
+        if self.failed:
+            return
+
+        if self.container == "mjpeg":
+            if jpeg is None:
+                # Nguồn không có sẵn JPEG thì nén một lần ở đây
+                ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, PREROLL_JPEG_QUALITY])
+                if not ok:
+                    return
+                jpeg = encoded.tobytes()
+            self.out_clean.write(jpeg)
+        else:
+            self.out_clean.write(image)
+        self.sidecar.write(self.frame_count, timestamp, boxes)
+        self.frame_count += 1
+        self._check_size()
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        metrics.set_value(self.cam_id, "clip_write_ms", round(elapsed_ms, 2))
+        metrics.incr(self.cam_id, "clip_frames_written")
+
+        # Log tiến trình mỗi 100 frame
+        if self.frame_count % 100 == 0:
+            print(f"[DEBUG] 📊 Đã ghi {self.frame_count} frames")
+
+    def _check_size(self):
+        if self.full:
+            return
+        if self.container == "mjpeg":
+            size = self.out_clean.size
+        elif self.frame_count % max(1, self.fps) == 0:
+            # VideoWriter không báo dung lượng: hỏi hệ thống file mỗi giây video
+            size = os.path.getsize(self.clean_path) if os.path.exists(self.clean_path) else 0
+        else:
+            return
+        if size >= self.segment_bytes:
+            self.full = True
+            metrics.incr(self.cam_id, "clip_segments_full")
+            print(f"[INFO] 📦 Clip {self.clean_path} đạt {size // 2**20} MB, chuyển sang clip mới")
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=_CLOSE_POLL_SECONDS)
+            except queue.Empty:
+                if self._closing.is_set():
+                    break
+                continue
+            metrics.set_value(self.cam_id, "clip_queue_depth", self.queue.qsize())
+            if item is None:
+                break
+
+            kind, payload, boxes = item
+            try:
+                if kind == "preroll":
+                    # Ghi buffer frames: JPEG chỉ được giải mã khi container cần ảnh BGR
+                    for jpeg, buffered_boxes, timestamp in payload:
+                        self._write_frame(buffered_boxes, timestamp, jpeg=jpeg)
+                    print(f"[INFO] 📼 Đã ghi {len(payload)} frames từ buffer")
+                else:
+                    self._write_frame(boxes, payload.timestamp, image=payload.image, jpeg=payload.jpeg)
+            except Exception as e:
+                print(f"[ERROR] Lỗi khi ghi frame: {e}")
+
+        start = time.perf_counter()
+        try:
+            success = self._finalize()
+        finally:
+            _set_active(-1)
+        metrics.set_value(self.cam_id, "clip_finalize_ms", round(1000 * (time.perf_counter() - start), 1))
+
+        if self.on_finished:
+            try:
+                self.on_finished(success, self)
+            except Exception as e:
+                print(f"[ERROR] Lỗi sau khi lưu clip: {e}")
+
+    def _finalize(self):
+        success = not self.failed
+        print(f"[INFO] 💾 Đang lưu clip với {self.frame_count} frames...")
+
+        # Đóng VideoWriter và sidecar an toàn (release() đã flush file)
+        try:
+            if self.out_clean:
+                self.out_clean.release()
+                print("[INFO] 🎞 Đã đóng writer cho clean video")
+        except Exception as e:
+            print(f"[ERROR] Lỗi khi đóng clean video writer: {e}")
+            success = False
+        self.out_clean = None
+
+        try:
+            self.sidecar.close()
+        except OSError as e:
+            print(f"[ERROR] Lỗi khi đóng sidecar: {e}")
+
+        # Kiểm tra file đã được tạo và có kích thước hợp lý
+        files_status = []
+        for file_path, file_type in [(self.clean_path, "clean")]:
+            if os.path.exists(file_path):
+                file_size = os.path.getsize(file_path)
+                self.size_bytes = file_size
+                if file_size > 0:
+                    files_status.append(f"✅ {file_type}: {file_size} bytes")
+                else:
+                    files_status.append(f"❌ {file_type}: file trống")
+                    success = False
+            else:
+                files_status.append(f"❌ {file_type}: không tồn tại")
+                success = False
+
+        print(f"[INFO] 📊 Tổng số frame đã ghi: {self.frame_count} (bỏ {self.dropped} do hàng đợi đầy)")
+        files_status.append(f"sidecar: {self.sidecar.lines} dòng box")
+        print(f"[INFO] 📁 Trạng thái files: {' | '.join(files_status)}")
+
+        if success:
+            print(f"[INFO] ✅ Clip lưu thành công tại: {self.video_path}")
+        else:
+            print("[ERROR] ❌ Một số file không được lưu đúng cách")
+        return success
@@ -0,0 +1,110 @@
+# recording/mjpeg_avi.py
+import struct
+
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+_MAX_RIFF_BYTES = 0xFFFFFFFF  # trường kích thước của AVI 1.0 là 32-bit
+
+
+class MjpegAviWriter:
+    """Ghi thẳng các frame JPEG có sẵn vào container AVI (MJPG) — không giải mã, không mã hoá lại.
+
+    Header được ghi với giá trị tạm rồi vá lại khi close(). Dùng định dạng AVI 1.0 (idx1),
+    đủ cho clip sự kiện ngắn; người gọi phải chuyển sang file mới trước ~1 GiB (xem `size`),
+    frame làm file vượt 4 GiB sẽ bị từ chối.
+    """
+
+    def __init__(self, path: str, fps: int, width: int, height: int):
+        self.path = path
+        self.fps = max(1, int(round(fps)))
+        self.width = width
+        self.height = height
+        self.index = []
+        self.max_frame_bytes = 0
+        self.file = open(path, "wb")
+        self._write_header()
+
+    def isOpened(self):
+        # Cùng tên với cv2.VideoWriter để ClipWriter dùng chung cách kiểm tra
+        return self.file is not None
+
+    def _write_header(self):
+        f = self.file
+        f.write(b"RIFF" + struct.pack("<I", 0) + b"AVI ")
+
+        strh = struct.pack(
+            "<4s4sIHHIIIIIIIIhhhh",
+            b"vids", b"MJPG", 0, 0, 0, 0,
+            1, self.fps, 0, 0,         # dwScale, dwRate, dwStart, dwLength (vá sau)
+            0, 0xFFFFFFFF, 0,          # dwSuggestedBufferSize, dwQuality, dwSampleSize
+            0, 0, self.width, self.height,
+        )
+        strf = struct.pack(
+            "<IiiHH4sIiiII",
+            40, self.width, self.height, 1, 24, b"MJPG",
+            self.width * self.height * 3, 0, 0, 0, 0,
+        )
+        strl = b"strl" + b"strh" + struct.pack("<I", len(strh)) + strh + b"strf" + struct.pack("<I", len(strf)) + strf
+
+        avih = struct.pack(
+            "<IIIIIIIIII16x",
+            1_000_000 // self.fps, 0, 0, AVIF_HASINDEX,
+            0, 0, 1, 0,                # dwTotalFrames (vá sau), dwInitialFrames, dwStreams, dwSuggestedBufferSize
+            self.width, self.height,
+        )
+        hdrl = b"hdrl" + b"avih" + struct.pack("<I", len(avih)) + avih + b"LIST" + struct.pack("<I", len(strl)) + strl
+
+        hdrl_pos = f.tell()
+        f.write(b"LIST" + struct.pack("<I", len(hdrl)) + hdrl)
+
+        # Vị trí các trường cần vá khi đóng file
+        avih_data = hdrl_pos + 8 + 4 + 8
+        self._total_frames_pos = avih_data + 16
+        self._avih_buffer_pos = avih_data + 28
+        strh_data = avih_data + len(avih) + 8 + 4 + 8
+        self._length_pos = strh_data + 32
+        self._strh_buffer_pos = strh_data + 36
+
+        self._movi_pos = f.tell()
+        f.write(b"LIST" + struct.pack("<I", 0) + b"movi")
+
+    @property
+    def size(self) -> int:
+        """Dung lượng file nếu đóng ngay bây giờ (gồm cả idx1)."""
+        return self.file.tell() + 8 + 16 * len(self.index)
+
+    def write(self, jpeg: bytes):
+        if self.size + 8 + len(jpeg) + 1 + 16 > _MAX_RIFF_BYTES:
+            raise OverflowError(f"{self.path} đã chạm giới hạn 4 GiB của AVI 1.0")
+        offset = self.file.tell() - (self._movi_pos + 8)
+        self.file.write(b"00dc" + struct.pack("<I", len(jpeg)) + jpeg)
+        if len(jpeg) % 2:
+            self.file.write(b"\0")
+        self.index.append((offset, len(jpeg)))
+        self.max_frame_bytes = max(self.max_frame_bytes, len(jpeg))
+
+    def release(self):
+        if self.file is None:
+            return
+        f = self.file
+        # Vá header lỗi thì file vẫn phải được đóng
+        try:
+            movi_end = f.tell()
+
+            f.write(b"idx1" + struct.pack("<I", 16 * len(self.index)))
+            f.write(b"".join(struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, offset, size) for offset, size in self.index))
+            file_end = f.tell()
+
+            for pos, value in [
+                (4, file_end - 8),
+                (self._movi_pos + 4, movi_end - self._movi_pos - 8),
+                (self._total_frames_pos, len(self.index)),
+                (self._length_pos, len(self.index)),
+                (self._avih_buffer_pos, self.max_frame_bytes),
+                (self._strh_buffer_pos, self.max_frame_bytes),
+            ]:
+                f.seek(pos)
+                f.write(struct.pack("<I", value))
+        finally:
+            f.close()
+            self.file = None
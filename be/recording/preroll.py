@@ -0,0 +1,53 @@
+# recording/preroll.py
+from collections import deque
+
+import cv2
+import numpy as np
+
+PREROLL_JPEG_QUALITY = 90
+
+
+class PreRollBuffer:
+    """Bộ đệm pre-event lưu JPEG đã nén và metadata box thay vì ảnh BGR đã giải mã.
+
+    Chỉ giải mã khi bắt đầu ghi clip; box đã lưu được ghi sang file sidecar của clip.
+    """
+
+    def __init__(self, seconds: int, fps: int):
+        self.entries = deque(maxlen=seconds * fps)
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, frame, boxes=None):
+        jpeg = frame.jpeg
+        if jpeg is None:
+            # Nguồn không có sẵn JPEG (ví dụ đọc thẳng từ camera) thì nén một lần ở đây
+            ok, encoded = cv2.imencode(".jpg", frame.image, [cv2.IMWRITE_JPEG_QUALITY, PREROLL_JPEG_QUALITY])
+            if not ok:
+                return
+            jpeg = encoded.tobytes()
+
+        if len(self.entries) == self.entries.maxlen:
+            self.nbytes -= len(self.entries[0][0])
+        self.entries.append((jpeg, boxes, frame.timestamp))
+        self.nbytes += len(jpeg)
+
+    def take(self):
+        # Lấy toàn bộ entry (JPEG chưa giải mã) và xoá bộ đệm; giải mã để cho luồng ghi clip làm
+        entries, self.entries = list(self.entries), deque(maxlen=self.entries.maxlen)
+        self.nbytes = 0
+        return entries
+
+    @staticmethod
+    def decode(entries):
+        # Trả về lần lượt (raw, boxes, timestamp)
+        for jpeg, boxes, timestamp in entries:
+            raw = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if raw is None:
+                continue
+            yield raw, boxes, timestamp
+
+    def drain(self):
+        return self.decode(self.take())
@@ -0,0 +1,178 @@
+# recording/recorder.py
+import os
+import queue
+import time
+from functools import partial
+
+from config import VIDEO_OUTPUT_DIR, RECORDING_CONTAINER, TRANSCODE_ENABLED
+from recording.catalog import save_clip
+from recording.clip_writer import ClipWriter
+from recording.preroll import PreRollBuffer
+from recording.transcoder import get_transcoder
+from utils.logger import log_event, event_collection as event_col
+from utils.logger import clip_collection as clip_col
+
+
+def on_clip_transcoded(cam_id: str, source_path: str, output_path: str):
+    # Sự kiện đang trỏ vào file AVI thì chuyển sang bản H.264
+    output_path = output_path.replace("\\", "/")
+    res = event_col.update_many({"video_path": source_path}, {"$set": {"video_path": output_path}})
+    print(f"[INFO] 🔁 Cập nhật {res.modified_count} sự kiện sang {output_path}")
+    size_bytes = os.path.getsize(output_path) if os.path.exists(output_path) else None
+    clip_col.update_one({"video_path": source_path},
+                        {"$set": {"video_path": output_path, "codec": "h264", "size_bytes": size_bytes}})
+
+
+def video_recorder(cam_id: str, frame_ring, detector, metadata: dict):
+    """Improved video recorder with better error handling and logging"""
+    # Con trỏ đọc lần lượt frame trong vòng frame của camera
+    frames = frame_ring.reader()
+    writer = None
+    video_path = ""
+    FPS = 25
+    BUFFER_SECONDS = 10
+    # Pre-roll giữ JPEG nén + box thay vì 2 ảnh BGR mỗi frame
+    preroll = PreRollBuffer(BUFFER_SECONDS, FPS)
+
+    is_recording = False
+    abnormal_last_time = 0
+    folder_path = ""
+    total_frames_received = 0
+    triggers = set()  # luật đã kích hoạt trong clip đang ghi
+
+    def on_clip_finished(clip_triggers: set, success: bool, clip):
+        # Chạy trên luồng ghi clip sau khi file đã đóng và được kiểm tra
+        clip_path = clip.video_path
+        if success and os.path.exists(clip_path):
+            try:
+                log_event("abnormal_end", 1.0, cam_id, video_path=clip_path)
+                print(f"[INFO] ✅ Đã log sự kiện kết thúc cho: {clip_path}")
+            except Exception as e:
+                print(f"[ERROR] Lỗi khi log event: {e}")
+
+            # Ghi danh mục clip một lần; liệt kê / xoá clip đọc từ đây thay vì quét sự kiện
+            save_clip(clip_col, clip, cam_id, room_id, clip_triggers, camera_name, room_name)
+
+            # Clip MJPEG được chuyển sang H.264 sau, khi máy rảnh
+            if TRANSCODE_ENABLED and RECORDING_CONTAINER == "mjpeg":
+                get_transcoder(on_clip_transcoded).submit(cam_id, clip_path)
+        else:
+            print("[ERROR] ❌ Không thể log sự kiện vì file video không được lưu thành công.")
+
+    def stop_recording(reason: str):
+        nonlocal is_recording, writer
+        if is_recording:
+            print(f"[DEBUG] 🛑 Dừng ghi video ({reason}): {video_path}")
+            print(f"[DEBUG] 📊 Tổng frame đã gửi cho writer trước khi dừng: {writer.frame_count if writer else 0}")
+
+            # Không chờ: đóng file, kiểm tra và log sự kiện do ClipWriter làm nền
+            if writer:
+                writer.close()
+                writer = None
+            is_recording = False
+
+    # Metadata camera đã được tra (bất đồng bộ) khi tạo session
+    camera_name = metadata["camera_name"]
+    room_name = metadata["room_name"]
+    room_id = metadata["room_id"]
+
+    print(f"[INFO] 🎥 Bắt đầu video recorder cho camera: {camera_name} trong phòng: {room_name}")
+
+    # Main recording loop
+    while detector.running:
+        try:
+            frame = frames.get(timeout=1)
+            raw_frame = frame.image
+            timestamp = frame.timestamp
+            total_frames_received += 1
+
+            if raw_frame is None or raw_frame.size == 0:
+                print("[WARNING] ⚠️ Frame rỗng, bỏ qua")
+                continue
+
+            # Log định kỳ để debug
+            if total_frames_received % 500 == 0:
+                print(f"[DEBUG] 📊 Recorder đã nhận {total_frames_received} frames, đang ghi: {is_recording}")
+
+            with detector.lock:
+                boxes = detector.latest_boxes
+            written = False
+
+            # Kiểm tra trạng thái abnormal
+            if detector.is_abnormal:
+                abnormal_last_time = time.time()
+
+                if is_recording and writer and writer.full:
+                    # File clip chạm giới hạn dung lượng: đóng và ghi tiếp sang clip mới ngay từ frame này
+                    stop_recording("clip đạt giới hạn dung lượng")
+
+                if not is_recording:
+                    print("[INFO] 🚨 Bắt đầu ghi video do phát hiện bất thường")
+                    is_recording = True
+
+                    # Tạo đường dẫn thư mục
+                    date_str = time.strftime("%Y-%m-%d", time.localtime(timestamp))
+                    time_str = time.strftime("%H-%M-%S", time.localtime(timestamp))
+                    folder_path = os.path.join(VIDEO_OUTPUT_DIR, room_name, camera_name, date_str, time_str)
+                    
+                    try:
+                        os.makedirs(folder_path, exist_ok=True)
+                        print(f"[INFO] 📁 Tạo thư mục thành công: {folder_path}")
+                    except Exception as e:
+                        print(f"[ERROR] Không thể tạo thư mục: {folder_path}, lỗi: {e}")
+                        continue
+
+                    # Toàn bộ mã hoá/ghi file chạy trên luồng riêng của ClipWriter
+                    triggers = set()
+                    writer = ClipWriter(cam_id, folder_path, FPS, detector.class_table.labels,
+                                        on_finished=partial(on_clip_finished, triggers))
+                    video_path = writer.video_path
+
+                    print("[INFO] 📂 Video paths:")
+                    print(f"  Clean: {writer.clean_path}")
+                    print(f"  Sidecar: {writer.sidecar_path}")
+
+                    # Log sự kiện bắt đầu
+                    try:
+                        log_event("abnormal_start", 1.0, cam_id, video_path=video_path)
+                    except Exception as e:
+                        print(f"[ERROR] Lỗi khi log event start: {e}")
+
+                    # Chỉ chuyển JPEG của pre-roll sang writer; giải mã diễn ra ở luồng ghi
+                    buffer_bytes = preroll.nbytes
+                    buffered = preroll.take()
+                    writer.write_preroll(buffered)
+                    print(f"[INFO] 📼 Chuyển {len(buffered)} frames từ buffer cho writer ({buffer_bytes // 1024} KB JPEG)")
+
+                # Ghi frame hiện tại: chỉ đẩy tham chiếu vào hàng đợi của writer
+                if is_recording and writer:
+                    triggers.update(detector.incidents.active_rules())
+                    # Hàng đợi đầy thì frame bị bỏ (đã đếm trong metrics), không đưa lại vào pre-roll
+                    writer.write(frame, boxes)
+                    written = True
+
+            elif is_recording:
+                # Kiểm tra xem có nên dừng ghi không
+                if time.time() - abnormal_last_time >= 3:
+                    stop_recording("3s không còn bất thường")
+
+            # Frame không vào clip thì giữ trong pre-roll cho lần ghi tiếp theo
+            if not written:
+                preroll.append(frame, boxes)
+
+        except queue.Empty:
+            # Timeout - kiểm tra xem có nên dừng ghi không
+            if is_recording and abnormal_last_time > 0 and (time.time() - abnormal_last_time >= 3):
+                stop_recording("timeout - mất kết nối")
+            continue
+        except Exception as e:
+            print(f"[ERROR] Lỗi trong video recorder loop: {e}")
+            if is_recording:
+                stop_recording("lỗi trong quá trình ghi")
+            continue
+
+    # Cleanup khi thoát
+    if is_recording:
+        stop_recording("kết thúc chương trình")
+    
+    print(f"[INFO] 🏁 Video recorder cho camera {cam_id} đã kết thúc. Tổng frames nhận: {total_frames_received} (bỏ qua {frames.skipped})")
\ No newline at end of file
@@ -0,0 +1,129 @@
+# recording/sidecar.py
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics.engine.results import Boxes
+
+from utils.helpers import draw_boxes
+
+SIDECAR_FILENAME = "abnormal_detections.jsonl"
+# Bản annotated chỉ được tạo khi export theo yêu cầu (clip cũ có sẵn file này)
+ANNOTATED_FILENAME = "abnormal_annotated.mp4"
+
+
+def sidecar_path(video_path) -> Path:
+    return Path(video_path).parent / SIDECAR_FILENAME
+
+
+class DetectionSidecar:
+    """Ghi box theo từng frame của clip dưới dạng JSON Lines, thay cho video annotated thứ hai.
+
+    Dòng đầu là header {"version", "fps", "width", "height"}; mỗi frame có box là một dòng
+    {"f": chỉ số frame trong clip, "t": timestamp, "d": [[x1, y1, x2, y2, conf, cls, track_id, label], ...]}.
+    Frame không có box thì bỏ qua.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, fps: int, names=None):
+        self.path = str(path)
+        self.fps = fps
+        self.names = names
+        self.file = None
+        self.lines = 0
+
+    def open(self, width: int, height: int):
+        self.file = open(self.path, "w", encoding="utf-8")
+        self._write({"version": self.VERSION, "fps": self.fps, "width": width, "height": height})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def write(self, frame_index: int, timestamp: float, boxes):
+        if self.file is None or boxes is None or not len(boxes):
+            return
+        if hasattr(boxes, "cpu"):
+            boxes = boxes.cpu().numpy()
+
+        ids = boxes.id.astype(int).tolist() if boxes.id is not None else [None] * len(boxes)
+        detections = []
+        for (x1, y1, x2, y2), conf, cls_id, track_id in zip(
+                boxes.xyxy.round(1).tolist(), boxes.conf.tolist(), boxes.cls.astype(int).tolist(), ids):
+            label = self.names[cls_id] if self.names else str(cls_id)
+            detections.append([x1, y1, x2, y2, round(conf, 3), cls_id, track_id, label])
+
+        self._write({"f": frame_index, "t": round(timestamp, 3), "d": detections})
+        self.lines += 1
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def read_sidecar(path):
+    """Trả về (header, {chỉ số frame: danh sách detection})."""
+    header, frames = {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "f" in record:
+                frames[record["f"]] = record["d"]
+            else:
+                header = record
+    return header, frames
+
+
+def _detections_to_boxes(detections, shape):
+    data = np.array([[x1, y1, x2, y2, conf, cls_id] for x1, y1, x2, y2, conf, cls_id, _, _ in detections],
+                    dtype=np.float32)
+    labels = {int(d[5]): d[7] for d in detections}
+    return Boxes(data, shape[:2]), labels
+
+
+def annotated_frames(video_path):
+    """Đọc clip sạch và vẽ box từ sidecar, trả về lần lượt frame BGR đã chú thích."""
+    path = sidecar_path(video_path)
+    _, frames = read_sidecar(path) if path.exists() else ({}, {})
+
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        index = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            detections = frames.get(index)
+            if detections:
+                boxes, labels = _detections_to_boxes(detections, frame.shape)
+                frame = draw_boxes(frame, boxes, labels)
+            yield frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def export_annotated(video_path, output_path, fps: int = None) -> int:
+    """Xuất video annotated theo yêu cầu; trả về số frame đã ghi."""
+    path = sidecar_path(video_path)
+    if fps is None:
+        header = read_sidecar(path)[0] if path.exists() else {}
+        fps = header.get("fps", 25)
+
+    out = None
+    count = 0
+    try:
+        for frame in annotated_frames(video_path):
+            if out is None:
+                h, w = frame.shape[:2]
+                out = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+            out.write(frame)
+            count += 1
+    finally:
+        if out:
+            out.release()
+    return count
@@ -0,0 +1,132 @@
+# recording/transcoder.py
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+from config import TRANSCODE_IDLE_SECONDS, TRANSCODE_THREADS, TRANSCODE_CRF, TRANSCODE_DELETE_SOURCE
+from recording import clip_writer
+from utils import metrics
+
+
+class IdleTranscoder:
+    """Job nền chuyển clip MJPEG (AVI) đã ghi xong sang H.264 (mp4) khi máy rảnh.
+
+    Chỉ chạy khi không có ClipWriter nào đang ghi trong `idle_seconds` giây. Dùng ffmpeg
+    (libx264) nếu có trong PATH, nếu không thì thử VideoWriter "avc1" của OpenCV.
+    Sau khi xong gọi `on_transcoded(cam_id, source_path, output_path)`.
+    """
+
+    def __init__(self, on_transcoded=None, idle_seconds: float = TRANSCODE_IDLE_SECONDS):
+        self.on_transcoded = on_transcoded
+        self.idle_seconds = idle_seconds
+        self.queue = queue.Queue()
+        self.ffmpeg = shutil.which("ffmpeg")
+        self.thread = threading.Thread(target=self._run, name="clip-transcoder", daemon=True)
+        self.thread.start()
+
+    def submit(self, cam_id: str, video_path: str):
+        self.queue.put((cam_id, video_path))
+
+    def _wait_until_idle(self):
+        while clip_writer.idle_seconds() < self.idle_seconds:
+            time.sleep(1.0)
+
+    def _run(self):
+        while True:
+            cam_id, source = self.queue.get()
+            self._wait_until_idle()
+
+            output = str(Path(source).with_suffix(".mp4"))
+            start = time.time()
+            try:
+                ok = self._transcode(source, output)
+            except Exception as e:
+                print(f"[ERROR] Lỗi khi chuyển mã {source}: {e}")
+                ok = False
+            if not ok:
+                metrics.incr(cam_id, "transcode_errors")
+                _remove(output)
+                continue
+
+            try:
+                sizes = f"{os.path.getsize(source) // 1024} KB -> {os.path.getsize(output) // 1024} KB"
+            except OSError as e:
+                # Clip bị xoá (qua API) trong lúc chờ / chuyển mã: bản mp4 không còn thuộc clip nào
+                print(f"[WARNING] ⚠️ Bỏ kết quả chuyển mã {source}: {e}")
+                _remove(output)
+                continue
+            elapsed = time.time() - start
+            metrics.incr(cam_id, "transcoded_clips")
+            metrics.set_value(cam_id, "transcode_seconds", round(elapsed, 2))
+            print(f"[INFO] 🔁 Đã chuyển {source} -> {output} ({elapsed:.1f}s, {sizes})")
+
+            if self.on_transcoded:
+                try:
+                    self.on_transcoded(cam_id, source, output)
+                except Exception as e:
+                    # Không xoá bản gốc khi chưa cập nhật được đường dẫn mới
+                    print(f"[ERROR] Lỗi sau khi chuyển mã {source}: {e}")
+                    continue
+            if TRANSCODE_DELETE_SOURCE:
+                _remove(source)
+
+    def _transcode(self, source, output) -> bool:
+        if self.ffmpeg:
+            # -vsync 0 giữ nguyên số frame để chỉ số trong sidecar vẫn khớp
+            cmd = [
+                self.ffmpeg, "-y", "-loglevel", "error", "-i", source, "-vsync", "0",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", str(TRANSCODE_CRF),
+                "-pix_fmt", "yuv420p", "-threads", str(TRANSCODE_THREADS), "-movflags", "+faststart", output,
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"[ERROR] ffmpeg lỗi khi chuyển {source}: {result.stderr.strip()}")
+                return False
+            return os.path.exists(output) and os.path.getsize(output) > 0
+
+        cap = cv2.VideoCapture(source)
+        out = None
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25
+            w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            out = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*"avc1"), fps, (w, h))
+            if not out.isOpened():
+                print("[WARNING] ⚠️ Không có ffmpeg và OpenCV không hỗ trợ H.264, giữ nguyên clip MJPEG")
+                return False
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                out.write(frame)
+        finally:
+            cap.release()
+            if out:
+                out.release()
+        return os.path.exists(output) and os.path.getsize(output) > 0
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[ERROR] Không xoá được {path}: {e}")
+
+
+_transcoder = None
+_transcoder_lock = threading.Lock()
+
+
+def get_transcoder(on_transcoded=None) -> IdleTranscoder:
+    global _transcoder
+    with _transcoder_lock:
+        if _transcoder is None:
+            _transcoder = IdleTranscoder(on_transcoded)
+        return _transcoder
@@ -0,0 +1,121 @@
+# sharding/frame_ring.py
+import queue
+import threading
+import time
+
+from config import FRAME_RING_SLOTS
+from utils import metrics
+from utils.frame import Frame
+
+
+class FrameRing:
+    """Vòng N slot giữ tham chiếu tới Frame bất biến, cho người ghi và người đọc cùng tiến trình.
+
+    Thay cho queue.Queue giữa luồng nhận frame và recorder: người ghi không bao giờ chờ
+    người đọc — slot cũ nhất bị ghi đè, người đọc chậm thì nhảy tới frame mới nhất.
+    Frame không bị sao chép (ảnh chỉ đọc). Chế độ nhiều tiến trình không dùng vòng này:
+    JPEG gốc đi qua SharedJpegSlot (sharding/shm_slot.py) và được giải mã trong worker.
+    """
+
+    def __init__(self, slots: int = FRAME_RING_SLOTS, cam_id: str = ""):
+        self.cam_id = cam_id
+        self.slots = slots
+        self._entries = [None] * slots  # (seq ring, Frame)
+        self._seq = 0
+        self.closed = False
+        # Người đọc chờ frame mới trên condition thay vì hỏi lại liên tục
+        self._published = threading.Condition(threading.Lock())
+
+    def publish(self, frame: Frame) -> int:
+        with self._published:
+            seq = self._seq + 1
+            # Gán một tuple là nguyên tử: người đọc thấy slot cũ hoặc slot mới, không lẫn
+            self._entries[(seq - 1) % self.slots] = (seq, frame)
+            self._seq = seq
+            self._published.notify_all()
+        return seq
+
+    def head(self) -> int:
+        return self._seq
+
+    def read(self, seq: int):
+        if seq <= 0:
+            return None
+        entry = self._entries[(seq - 1) % self.slots]
+        if entry is None or entry[0] != seq:
+            return None
+        return entry[1]
+
+    def latest(self, newer_than: int = 0):
+        """Frame mới nhất: (seq, frame), hoặc None nếu không có gì mới hơn `newer_than`."""
+        for _ in range(3):
+            seq = self.head()
+            if seq <= newer_than:
+                return None
+            frame = self.read(seq)
+            if frame is not None:
+                return seq, frame
+        return None
+
+    def wait(self, newer_than: int, timeout: float = None) -> bool:
+        """Chờ tới khi có frame mới hơn `newer_than`; False nếu hết thời gian hoặc vòng đã đóng."""
+        with self._published:
+            return self._published.wait_for(lambda: self.closed or self._seq > newer_than, timeout) and not self.closed
+
+    def reader(self):
+        return FrameRingReader(self)
+
+    def close(self):
+        with self._published:
+            self.closed = True
+            self._entries = [None] * self.slots
+            self._published.notify_all()
+
+
+class FrameRingReader:
+    """Con trỏ đọc lần lượt từng frame của vòng (mỗi người đọc một con trỏ riêng).
+
+    Đọc chậm hơn người ghi quá số slot thì nhảy tới frame mới nhất; số frame bị bỏ qua
+    được cộng vào `skipped` và metric `frame_ring_skipped`.
+    """
+
+    def __init__(self, ring: FrameRing):
+        self.ring = ring
+        self.position = ring.head()
+        self.skipped = 0
+
+    def next(self):
+        ring = self.ring
+        head = ring.head()
+        if head <= self.position:
+            return None
+        wanted = self.position + 1
+        # Slot sắp bị ghi đè thì bỏ qua luôn, khỏi đọc hụt
+        if head - wanted >= ring.slots - 1:
+            wanted = head
+        frame = ring.read(wanted)
+        if frame is None:
+            latest = ring.latest(self.position)
+            if latest is None:
+                return None
+            wanted, frame = latest
+
+        if wanted > self.position + 1:
+            skipped = wanted - self.position - 1
+            self.skipped += skipped
+            metrics.incr(ring.cam_id, "frame_ring_skipped", skipped)
+        self.position = wanted
+        return frame
+
+    def get(self, timeout: float = None):
+        """Như queue.Queue.get: chờ frame kế tiếp, hết thời gian thì raise queue.Empty."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self.next()
+            if frame is not None:
+                return frame
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty
+            if not self.ring.wait(self.position, remaining):
+                raise queue.Empty
@@ -0,0 +1,85 @@
+# sharding/shm_slot.py
+import hashlib
+import struct
+import time
+from multiprocessing import shared_memory
+
+from config import SHARD_JPEG_SLOT_BYTES
+
+# seq (lẻ = đang ghi), frame_seq, version, timestamp, length, flags
+_HEADER = struct.Struct("<QQQdII")
+_FIELDS = struct.Struct("<QQdII")  # phần header sau seq
+_PAYLOAD_OFFSET = 64
+
+FLAG_ABNORMAL = 1
+FLAG_STOPPED = 2  # session phía worker đã dừng (detect loop chết...), phía FastAPI cần tạo lại
+
+
+def shm_name(cam_id: str, kind: str) -> str:
+    # Tên ngắn, cố định theo camera để tiến trình khác mở lại được (giới hạn tên trên macOS)
+    return f"vs_{hashlib.md5(cam_id.encode()).hexdigest()[:16]}_{kind}"
+
+
+class SharedJpegSlot:
+    """Một JPEG mới nhất trong shared memory, một tiến trình ghi và nhiều tiến trình đọc.
+
+    Dùng seqlock: người ghi tăng `seq` lên số lẻ, ghi header + dữ liệu rồi tăng lên số
+    chẵn; người đọc sao chép dữ liệu và chỉ nhận kết quả khi `seq` không đổi và là số
+    chẵn. Người ghi không bao giờ chờ người đọc.
+    """
+
+    def __init__(self, name: str, create: bool = False, capacity: int = SHARD_JPEG_SLOT_BYTES):
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=_PAYLOAD_OFFSET + capacity)
+            except FileExistsError:
+                # Còn sót lại từ lần chạy trước bị dừng đột ngột
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=_PAYLOAD_OFFSET + capacity)
+            self.shm.buf[:_PAYLOAD_OFFSET] = bytes(_PAYLOAD_OFFSET)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = name
+        self.owner = create
+        self.capacity = self.shm.size - _PAYLOAD_OFFSET
+        self._seq = 0
+
+    def write(self, data: bytes, frame_seq: int = 0, version: int = 0, timestamp: float = None, flags: int = 0) -> bool:
+        if len(data) > self.capacity:
+            return False
+        buf = self.shm.buf
+        self._seq += 1
+        struct.pack_into("<Q", buf, 0, self._seq)
+        buf[_PAYLOAD_OFFSET:_PAYLOAD_OFFSET + len(data)] = data
+        _FIELDS.pack_into(buf, 8, frame_seq, version, time.time() if timestamp is None else timestamp, len(data), flags)
+        # seq chẵn được ghi sau cùng, tách riêng khỏi các trường còn lại
+        self._seq += 1
+        struct.pack_into("<Q", buf, 0, self._seq)
+        return True
+
+    def sequence(self) -> int:
+        return struct.unpack_from("<Q", self.shm.buf, 0)[0]
+
+    def read(self, newer_than: int = -1, retries: int = 100):
+        """Trả về (seq, frame_seq, version, timestamp, flags, data), hoặc None nếu chưa có gì mới hơn `newer_than`."""
+        buf = self.shm.buf
+        for _ in range(retries):
+            seq, frame_seq, version, timestamp, length, flags = _HEADER.unpack_from(buf, 0)
+            if seq == 0 or seq == newer_than:
+                return None
+            if seq % 2:
+                continue
+            data = bytes(buf[_PAYLOAD_OFFSET:_PAYLOAD_OFFSET + length])
+            if struct.unpack_from("<Q", buf, 0)[0] == seq:
+                return seq, frame_seq, version, timestamp, flags, data
+        return None
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
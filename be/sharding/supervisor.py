@@ -0,0 +1,259 @@
+# sharding/supervisor.py
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import time
+
+from config import SHARD_CONTROL_TIMEOUT, SHARD_START_TIMEOUT
+from sharding.shm_slot import SharedJpegSlot, FLAG_ABNORMAL, FLAG_STOPPED, shm_name
+from sharding.worker import run_worker
+from streaming.profiles import rescale_jpeg
+from utils import metrics
+
+STREAM_CACHE_PROFILES = 16
+
+
+class WorkerHandle:
+    """Một tiến trình worker và kênh điều khiển (Pipe) của nó.
+
+    Mỗi lệnh mang một id và worker trả lời kèm id đó: trả lời muộn của lệnh đã hết
+    thời gian chờ bị bỏ qua thay vì bị đọc nhầm thành trả lời của lệnh sau.
+    """
+
+    def __init__(self, index: int, ctx):
+        self.index = index
+        self.ctx = ctx
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.cameras = {}  # cam_id -> lệnh start, để phát lại khi worker khởi động lại
+        self._spawn()
+
+    def _spawn(self):
+        self.conn, child = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=run_worker, args=(self.index, child), name=f"camera-worker-{self.index}", daemon=True)
+        self.process.start()
+        child.close()
+
+    def post(self, message: dict):
+        """Gửi lệnh không chờ trả lời (trả lời đến sau sẽ bị request() bỏ qua)."""
+        with self.lock:
+            self.conn.send(dict(message, id=next(self._ids)))
+
+    def request(self, message: dict, timeout: float = SHARD_CONTROL_TIMEOUT) -> dict:
+        with self.lock:
+            request_id = next(self._ids)
+            self.conn.send(dict(message, id=request_id))
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.conn.poll(remaining):
+                    raise TimeoutError(f"Worker {self.index} không trả lời lệnh {message['op']}")
+                reply = self.conn.recv()
+                if reply.get("id") == request_id:
+                    break
+                print(f"[WARNING] ⚠️ Bỏ trả lời muộn của worker {self.index} (lệnh #{reply.get('id')})")
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "lỗi không rõ"))
+        return reply
+
+    def restart(self):
+        with self.lock:
+            self.conn.close()
+            self._spawn()
+        for message in list(self.cameras.values()):
+            try:
+                self.request(message, timeout=SHARD_START_TIMEOUT)
+            except Exception as e:
+                print(f"[ERROR] Không khởi động lại được camera {message['cam_id']} trên worker {self.index}: {e}")
+
+
+class RemoteSession:
+    """Đại diện phía FastAPI của một camera chạy trong tiến trình worker.
+
+    Có cùng giao diện với CameraSession mà /ws/video dùng (attach/detach, ingest,
+    get_latest_stream_jpeg, start_ingest...), nhưng frame chỉ đi qua shared memory.
+    """
+
+    def __init__(self, supervisor, worker: WorkerHandle, cam_id: str):
+        self.supervisor = supervisor
+        self.worker = worker
+        self.cam_id = cam_id
+        self.in_slot = SharedJpegSlot(shm_name(cam_id, "in"), create=True)
+        self.out_slot = SharedJpegSlot(shm_name(cam_id, "out"), create=True)
+
+        self._running = True
+        self.viewers = 0
+        self.frame_count = 0
+        self.ingest_url = None
+        self.started_at = time.time()
+        self._latest = None  # (seq, key, jpeg, timestamp, flags) đọc gần nhất từ slot ra
+        self._stream_cache = {}
+
+    @property
+    def running(self):
+        # Session phía worker dừng thì worker đánh dấu FLAG_STOPPED trên slot ra
+        if self._running:
+            self._refresh()
+        return self._running
+
+    @property
+    def ingesting(self):
+        return self.ingest_url is not None
+
+    def attach(self):
+        self.viewers += 1
+        metrics.set_value(self.cam_id, "viewers", self.viewers)
+
+    def detach(self):
+        self.viewers = max(0, self.viewers - 1)
+        metrics.set_value(self.cam_id, "viewers", self.viewers)
+
+    def ingest(self, data: bytes, timestamp: float = None) -> bool:
+        # Không giải mã ở đây: JPEG của client đi thẳng sang worker
+        self.frame_count += 1
+        metrics.incr(self.cam_id, "frames_forwarded")
+        return self.in_slot.write(data, self.frame_count, timestamp=timestamp)
+
+    def start_ingest(self, url: str):
+        self.worker.request({"op": "start_ingest", "cam_id": self.cam_id, "url": url})
+        self.worker.cameras[self.cam_id]["url"] = url
+        self.ingest_url = url
+
+    def stop_ingest(self):
+        self.worker.request({"op": "stop_ingest", "cam_id": self.cam_id})
+        self.worker.cameras[self.cam_id].pop("url", None)
+        self.ingest_url = None
+
+    def _refresh(self):
+        item = self.out_slot.read(self._latest[0] if self._latest else -1)
+        if item is not None:
+            seq, frame_seq, version, timestamp, flags, data = item
+            if flags & FLAG_STOPPED:
+                self._running = False
+                return
+            self._latest = (seq, (frame_seq, version), data, timestamp, flags)
+
+    def get_latest_stream_jpeg(self, profile=None):
+        self._refresh()
+        if self._latest is None:
+            return None, None
+        _, key, jpeg, _, _ = self._latest
+        if profile is None or profile.is_source:
+            return key, jpeg
+
+        # Profile thu nhỏ: tạo một lần cho mỗi frame và dùng chung cho các viewer cùng profile
+        cached = self._stream_cache.get(profile.key)
+        if cached is not None and cached[0] == key:
+            return cached
+        scaled = rescale_jpeg(jpeg, profile)
+        if scaled is None:
+            return None, None
+        metrics.incr(self.cam_id, "stream_encodes")
+        if profile.key not in self._stream_cache and len(self._stream_cache) >= STREAM_CACHE_PROFILES:
+            self._stream_cache.clear()
+        self._stream_cache[profile.key] = (key, scaled)
+        return key, scaled
+
+    def status(self):
+        self._refresh()
+        _, (frame_seq, _), _, timestamp, flags = self._latest or (0, (0, 0), None, None, 0)
+        return {
+            "cam_id": self.cam_id,
+            "running": self.running,
+            "viewers": self.viewers,
+            "frames": frame_seq,
+            "last_frame_at": timestamp,
+            "is_abnormal": bool(flags & FLAG_ABNORMAL),
+            "ingest_url": self.ingest_url,
+            "worker": self.worker.index,
+            "uptime": round(time.time() - self.started_at, 1),
+        }
+
+    async def stop(self):
+        await asyncio.to_thread(self.supervisor.stop_camera, self.cam_id)
+
+    def close(self):
+        self._running = False
+        self.in_slot.close()
+        self.out_slot.close()
+
+
+class ShardSupervisor:
+    """Chia pipeline camera cho nhiều tiến trình worker; tiến trình FastAPI chỉ lo API và phát stream.
+
+    Camera mới được giao cho worker đang có ít camera nhất. Worker chết thì được khởi
+    động lại và nhận lại các camera của nó.
+    """
+
+    def __init__(self, processes: int):
+        ctx = multiprocessing.get_context("spawn")
+        self.workers = [WorkerHandle(i, ctx) for i in range(processes)]
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.running = True
+        self.monitor = threading.Thread(target=self._monitor, name="shard-monitor", daemon=True)
+        self.monitor.start()
+        print(f"[INFO] 🧩 Đã khởi động {processes} camera worker")
+
+    def _monitor(self):
+        while self.running:
+            time.sleep(2.0)
+            for worker in self.workers:
+                if self.running and not worker.process.is_alive():
+                    print(f"[WARNING] ⚠️ Camera worker {worker.index} đã dừng (exit code {worker.process.exitcode}), khởi động lại")
+                    worker.restart()
+
+    def start_camera(self, cam_id: str) -> RemoteSession:
+        with self.lock:
+            session = self.sessions.get(cam_id)
+            if session is not None:
+                return session
+            worker = min(self.workers, key=lambda w: len(w.cameras))
+            session = RemoteSession(self, worker, cam_id)
+            message = {"op": "start", "cam_id": cam_id, "in_slot": session.in_slot.name, "out_slot": session.out_slot.name}
+            try:
+                worker.request(message, timeout=SHARD_START_TIMEOUT)
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    # Worker vẫn sẽ chạy lệnh start muộn: xếp lệnh stop ngay sau để không sót camera
+                    worker.post({"op": "stop", "cam_id": cam_id})
+                session.close()
+                raise
+            worker.cameras[cam_id] = message
+            self.sessions[cam_id] = session
+            return session
+
+    def stop_camera(self, cam_id: str):
+        with self.lock:
+            session = self.sessions.pop(cam_id, None)
+        if session is None:
+            return
+        session.worker.cameras.pop(cam_id, None)
+        try:
+            session.worker.request({"op": "stop", "cam_id": cam_id})
+        except Exception as e:
+            print(f"[ERROR] Lỗi khi dừng camera {cam_id} trên worker {session.worker.index}: {e}")
+        session.close()
+
+    def status(self):
+        replies = []
+        for worker in self.workers:
+            try:
+                replies.append(worker.request({"op": "status"}, timeout=5))
+            except Exception as e:
+                replies.append({"worker": worker.index, "error": str(e)})
+        return replies
+
+    def shutdown(self):
+        self.running = False
+        for cam_id in list(self.sessions):
+            self.stop_camera(cam_id)
+        for worker in self.workers:
+            try:
+                worker.request({"op": "shutdown"})
+            except Exception as e:
+                print(f"[WARNING] ⚠️ Worker {worker.index} không dừng gọn: {e}")
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
@@ -0,0 +1,126 @@
+# sharding/worker.py
+import asyncio
+import signal
+import threading
+import time
+
+import camera_manager
+from config import SHARD_POLL_INTERVAL
+from object_detection.inference_scheduler import get_inference_scheduler
+from recording.recorder import video_recorder
+from sharding.shm_slot import SharedJpegSlot, FLAG_ABNORMAL, FLAG_STOPPED
+from utils import db, metrics
+from utils.logger import get_event_sink
+
+
+class ShardedCamera:
+    """Nối session chạy trong worker với hai slot shared memory của camera.
+
+    Slot vào: JPEG do client đẩy lên qua tiến trình FastAPI. Slot ra: JPEG stream
+    (đã vẽ box) để tiến trình FastAPI phát cho viewer.
+    """
+
+    def __init__(self, session, in_slot: str, out_slot: str):
+        self.session = session
+        self.in_slot = SharedJpegSlot(in_slot)
+        self.out_slot = SharedJpegSlot(out_slot)
+        self.thread = threading.Thread(target=self._run, name=f"shard-bridge-{session.cam_id}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        cam_id = self.session.cam_id
+        last_in, last_key = -1, None
+        while self.session.running:
+            item = self.in_slot.read(last_in)
+            if item is not None:
+                last_in = item[0]
+                self.session.ingest(item[5], item[3])
+
+            key, jpeg = self.session.get_latest_stream_jpeg()
+            if jpeg is not None and key != last_key:
+                flags = FLAG_ABNORMAL if self.session.detector.is_abnormal else 0
+                if self.out_slot.write(jpeg, key[0], key[1], self.session.last_frame_at, flags):
+                    last_key = key
+                else:
+                    metrics.incr(cam_id, "shard_frames_oversize")
+            time.sleep(SHARD_POLL_INTERVAL)
+
+        # Báo tiến trình FastAPI session đã dừng để lần kết nối sau tạo lại camera
+        self.out_slot.write(b"", 0, 0, time.time(), FLAG_STOPPED)
+
+    def close(self):
+        self.thread.join(timeout=5)
+        self.in_slot.close()
+        self.out_slot.close()
+
+
+async def _stop_camera(cameras, cam_id):
+    camera = cameras.pop(cam_id, None)
+    await camera_manager.stop_session(cam_id)
+    if camera is not None:
+        await asyncio.to_thread(camera.close)
+
+
+async def _handle(index, message, cameras):
+    op = message["op"]
+    cam_id = message.get("cam_id")
+
+    if op == "start":
+        if cam_id in cameras:
+            await _stop_camera(cameras, cam_id)
+        session = await camera_manager.get_or_create_session(cam_id, video_recorder)
+        cameras[cam_id] = ShardedCamera(session, message["in_slot"], message["out_slot"])
+        if message.get("url"):
+            await asyncio.to_thread(session.start_ingest, message["url"])
+        print(f"[INFO] 🧩 Worker {index} nhận camera {cam_id} ({len(cameras)} camera)")
+    elif op == "stop":
+        await _stop_camera(cameras, cam_id)
+    elif op == "start_ingest":
+        await asyncio.to_thread(camera_manager.registry[cam_id].start_ingest, message["url"])
+    elif op == "stop_ingest":
+        await asyncio.to_thread(camera_manager.registry[cam_id].stop_ingest)
+    elif op == "status":
+        return {
+            "ok": True,
+            "worker": index,
+            "sessions": [session.status() for session in camera_manager.registry.values()],
+            "metrics": metrics.snapshot(),
+            "inference": get_inference_scheduler().get_stats() if cameras else None,
+            "events": get_event_sink().stats(),
+        }
+    elif op != "shutdown":
+        raise ValueError(f"Lệnh không hợp lệ: {op}")
+    return {"ok": True}
+
+
+async def _serve(index, conn):
+    cameras = {}
+    while True:
+        try:
+            message = await asyncio.to_thread(conn.recv)
+        except (EOFError, OSError):
+            break
+
+        try:
+            reply = await _handle(index, message, cameras)
+        except Exception as e:
+            print(f"[ERROR] Worker {index} lỗi khi xử lý {message.get('op')}: {e}")
+            reply = {"ok": False, "error": str(e)}
+        # Gắn id của lệnh để supervisor bỏ được trả lời muộn của lệnh đã hết thời gian chờ
+        reply["id"] = message.get("id")
+        conn.send(reply)
+        if message["op"] == "shutdown":
+            break
+
+    for cam_id in list(cameras):
+        await _stop_camera(cameras, cam_id)
+    await asyncio.to_thread(get_event_sink().close)
+    await db.close()
+    print(f"[INFO] 🛑 Camera worker {index} đã dừng")
+
+
+def run_worker(index: int, conn):
+    # Ctrl+C do supervisor xử lý rồi gửi lệnh shutdown, để recorder kịp đóng clip
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    print(f"[INFO] 🚀 Camera worker {index} khởi động")
+    asyncio.run(_serve(index, conn))
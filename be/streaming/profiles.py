@@ -0,0 +1,158 @@
+# streaming/profiles.py
+import cv2
+import numpy as np
+from ultralytics.engine.results import Boxes
+
+from config import (
+    STREAM_DEFAULT_FPS, STREAM_MIN_FPS, STREAM_MIN_QUALITY, STREAM_QUALITY_STEP,
+    STREAM_SLOW_SEND_RATIO, STREAM_RECOVER_AFTER,
+)
+from utils.helpers import draw_boxes
+
+DEFAULT_JPEG_QUALITY = 95  # mặc định của cv2.imencode
+
+
+def _positive_int(value):
+    if value in (None, ""):
+        return None
+    value = int(value)
+    return value if value > 0 else None
+
+
+class StreamProfile:
+    """Yêu cầu của một viewer: khung tối đa (width/height), chất lượng JPEG và fps tối đa.
+
+    `key` chỉ gồm các thông số ảnh hưởng tới ảnh (không gồm fps) để các viewer cùng
+    profile dùng chung một bản preview đã mã hoá.
+    """
+
+    __slots__ = ("width", "height", "quality", "max_fps")
+
+    def __init__(self, width=None, height=None, quality=None, max_fps=None):
+        self.width = _positive_int(width)
+        self.height = _positive_int(height)
+        quality = _positive_int(quality)
+        self.quality = min(quality, 100) if quality else None  # None: giữ chất lượng gốc
+        self.max_fps = min(float(max_fps), STREAM_DEFAULT_FPS) if max_fps else STREAM_DEFAULT_FPS
+
+    @classmethod
+    def from_message(cls, message: dict):
+        # {"type": "profile", "width": 320, "height": 180, "quality": 60, "fps": 10}
+        return cls(message.get("width"), message.get("height"), message.get("quality"), message.get("fps"))
+
+    @property
+    def key(self):
+        return self.width, self.height, self.quality
+
+    @property
+    def is_source(self):
+        # Không thu nhỏ, không đổi chất lượng: có thể gửi nguyên JPEG của client
+        return self.width is None and self.height is None and self.quality is None
+
+    def scale_for(self, shape) -> float:
+        h, w = shape[:2]
+        scales = [1.0]
+        if self.width:
+            scales.append(self.width / w)
+        if self.height:
+            scales.append(self.height / h)
+        return min(scales)
+
+    def with_quality(self, quality):
+        return StreamProfile(self.width, self.height, quality, self.max_fps)
+
+    def __repr__(self):
+        return f"StreamProfile(width={self.width}, height={self.height}, quality={self.quality}, max_fps={self.max_fps})"
+
+
+def _scale_boxes(boxes, scale, shape):
+    data = boxes.data.copy()
+    data[:, :4] *= scale
+    return Boxes(data, shape[:2])
+
+
+def render_preview(frame, boxes, names, profile: StreamProfile):
+    """Trả về (jpeg, encoded) cho một frame theo profile; encoded=False khi gửi nguyên JPEG gốc."""
+    if not boxes and profile.is_source and frame.jpeg is not None:
+        return frame.jpeg, False
+
+    scale = profile.scale_for(frame.shape)
+    if scale < 1.0:
+        # Thu nhỏ trước rồi mới vẽ box (đã scale) để không phải vẽ trên ảnh full-res
+        h, w = frame.shape[:2]
+        image = cv2.resize(frame.image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        if boxes:
+            image = draw_boxes(image, _scale_boxes(boxes, scale, image.shape), names)
+    elif boxes:
+        image = draw_boxes(frame.writable_copy(), boxes, names)
+    else:
+        image = frame.image
+
+    quality = profile.quality or DEFAULT_JPEG_QUALITY
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return None, False
+    return encoded.tobytes(), True
+
+
+def rescale_jpeg(jpeg: bytes, profile: StreamProfile):
+    """Thu nhỏ / đổi chất lượng một JPEG đã vẽ box sẵn (preview từ tiến trình worker)."""
+    image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    scale = profile.scale_for(image.shape)
+    if scale < 1.0:
+        h, w = image.shape[:2]
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, profile.quality or DEFAULT_JPEG_QUALITY])
+    return encoded.tobytes() if ok else None
+
+
+class AdaptiveSender:
+    """Điều chỉnh profile hiệu lực của một viewer theo thời gian send_bytes đo được.
+
+    Gửi chậm (vượt STREAM_SLOW_SEND_RATIO của chu kỳ frame) thì hạ một bậc: giảm chất
+    lượng JPEG theo STREAM_QUALITY_STEP tới STREAM_MIN_QUALITY, sau đó giảm một nửa fps
+    tới STREAM_MIN_FPS. Sau STREAM_RECOVER_AFTER lần gửi nhanh liên tiếp thì nâng lại một bậc.
+    Chất lượng chỉ nhận các bậc rời rạc để viewer cùng profile vẫn dùng chung bản preview.
+    """
+
+    def __init__(self, profile: StreamProfile):
+        self.set_profile(profile)
+
+    def set_profile(self, profile: StreamProfile):
+        self.requested = profile
+        self.level = 0
+        self.fast_sends = 0
+        self._apply()
+
+    def _apply(self):
+        base_quality = self.requested.quality or DEFAULT_JPEG_QUALITY
+        quality_steps = max(0, (base_quality - STREAM_MIN_QUALITY) // STREAM_QUALITY_STEP)
+
+        quality_level = min(self.level, quality_steps)
+        fps_level = self.level - quality_level
+        if quality_level:
+            self.profile = self.requested.with_quality(max(STREAM_MIN_QUALITY, base_quality - quality_level * STREAM_QUALITY_STEP))
+        else:
+            self.profile = self.requested
+        # Không gửi nhanh hơn viewer yêu cầu, kể cả khi yêu cầu dưới STREAM_MIN_FPS
+        self.fps = min(self.requested.max_fps, max(STREAM_MIN_FPS, self.requested.max_fps / (2 ** fps_level)))
+        self.max_level = quality_steps + max(0, int(np.ceil(np.log2(self.requested.max_fps / STREAM_MIN_FPS))))
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.fps
+
+    def record_send(self, seconds: float):
+        if seconds > STREAM_SLOW_SEND_RATIO * self.interval:
+            self.fast_sends = 0
+            if self.level < self.max_level:
+                self.level += 1
+                self._apply()
+        else:
+            self.fast_sends += 1
+            if self.fast_sends >= STREAM_RECOVER_AFTER and self.level > 0:
+                self.fast_sends = 0
+                self.level -= 1
+                self._apply()
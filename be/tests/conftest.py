@@ -0,0 +1,30 @@
+# tests/conftest.py
+# MongoDB giả lập (benchmarks/mongo_standin.py) phải cài trước khi import main / utils.logger:
+# các module đó tạo client ngay lúc import.
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.mongo_standin import install  # noqa: E402
+
+_backend = install(latency=0.0)
+
+
+@pytest.fixture
+def mongo():
+    """Database giả lập (mongomock) rỗng cho mỗi test."""
+    import config
+    from utils import db
+
+    database = _backend[config.DB_NAME]
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    # Client bất đồng bộ gắn với event loop tạo ra nó: mỗi test dùng client mới
+    db._client = None
+    yield database
+    db._client = None
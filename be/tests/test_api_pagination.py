@@ -0,0 +1,134 @@
+# tests/test_api_pagination.py
+# /camera-files và /events trên MongoDB giả lập: phân trang theo cursor, bộ lọc, lỗi 400 / 503.
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+import main
+
+BASE = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def client(mongo):
+    # Không dùng `with`: lifespan không chạy nên không mở camera / tạo index
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def camera_id(mongo):
+    return mongo["cameras"].insert_one({"url": "rtsp://10.0.0.1:554/s", "room_id": "r1"}).inserted_id
+
+
+def seed_clips(mongo, camera_id, count):
+    mongo["clips"].insert_many([{
+        "camera_id": camera_id,
+        "room_id": "r1",
+        "video_path": f"data/output/test/clip_{i}.avi",
+        "started_at": BASE - timedelta(minutes=i),
+        "triggers": ["weapon"] if i % 3 == 0 else ["person_at_door"],
+    } for i in range(count)])
+
+
+def seed_events(mongo, camera_id, count):
+    # Hai sự kiện cùng thời điểm để cursor phải phân định bằng _id
+    mongo["events"].insert_many([{
+        "camera_id": camera_id,
+        "room_id": "r1",
+        "object": "fall" if i % 2 else "fire",
+        "timestamp": BASE - timedelta(minutes=i // 2),
+    } for i in range(count)])
+
+
+def read_all(client, path, key, params):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append(body[key])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_camera_files_pages_newest_first(client, mongo, camera_id):
+    seed_clips(mongo, camera_id, 7)
+
+    pages = read_all(client, "/camera-files", "clips", {"camera_id": str(camera_id), "limit": 3})
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    started = [clip["started_at"] for page in pages for clip in page]
+    assert started == sorted(started, reverse=True)
+    assert len({clip["video_path"] for page in pages for clip in page}) == 7
+
+
+def test_camera_files_last_page_is_full(client, mongo, camera_id):
+    # Đúng bằng limit: không trả cursor cho một trang rỗng
+    seed_clips(mongo, camera_id, 3)
+
+    body = client.get("/camera-files", params={"camera_id": str(camera_id), "limit": 3}).json()
+
+    assert len(body["clips"]) == 3
+    assert body["next_cursor"] is None
+
+
+def test_camera_files_filters(client, mongo, camera_id):
+    seed_clips(mongo, camera_id, 9)
+    params = {
+        "camera_id": str(camera_id),
+        "event_type": "weapon",
+        "since": (BASE - timedelta(minutes=6)).isoformat(),
+        "until": BASE.isoformat(),
+    }
+
+    body = client.get("/camera-files", params=params).json()
+
+    # Clip 0 bắt đầu đúng `until` (khoảng mở bên phải), clip 9 không tồn tại
+    assert body["videos"] == ["data/output/test/clip_3.avi", "data/output/test/clip_6.avi"]
+
+
+def test_events_pages_break_timestamp_ties(client, mongo, camera_id):
+    seed_events(mongo, camera_id, 8)
+
+    pages = read_all(client, "/events", "events", {"camera_id": str(camera_id), "limit": 3})
+
+    ids = [event["id"] for page in pages for event in page]
+    assert [len(page) for page in pages] == [3, 3, 2]
+    assert len(set(ids)) == 8
+
+
+def test_events_filters(client, mongo, camera_id):
+    seed_events(mongo, camera_id, 8)
+    mongo["events"].insert_one({"camera_id": ObjectId(), "room_id": "r2", "object": "fall", "timestamp": BASE})
+
+    body = client.get("/events", params={"room_id": "r1", "event_type": "fall,smoke"}).json()
+
+    assert len(body["events"]) == 4
+    assert {event["object"] for event in body["events"]} == {"fall"}
+    assert {event["camera_id"] for event in body["events"]} == {str(camera_id)}
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/camera-files", {"camera_id": "not-an-id"}),
+    ("/camera-files", {"camera_id": str(ObjectId()), "cursor": "###"}),
+    ("/camera-files", {"camera_id": str(ObjectId()), "since": "yesterday"}),
+    ("/events", {"cursor": "e30="}),
+    ("/events", {"camera_id": "123"}),
+])
+def test_bad_parameters_return_400(client, path, params):
+    assert client.get(path, params=params).status_code == 400
+
+
+def test_database_errors_return_503(client, monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise ServerSelectionTimeoutError("no servers")
+
+    monkeypatch.setattr(main, "find_clips", unavailable)
+    monkeypatch.setattr(main, "find_events", unavailable)
+
+    assert client.get("/camera-files", params={"camera_id": str(ObjectId())}).status_code == 503
+    assert client.get("/events").status_code == 503
@@ -0,0 +1,36 @@
+# tests/test_catalog.py
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import main
+from recording.catalog import ensure_clip_indexes
+
+
+def test_indexes_cover_the_page_sort(mongo):
+    clips = mongo["clips"]
+    clips.create_index([("camera_id", 1), ("started_at", -1)], name="camera_started")
+
+    ensure_clip_indexes(clips)
+
+    indexes = clips.index_information()
+    assert "camera_started" not in indexes
+    assert indexes["camera_started_id"]["key"] == [("camera_id", 1), ("started_at", -1), ("_id", -1)]
+    assert indexes["room_started_id"]["key"] == [("room_id", 1), ("started_at", -1), ("_id", -1)]
+    assert indexes["video_path"]["unique"]
+
+
+def test_delete_matches_legacy_windows_paths(mongo, tmp_path, monkeypatch):
+    # Clip ghi trên Windows trước khi có danh mục: sự kiện (và bản backfill cũ) giữ dấu "\\"
+    monkeypatch.chdir(tmp_path)
+    camera_id = ObjectId()
+    legacy = "data\\output\\cam\\10-00-00\\clip.avi"
+    mongo["clips"].insert_one({"camera_id": camera_id, "video_path": legacy})
+    mongo["events"].insert_many([{"camera_id": camera_id, "video_path": legacy} for _ in range(2)])
+
+    response = TestClient(main.app).delete("/camera-files", params={
+        "camera_id": str(camera_id), "video_path": "data/output/cam/10-00-00/clip.avi",
+    })
+
+    assert response.status_code == 200
+    assert response.json() == {"deletedCount": 2, "clipDeleted": True}
+    assert mongo["clips"].count_documents({}) == 0
@@ -0,0 +1,40 @@
+# tests/test_clip_writer.py
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from recording.clip_writer import ClipWriter
+from utils.frame import Frame
+
+
+def make_frame(seq):
+    image = np.zeros((48, 64, 3), np.uint8)
+    return Frame("cam", image, seq, 1000.0 + seq / 10, jpeg=cv2.imencode(".jpg", image)[1].tobytes())
+
+
+def test_close_with_full_queue_does_not_block_or_lose_frames(tmp_path, monkeypatch):
+    finished = threading.Event()
+    writer = ClipWriter("cam", str(tmp_path), 10, queue_size=3, container="mjpeg",
+                        on_finished=lambda success, clip: finished.set())
+    # Luồng ghi đứng ở frame đầu tiên tới khi hàng đợi đã đầy và close() đã trả về
+    gate = threading.Event()
+    write_frame = writer._write_frame
+
+    def blocked_write(*args, **kwargs):
+        gate.wait(5)
+        write_frame(*args, **kwargs)
+
+    monkeypatch.setattr(writer, "_write_frame", blocked_write)
+
+    accepted = sum(writer.write(make_frame(seq)) for seq in range(10))
+    assert writer.queue.full()
+    start = time.monotonic()
+    writer.close()
+    assert time.monotonic() - start < 0.1
+
+    gate.set()
+    assert finished.wait(10)
+    assert writer.frame_count == accepted
+    assert writer.dropped == 10 - accepted
@@ -0,0 +1,84 @@
+# tests/test_event_store.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from utils import db
+from utils.event_store import after_cursor, decode_cursor, encode_cursor, ensure_event_indexes, find_events
+
+BASE = datetime(2026, 1, 1, 12, 0, 0, 123456)
+
+
+def test_cursor_round_trip():
+    key = ObjectId()
+
+    timestamp, decoded_key = decode_cursor(encode_cursor(BASE, key))
+
+    assert timestamp == BASE
+    assert decoded_key == str(key)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "e30=", "eyJ0IjogIngiLCAiayI6ICIxIn0="])
+def test_decode_rejects_broken_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_after_cursor_breaks_ties_by_key():
+    key = ObjectId()
+
+    query = after_cursor("timestamp", "_id", (BASE, key))
+
+    assert query == {"$or": [
+        {"timestamp": {"$lt": BASE}},
+        {"timestamp": BASE, "_id": {"$lt": key}},
+    ]}
+
+
+def read_pages(limit):
+    async def run():
+        pages, cursor = [], None
+        while True:
+            docs, cursor = await find_events(db.events(), {}, limit, cursor)
+            pages.append(docs)
+            if cursor is None:
+                return pages
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("limit, sizes", [(2, [2, 2, 2]), (4, [4, 2]), (6, [6]), (7, [6])])
+def test_pages_cover_every_event_once(mongo, limit, sizes):
+    # Ba cặp sự kiện cùng thời điểm: ranh giới trang rơi vào giữa một cặp với limit lẻ / chẵn
+    mongo["events"].insert_many([
+        {"_id": ObjectId(), "timestamp": BASE - timedelta(seconds=i // 2)} for i in range(6)
+    ])
+
+    pages = read_pages(limit)
+    docs = [doc for page in pages for doc in page]
+
+    assert [len(page) for page in pages] == sizes
+    assert len({doc["_id"] for doc in docs}) == 6
+    assert [doc["timestamp"] for doc in docs] == sorted((doc["timestamp"] for doc in docs), reverse=True)
+
+
+def test_limit_is_clamped(mongo):
+    mongo["events"].insert_many([{"timestamp": BASE - timedelta(seconds=i)} for i in range(3)])
+
+    docs, cursor = asyncio.run(find_events(db.events(), {}, 0))
+
+    assert len(docs) == 1
+    assert cursor is not None
+
+
+def test_indexes_cover_the_page_sort(mongo):
+    events = mongo["events"]
+    events.create_index([("camera_id", 1), ("timestamp", -1)], name="camera_time")
+
+    ensure_event_indexes(events)
+
+    indexes = events.index_information()
+    assert "camera_time" not in indexes
+    assert indexes["camera_time_id"]["key"] == [("camera_id", 1), ("timestamp", -1), ("_id", -1)]
+    assert indexes["room_time_id"]["key"] == [("room_id", 1), ("timestamp", -1), ("_id", -1)]
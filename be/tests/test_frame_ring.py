@@ -0,0 +1,68 @@
+# tests/test_frame_ring.py
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from sharding.frame_ring import FrameRing
+from utils.frame import Frame
+
+
+def make_frame(seq, height=24, width=32):
+    image = np.full((height, width, 3), seq % 256, np.uint8)
+    return Frame("cam", image, seq, 1000.0 + seq)
+
+
+def test_reader_follows_writer_without_skips():
+    ring = FrameRing(slots=4)
+    reader = ring.reader()
+
+    for seq in range(1, 11):
+        ring.publish(make_frame(seq))
+        assert reader.next().seq == seq
+
+    assert reader.next() is None
+    assert reader.skipped == 0
+
+
+def test_slow_reader_jumps_to_latest_after_wrap():
+    ring = FrameRing(slots=4)
+    reader = ring.reader()
+
+    frames = [make_frame(seq) for seq in range(1, 11)]
+    for frame in frames:
+        ring.publish(frame)
+
+    # Slot của frame 1..6 đã bị ghi đè; frame giữ nguyên tham chiếu, không sao chép
+    assert ring.read(6) is None
+    assert ring.read(7) is frames[6]
+    assert reader.next() is frames[-1]
+    assert reader.skipped == 9
+    assert ring.latest(newer_than=10) is None
+
+
+def test_get_wakes_up_on_publish():
+    ring = FrameRing(slots=4)
+    reader = ring.reader()
+    frame = make_frame(1)
+
+    timer = threading.Timer(0.05, ring.publish, args=(frame,))
+    timer.start()
+    try:
+        assert reader.get(timeout=5) is frame
+    finally:
+        timer.cancel()
+
+
+def test_get_times_out_and_stops_after_close():
+    ring = FrameRing(slots=4)
+    reader = ring.reader()
+
+    with pytest.raises(queue.Empty):
+        reader.get(timeout=0.01)
+
+    ring.publish(make_frame(1))
+    ring.close()
+    with pytest.raises(queue.Empty):
+        reader.get(timeout=5)
@@ -0,0 +1,63 @@
+# tests/test_incidents.py
+# Cập nhật sự cố được event sink ghi theo lô không thứ tự (ordered=False): mọi thứ tự phải cho cùng kết quả.
+import itertools
+
+import pytest
+from bson import ObjectId
+
+from object_detection import incidents
+from object_detection.incidents import IncidentTracker
+
+
+class RecordingSink:
+    def __init__(self):
+        self.upserts = []
+
+    def submit_upsert(self, doc_id, update):
+        self.upserts.append((doc_id, update))
+
+
+@pytest.fixture
+def tracked_updates(monkeypatch):
+    sink = RecordingSink()
+    monkeypatch.setattr(incidents, "get_event_sink", lambda: sink)
+
+    camera_id = ObjectId()
+    tracker = IncidentTracker(str(camera_id), close_after=5, update_interval=1)
+    tracker.hit("weapon", 0.6, now=100.0, track_id=7)
+    tracker.hit("weapon", 0.9, now=101.5, track_id=7)
+    tracker.hit("weapon", 0.7, now=103.0, track_id=7)
+    tracker.sweep(now=109.0)
+    return camera_id, sink.upserts
+
+
+def test_tracker_persists_one_document_per_incident(tracked_updates):
+    _, upserts = tracked_updates
+
+    assert len({doc_id for doc_id, _ in upserts}) == 1
+    assert upserts[-1][1]["$set"]["status"] == "closed"
+
+
+def test_updates_converge_in_any_order(mongo, tracked_updates):
+    # Cùng document cập nhật mà sink gửi trong bulk_write, áp theo từng hoán vị
+    # (mongomock chưa nhận UpdateOne của pymongo mới trong bulk_write)
+    _, upserts = tracked_updates
+
+    results = []
+    for order, permutation in enumerate(itertools.permutations(upserts)):
+        events = mongo[f"events_{order}"]
+        for doc_id, update in permutation:
+            events.update_one({"_id": doc_id}, update, upsert=True)
+        results.append(list(events.find()))
+
+    for docs in results:
+        assert docs == results[0]
+
+    [doc] = results[0]
+    assert doc["status"] == "closed"
+    assert doc["confidence"] == 0.9
+    assert doc["hit_count"] == 3
+    assert doc["track_id"] == 7
+    assert doc["first_seen"] == doc["timestamp"] == incidents._dt(100.0)
+    assert doc["last_seen"] == incidents._dt(103.0)
+    assert doc["closed_at"] == incidents._dt(109.0)
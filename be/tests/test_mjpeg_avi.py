@@ -0,0 +1,73 @@
+# tests/test_mjpeg_avi.py
+import cv2
+import numpy as np
+import pytest
+
+from recording import mjpeg_avi
+from recording.mjpeg_avi import MjpegAviWriter
+
+WIDTH, HEIGHT = 64, 48
+
+
+def jpeg_frames(count):
+    frames = []
+    for i in range(count):
+        image = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+        cv2.rectangle(image, (i, 0), (i + 8, HEIGHT - 1), (255, 255, 255), -1)
+        frames.append(cv2.imencode(".jpg", image)[1].tobytes())
+    return frames
+
+
+def test_clip_reads_back_with_opencv(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = MjpegAviWriter(path, 12, WIDTH, HEIGHT)
+    for jpeg in jpeg_frames(20):
+        writer.write(jpeg)
+    expected_size = writer.size
+    writer.release()
+
+    capture = cv2.VideoCapture(path)
+    try:
+        assert capture.isOpened()
+        assert capture.get(cv2.CAP_PROP_FRAME_COUNT) == 20
+        assert capture.get(cv2.CAP_PROP_FPS) == pytest.approx(12)
+        decoded = []
+        while True:
+            ok, image = capture.read()
+            if not ok:
+                break
+            decoded.append(image)
+    finally:
+        capture.release()
+
+    assert (tmp_path / "clip.avi").stat().st_size == expected_size
+    assert len(decoded) == 20
+    assert decoded[0].shape == (HEIGHT, WIDTH, 3)
+    # Vạch trắng dịch sang phải qua từng frame: đúng thứ tự
+    assert decoded[5][:, 9].mean() > 200 and decoded[0][:, 20].mean() < 50
+
+
+def test_refuses_frames_past_the_32_bit_limit(tmp_path, monkeypatch):
+    jpeg = jpeg_frames(1)[0]
+    writer = MjpegAviWriter(str(tmp_path / "big.avi"), 10, WIDTH, HEIGHT)
+    monkeypatch.setattr(mjpeg_avi, "_MAX_RIFF_BYTES", writer.size + len(jpeg) + 40)
+
+    writer.write(jpeg)
+    with pytest.raises(OverflowError):
+        writer.write(jpeg)
+    writer.release()
+
+    assert len(writer.index) == 1
+
+
+def test_release_closes_file_when_patching_fails(tmp_path):
+    writer = MjpegAviWriter(str(tmp_path / "bad.avi"), 10, WIDTH, HEIGHT)
+    writer.write(jpeg_frames(1)[0])
+    file = writer.file
+    writer.index.append((-1, 0))  # struct.pack("<I") không nhận số âm
+
+    with pytest.raises(Exception):
+        writer.release()
+
+    assert file.closed
+    assert writer.file is None
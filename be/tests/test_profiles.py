@@ -0,0 +1,24 @@
+# tests/test_profiles.py
+from config import STREAM_MIN_FPS
+from streaming.profiles import AdaptiveSender, StreamProfile
+
+
+def slow_down(sender, times):
+    for _ in range(times):
+        sender.record_send(10.0)
+
+
+def test_never_sends_faster_than_requested():
+    sender = AdaptiveSender(StreamProfile(max_fps=STREAM_MIN_FPS / 2))
+
+    assert sender.fps == STREAM_MIN_FPS / 2
+    slow_down(sender, 20)
+    assert sender.fps == STREAM_MIN_FPS / 2
+
+
+def test_slow_sends_halve_fps_down_to_the_minimum():
+    sender = AdaptiveSender(StreamProfile(max_fps=STREAM_MIN_FPS * 4))
+    slow_down(sender, sender.max_level)
+
+    assert sender.level == sender.max_level
+    assert sender.fps == STREAM_MIN_FPS
@@ -0,0 +1,34 @@
+# tests/test_roi.py
+from object_detection.roi import _merge_regions
+
+
+def test_disjoint_regions_are_kept():
+    regions = [(0, 0, 10, 10), (20, 20, 30, 30)]
+
+    assert sorted(_merge_regions(regions)) == regions
+
+
+def test_overlapping_regions_merge_into_bounding_box():
+    assert _merge_regions([(0, 0, 10, 10), (5, 5, 20, 15)]) == [(0, 0, 20, 15)]
+
+
+def test_touching_edges_count_as_overlap():
+    assert _merge_regions([(0, 0, 10, 10), (10, 0, 20, 10)]) == [(0, 0, 20, 10)]
+
+
+def test_chain_of_overlaps_merges_completely():
+    # A và C không giao nhau, chỉ nối qua B
+    regions = [(0, 0, 10, 10), (20, 0, 30, 10), (8, 0, 22, 10)]
+
+    assert _merge_regions(regions) == [(0, 0, 30, 10)]
+
+
+def test_merged_box_overlapping_an_earlier_region_is_merged_again():
+    # Vùng cuối được xét trước: không giao A, gộp với B thành box giao A, cần thêm một lượt
+    regions = [(0, 0, 10, 10), (5, 5, 25, 8), (20, 0, 30, 10)]
+
+    assert _merge_regions(regions) == [(0, 0, 30, 10)]
+
+
+def test_empty_input():
+    assert _merge_regions([]) == []
@@ -0,0 +1,32 @@
+# tests/test_transcoder.py
+import threading
+
+from recording.transcoder import IdleTranscoder
+
+
+def test_deleted_clip_does_not_stop_the_transcoder(tmp_path, monkeypatch):
+    done = threading.Event()
+    transcoded = []
+
+    def fake_transcode(self, source, output):
+        with open(output, "wb") as f:
+            f.write(b"mp4")
+        if source.endswith("deleted.avi"):
+            # Clip bị xoá qua API trong lúc chuyển mã
+            (tmp_path / "deleted.avi").unlink()
+        return True
+
+    def on_transcoded(cam_id, source, output):
+        transcoded.append(source)
+        done.set()
+
+    monkeypatch.setattr(IdleTranscoder, "_transcode", fake_transcode)
+    transcoder = IdleTranscoder(on_transcoded, idle_seconds=0)
+    for name in ("deleted.avi", "kept.avi"):
+        (tmp_path / name).write_bytes(b"avi")
+        transcoder.submit("cam", str(tmp_path / name))
+
+    assert done.wait(5)
+    assert transcoder.thread.is_alive()
+    assert transcoded == [str(tmp_path / "kept.avi")]
+    assert not (tmp_path / "deleted.mp4").exists()
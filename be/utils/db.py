@@ -0,0 +1,95 @@
+# utils/db.py
+from urllib.parse import urlparse
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError
+
+from config import (
+    MONGO_URI,
+    DB_NAME,
+    COLLECTION_CAMERAS,
+    COLLECTION_EVENTS,
+    COLLECTION_ROOMS,
+    COLLECTION_CLIPS,
+    MONGO_POOL_SIZE,
+    MONGO_TIMEOUT_MS,
+)
+
+# Client bất đồng bộ dùng chung cho mọi handler REST trong tiến trình. Các luồng nền
+# (event sink, ghi danh mục clip, chuyển mã) vẫn dùng client đồng bộ trong utils/logger.py.
+_client = None
+
+
+def get_client() -> AsyncMongoClient:
+    """Client tạo lười ở lần gọi đầu và gắn với event loop của server.
+
+    `timeoutMS` áp cho từng thao tác (gồm cả chọn server và chờ kết nối rảnh trong pool),
+    nên MongoDB chậm hay mất kết nối thì handler báo lỗi thay vì treo; cần hạn khác
+    cho một lời gọi thì bọc nó trong `pymongo.timeout(giây)`.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncMongoClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_POOL_SIZE,
+            timeoutMS=MONGO_TIMEOUT_MS,
+        )
+    return _client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def cameras():
+    return get_db()[COLLECTION_CAMERAS]
+
+
+def events():
+    return get_db()[COLLECTION_EVENTS]
+
+
+def rooms():
+    return get_db()[COLLECTION_ROOMS]
+
+
+def clips():
+    return get_db()[COLLECTION_CLIPS]
+
+
+async def close():
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.close()
+
+
+async def camera_metadata(cam_id: str) -> dict:
+    """Tên camera (theo host:port của URL), tên và id phòng dùng để đặt thư mục clip.
+
+    Không tra được (id sai, camera đã xoá, MongoDB lỗi) thì trả về tên mặc định.
+    """
+    try:
+        camera_doc = await cameras().find_one({"_id": ObjectId(cam_id)})
+        if not camera_doc:
+            raise ValueError(f"Không tìm thấy camera với ID: {cam_id}")
+
+        parsed_url = urlparse(camera_doc.get("url", ""))
+        hostname = parsed_url.hostname or "unknown_host"
+        port = parsed_url.port or ""
+        camera_name = f"camera_{hostname.replace('.', '_')}_{port}".strip("_")
+
+        room_name = "unknown_room"
+        room_id = camera_doc.get("room_id")
+        if room_id:
+            room_doc = await rooms().find_one({"_id": room_id}, {"name": 1})
+            if room_doc:
+                room_name = room_doc.get("name", "unknown_room").replace(" ", "_")
+    except (PyMongoError, InvalidId, ValueError, TypeError) as e:
+        print(f"[ERROR] Lỗi lấy metadata camera: {e}")
+        return {"camera_name": f"camera_{cam_id[:6]}", "room_name": "unknown_room", "room_id": None}
+
+    print(f"[INFO] 🎥 Video recorder metadata - Camera: {camera_name}, Room: {room_name}")
+    return {"camera_name": camera_name, "room_name": room_name, "room_id": room_id}
@@ -0,0 +1,238 @@
+# utils/event_sink.py
+import os
+import queue
+import threading
+import time
+
+import pymongo
+from bson import ObjectId, json_util, errors
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from config import (
+    EVENT_QUEUE_SIZE,
+    EVENT_BATCH_SIZE,
+    EVENT_FLUSH_INTERVAL,
+    EVENT_ROOM_CACHE_TTL,
+    EVENT_SPILL_PATH,
+    EVENT_SPILL_RETRY,
+    MONGO_TIMEOUT_MS,
+)
+
+_DUPLICATE_KEY = 11000
+_UPSERT = "$upsert"  # đánh dấu thao tác cập nhật trong hàng đợi / file tạm
+
+
+class EventSink:
+    """Ghi sự kiện vào MongoDB theo lô trên một luồng nền.
+
+    `submit()` chỉ đẩy document vào hàng đợi có giới hạn nên luồng detection không bao giờ
+    chờ MongoDB. Luồng nền tra room_id của camera qua cache trong bộ nhớ, gom lô và ghi
+    bằng insert_many khi đủ `batch_size` sự kiện hoặc sự kiện cũ nhất đã chờ `flush_interval`.
+    MongoDB lỗi (hoặc hàng đợi đầy) thì sự kiện được ghi tạm ra file JSONL và được đẩy
+    lại khi kết nối ổn; `_id` sinh sẵn nên ghi lại không tạo bản trùng.
+    Ngoài sự kiện mới, sink còn nhận cập nhật tại chỗ (`submit_upsert`) cho document
+    sự cố; các cập nhật này phải giao hoán vì lô được ghi không theo thứ tự.
+    """
+
+    def __init__(self, events, cameras, batch_size: int = EVENT_BATCH_SIZE,
+                 flush_interval: float = EVENT_FLUSH_INTERVAL, queue_size: int = EVENT_QUEUE_SIZE,
+                 spill_path: str = EVENT_SPILL_PATH, room_ttl: float = EVENT_ROOM_CACHE_TTL,
+                 timeout: float = MONGO_TIMEOUT_MS / 1000):
+        self.events = events
+        self.cameras = cameras
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.room_ttl = room_ttl
+        self.timeout = timeout  # giây tối đa cho mỗi lần ghi lô / tra phòng, MongoDB treo thì ghi tạm ra file
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._rooms = {}  # camera_id -> (room_id, hết hạn lúc)
+        self._rooms_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._last_replay = 0.0
+        self._closed = threading.Event()
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "spilled": 0, "replayed": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+        self.thread.start()
+
+    def _count(self, name: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def submit(self, event: dict):
+        """Đưa sự kiện vào hàng đợi, không chặn. Thiếu `room_id` thì luồng nền tự tra."""
+        # Sinh _id trước để ghi lại từ file tạm không tạo bản trùng
+        if _UPSERT not in event:
+            event.setdefault("_id", ObjectId())
+        try:
+            self.queue.put_nowait(event)
+            self._count("queued")
+        except queue.Full:
+            self._spill([event])
+
+    def submit_upsert(self, doc_id, update: dict):
+        """Cập nhật (hoặc tạo) document `doc_id` theo lô, không chặn.
+
+        Có `camera_id` trong `$setOnInsert` mà thiếu `room_id` thì luồng nền tự tra.
+        """
+        self.submit({_UPSERT: {"_id": doc_id, "update": update}})
+
+    def invalidate_camera(self, camera_id):
+        with self._rooms_lock:
+            self._rooms.pop(str(camera_id), None)
+
+    def _room_for(self, camera_id):
+        key = str(camera_id)
+        now = time.monotonic()
+        with self._rooms_lock:
+            cached = self._rooms.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        try:
+            with pymongo.timeout(self.timeout):
+                camera = self.cameras.find_one({"_id": ObjectId(camera_id)}, {"room_id": 1})
+        except (errors.InvalidId, TypeError):
+            print(f"[⚠️] Không phải ObjectId hợp lệ: {camera_id}")
+            camera = None
+        except PyMongoError as e:
+            # Không tra được thì dùng tạm giá trị cũ (nếu có)
+            print(f"[WARNING] ⚠️ Không tra được phòng của camera {camera_id}: {e}")
+            return cached[0] if cached is not None else None
+
+        room_id = camera.get("room_id") if camera else None
+        room_id = str(room_id) if room_id else None
+        with self._rooms_lock:
+            self._rooms[key] = (room_id, now + self.room_ttl)
+        return room_id
+
+    def _collect_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _operation(doc):
+        upsert = doc.get(_UPSERT)
+        if upsert is None:
+            return InsertOne(doc)
+        return UpdateOne({"_id": upsert["_id"]}, upsert["update"], upsert=True)
+
+    def _insert(self, docs) -> list:
+        """Ghi cả lô không theo thứ tự; trả về các document chưa ghi được."""
+        try:
+            with pymongo.timeout(self.timeout):
+                if all(_UPSERT not in doc for doc in docs):
+                    self.events.insert_many(docs, ordered=False)
+                else:
+                    self.events.bulk_write([self._operation(doc) for doc in docs], ordered=False)
+            return []
+        except BulkWriteError as e:
+            # Trùng _id nghĩa là đã ghi từ trước (ví dụ lần ghi lại từ file tạm)
+            failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != _DUPLICATE_KEY}
+            return [doc for index, doc in enumerate(docs) if index in failed]
+        except PyMongoError as e:
+            print(f"[ERROR] Lỗi ghi {len(docs)} sự kiện vào MongoDB: {e}")
+            return docs
+
+    def _fill_rooms(self, docs):
+        # Sự kiện ghi tạm khi hàng đợi đầy (hoặc lúc MongoDB lỗi) chưa có room_id: tra lại khi ghi
+        for event in docs:
+            if _UPSERT in event:
+                fields = event[_UPSERT]["update"].get("$setOnInsert")
+                if fields and "camera_id" in fields and fields.get("room_id") is None:
+                    fields["room_id"] = self._room_for(fields["camera_id"])
+            elif event.get("room_id") is None:
+                event["room_id"] = self._room_for(event.get("camera_id"))
+
+    def _flush(self, batch):
+        self._fill_rooms(batch)
+        failed = self._insert(batch)
+        self._count("batches")
+        self._count("written", len(batch) - len(failed))
+        if failed:
+            self._count("errors")
+            self._spill(failed)
+
+    def _spill(self, docs):
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                for doc in docs:
+                    f.write(json_util.dumps(doc) + "\n")
+            self._count("spilled", len(docs))
+            print(f"[WARNING] ⚠️ Ghi tạm {len(docs)} sự kiện ra {self.spill_path}")
+        except OSError as e:
+            print(f"[ERROR] ❌ Mất {len(docs)} sự kiện, không ghi được file tạm: {e}")
+
+    def _replay_spill(self):
+        self._last_replay = time.monotonic()
+        if not os.path.exists(self.spill_path):
+            return
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            # Đổi tên trước để sự kiện mới bị ghi tạm trong lúc này không lẫn vào
+            if not os.path.exists(replay_path):
+                os.replace(self.spill_path, replay_path)
+
+        docs = []
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    docs.append(json_util.loads(line))
+                except ValueError:
+                    print(f"[WARNING] ⚠️ Bỏ dòng hỏng trong {replay_path}")
+
+        self._fill_rooms(docs)
+        failed = []
+        for start in range(0, len(docs), self.batch_size):
+            failed.extend(self._insert(docs[start:start + self.batch_size]))
+        os.remove(replay_path)
+        self._count("replayed", len(docs) - len(failed))
+        if failed:
+            self._spill(failed)
+        else:
+            print(f"[INFO] ✅ Đã ghi lại {len(docs)} sự kiện từ file tạm")
+
+    def _run(self):
+        while not (self._closed.is_set() and self.queue.empty()):
+            batch = self._collect_batch()
+            if batch:
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    print(f"[ERROR] Lỗi trong event sink: {e}")
+                    self._spill(batch)
+            if time.monotonic() - self._last_replay >= EVENT_SPILL_RETRY and not self._closed.is_set():
+                try:
+                    self._replay_spill()
+                except Exception as e:
+                    print(f"[ERROR] Lỗi ghi lại sự kiện từ file tạm: {e}")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self.queue.qsize()
+        return stats
+
+    def close(self, timeout: float = 10.0):
+        # Ghi nốt các sự kiện còn trong hàng đợi trước khi tắt
+        self._closed.set()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print(f"[WARNING] ⚠️ Event sink chưa ghi xong, còn {self.queue.qsize()} sự kiện")
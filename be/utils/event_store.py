@@ -0,0 +1,132 @@
+# utils/event_store.py
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+# Trường thời gian của sự kiện / sự cố, lưu dạng datetime (trước đây là chuỗi ISO)
+DATETIME_FIELDS = ("timestamp", "first_seen", "last_seen", "closed_at")
+
+MAX_PAGE_SIZE = 500
+
+# Chỉ sự kiện gắn với clip (abnormal_start / abnormal_end) mới có video_path;
+# index riêng phần cho chúng để xoá / cập nhật theo clip không phải quét các sự cố
+CLIP_EVENT = {"video_path": {"$gt": ""}}
+
+
+def drop_replaced_indexes(collection, names):
+    """Xoá các index cũ đã được thay bằng index mới tên khác (bỏ qua nếu không có)."""
+    existing = collection.index_information()
+    for name in names:
+        if name in existing:
+            collection.drop_index(name)
+
+
+def ensure_event_indexes(events):
+    """Tạo index cho collection events (bỏ qua nếu đã có)."""
+    # Trang sắp xếp theo (timestamp, _id): có _id trong index thì MongoDB đọc thẳng theo thứ tự
+    # index, không phải sắp xếp trong bộ nhớ mọi sự kiện của camera / phòng
+    events.create_index([("camera_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="camera_time_id")
+    events.create_index([("room_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="room_time_id")
+    drop_replaced_indexes(events, ["camera_time", "room_time"])
+    events.create_index([("video_path", ASCENDING)], name="video_path", partialFilterExpression=CLIP_EVENT)
+
+
+def migrate_string_timestamps(events) -> int:
+    """Đổi các trường thời gian còn là chuỗi ISO sang datetime, chạy hoàn toàn trên server."""
+    converted = 0
+    for field in DATETIME_FIELDS:
+        result = events.update_many(
+            {field: {"$type": "string"}},
+            [{"$set": {field: {"$dateFromString": {
+                # isoformat() có tới micro giây, $dateFromString chỉ nhận tới mili giây
+                "dateString": {"$substrCP": [f"${field}", 0, 23]},
+                "onError": f"${field}",
+            }}}}],
+        )
+        converted += result.modified_count
+    return converted
+
+
+def parse_time(value: str):
+    """Chuỗi ISO 8601 từ query -> datetime giờ địa phương không kèm múi giờ (như khi ghi)."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def time_range(since=None, until=None) -> dict:
+    query = {}
+    if since is not None:
+        query["$gte"] = since
+    if until is not None:
+        query["$lt"] = until
+    return query
+
+
+def encode_cursor(timestamp: datetime, key) -> str:
+    raw = json.dumps({"t": timestamp.isoformat(), "k": str(key)})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Trả về (timestamp, key); ValueError nếu cursor hỏng."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(data["t"]), data["k"]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Cursor không hợp lệ: {e}") from e
+
+
+def event_filter(camera_id=None, room_id=None, event_types=None, since=None, until=None) -> dict:
+    query = {}
+    if camera_id is not None:
+        query["camera_id"] = ObjectId(camera_id)
+    if room_id is not None:
+        query["room_id"] = str(room_id)
+    if event_types:
+        query["object"] = {"$in": list(event_types)}
+    if since is not None or until is not None:
+        query["timestamp"] = time_range(since, until)
+    return query
+
+
+def after_cursor(time_field: str, key_field: str, cursor) -> dict:
+    # Sắp xếp giảm dần theo (thời gian, khoá): trang sau là các bản ghi nhỏ hơn cursor
+    timestamp, key = cursor
+    return {"$or": [
+        {time_field: {"$lt": timestamp}},
+        {time_field: timestamp, key_field: {"$lt": key}},
+    ]}
+
+
+async def find_events(events, query: dict, limit: int, cursor: str = None):
+    """Một trang sự kiện mới nhất trước; trả về (documents, next_cursor)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        timestamp, key = decode_cursor(cursor)
+        if not ObjectId.is_valid(key):
+            raise ValueError("Cursor không hợp lệ")
+        query = {"$and": [query, after_cursor("timestamp", "_id", (timestamp, ObjectId(key)))]}
+    docs = await events.find(query).sort([("timestamp", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1).to_list()
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["timestamp"], docs[-1]["_id"])
+    return docs, next_cursor
+
+
+def serialize_event(doc: dict) -> dict:
+    out = {}
+    for key, value in doc.items():
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        out["id" if key == "_id" else key] = value
+    return out
@@ -0,0 +1,31 @@
+# utils/frame.py
+import numpy as np
+
+from utils import metrics
+
+
+class Frame:
+    """Một frame đã giải mã, bất biến, dùng chung (read-only) cho detect / stream / record.
+
+    Các luồng chỉ giữ tham chiếu tới cùng một đối tượng (Python tự đếm tham chiếu);
+    ai cần vẽ lên ảnh phải gọi `writable_copy()`. Mỗi bản sao như vậy được đếm vào
+    metric `frame_copies` của camera.
+    """
+
+    __slots__ = ("cam_id", "image", "seq", "timestamp", "jpeg")
+
+    def __init__(self, cam_id: str, image: np.ndarray, seq: int, timestamp: float, jpeg: bytes = None):
+        image.setflags(write=False)
+        self.cam_id = cam_id
+        self.image = image
+        self.seq = seq
+        self.timestamp = timestamp
+        self.jpeg = jpeg  # bytes JPEG gốc từ client (nếu có)
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def writable_copy(self) -> np.ndarray:
+        metrics.incr(self.cam_id, "frame_copies")
+        return self.image.copy()
@@ -6,12 +6,15 @@ from config import VIDEO_CLIP_DURATION, VIDEO_OUTPUT_DIR, FPS
 
 
 def draw_boxes(frame, boxes, names=None):
+    # names: bảng nhãn theo class id (ClassTable.labels) hoặc dict names của mô hình
     if boxes is None:
         return frame
-    for i in range(len(boxes.xyxy)):
-        x1, y1, x2, y2 = map(int, boxes.xyxy[i])
-        conf = float(boxes.conf[i])
-        cls_id = int(boxes.cls[i])
+    if hasattr(boxes, "cpu"):
+        boxes = boxes.cpu().numpy()
+    xyxy = boxes.xyxy.astype(int).tolist()
+    confs = boxes.conf.tolist()
+    cls_ids = boxes.cls.astype(int).tolist()
+    for (x1, y1, x2, y2), conf, cls_id in zip(xyxy, confs, cls_ids):
         label = names[cls_id] if names else str(cls_id)
         label_text = f"{label} {conf:.2f}"
 
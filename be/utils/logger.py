@@ -1,23 +1,33 @@
 # utils/logger.py
 import logging
+import threading
 from datetime import datetime
 from pymongo import MongoClient
-from bson import ObjectId
+from bson import ObjectId, errors
 
 from config import (
     MONGO_URI,
     DB_NAME,
     COLLECTION_EVENTS,
     COLLECTION_CAMERAS,
-    COLLECTION_ROOMS
+    COLLECTION_ROOMS,
+    COLLECTION_CLIPS,
+    MONGO_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
 )
+from utils.event_sink import EventSink
 
-# Thiết lập MongoDB
-client = MongoClient(MONGO_URI)
+# Thiết lập MongoDB (không đặt timeoutMS chung: tạo index / chuyển dữ liệu lúc khởi động có thể lâu)
+client = MongoClient(
+    MONGO_URI,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_TIMEOUT_MS,
+)
 db = client[DB_NAME]
 event_collection = db[COLLECTION_EVENTS]
 camera_collection = db[COLLECTION_CAMERAS]
 room_collection = db[COLLECTION_ROOMS]
+clip_collection = db[COLLECTION_CLIPS]
 
 # Logger setup
 def setup_logger(name="app"):
@@ -43,43 +53,43 @@ def save_camera(url: str) -> ObjectId:
     return result.inserted_id
 
 
-# utils/logger.py
-from bson import ObjectId, errors
+_event_sink = None
+_event_sink_lock = threading.Lock()
 
-def log_event(object_name, confidence, camera_id, video_path):
-    from config import DB_NAME, COLLECTION_EVENTS, MONGO_URI
-    from pymongo import MongoClient
-    from datetime import datetime
 
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    events = db[COLLECTION_EVENTS]
-    camera_collection = db[COLLECTION_CAMERAS]
-    room_collection = db[COLLECTION_ROOMS]
+def get_event_sink() -> EventSink:
+    # Một sink cho mỗi tiến trình, dùng chung client MongoDB của module
+    global _event_sink
+    with _event_sink_lock:
+        if _event_sink is None:
+            _event_sink = EventSink(event_collection, camera_collection)
+        return _event_sink
 
-    # Ensure video_path is string
-    if not isinstance(video_path, str):
-        video_path = str(video_path)
 
-    # Thử truy vấn room_id từ camera nếu camera_id hợp lệ
-    room_id = None
+def camera_ref(camera_id):
+    # camera_id lưu dạng ObjectId; id không hợp lệ thì giữ nguyên chuỗi
     try:
-        camera_obj = camera_collection.find_one({"_id": ObjectId(camera_id)})
-        if camera_obj:
-            room_id = camera_obj.get("room_id")
+        return ObjectId(camera_id)
     except (errors.InvalidId, TypeError):
         print(f"[⚠️] Không phải ObjectId hợp lệ: {camera_id}")
+        return camera_id
+
+
+def log_event(object_name, confidence, camera_id, video_path=""):
+    # Không chạm MongoDB ở đây: sự kiện được ghi theo lô trên luồng nền của EventSink
+    # Ensure video_path is string
+    if not isinstance(video_path, str):
+        video_path = str(video_path)
 
     event = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),
         "object": object_name,
         "confidence": round(confidence, 2),
-        "camera_id": ObjectId(camera_id),
+        "camera_id": camera_ref(camera_id),
         "video_path": video_path,
-        "room_id": str(room_id) if room_id else None,
     }
 
     print(f"[INFO] 🎞 Clip lưu tại: {video_path}")
     print(f"[INFO] ✅ Ghi log sự kiện: {object_name} ({confidence})")
 
-    events.insert_one(event)
+    get_event_sink().submit(event)
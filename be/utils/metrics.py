@@ -0,0 +1,32 @@
+# utils/metrics.py
+import threading
+from collections import defaultdict
+
+# Bộ đếm đơn giản theo camera, dùng cho endpoint /metrics
+_lock = threading.Lock()
+_counters = defaultdict(lambda: defaultdict(int))
+
+
+def incr(cam_id: str, name: str, value=1):
+    with _lock:
+        _counters[cam_id][name] += value
+
+
+def set_value(cam_id: str, name: str, value):
+    with _lock:
+        _counters[cam_id][name] = value
+
+
+def get_camera(cam_id: str) -> dict:
+    with _lock:
+        return dict(_counters.get(cam_id, {}))
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {cam_id: dict(values) for cam_id, values in _counters.items()}
+
+
+def reset(cam_id: str):
+    with _lock:
+        _counters.pop(cam_id, None)
@@ -24,8 +24,11 @@ import org.bytedeco.javacv.FFmpegFrameGrabber;
 import org.bytedeco.javacv.Frame;
 import org.bytedeco.javacv.Java2DFrameConverter;
 
+import java.util.Locale;
+
 import com.example.frontend.service.VideoWebSocketClient;
 
+import javafx.animation.PauseTransition;
 import javafx.application.Platform;
 import javafx.embed.swing.SwingFXUtils;
 import javafx.geometry.Pos;
@@ -38,6 +41,7 @@ import javafx.scene.layout.StackPane;
 import javafx.scene.paint.Color;
 import javafx.scene.text.Font;
 import javafx.stage.Stage;
+import javafx.util.Duration;
 
 public class YoloView {
 
@@ -74,8 +78,16 @@ public class YoloView {
         stage.setScene(scene);
 
         processor = new VideoProcessor(url, camId, imageView, statusLabel);
+        // Chỉ xin server ảnh vừa khung đang hiển thị (thu nhỏ sẵn phía server)
+        processor.setViewSize((int) scene.getWidth(), (int) scene.getHeight());
         processor.start();
 
+        // Đổi kích thước cửa sổ: chờ người dùng kéo xong rồi mới gửi profile mới
+        PauseTransition resizeDebounce = new PauseTransition(Duration.millis(300));
+        resizeDebounce.setOnFinished(e -> processor.setViewSize((int) scene.getWidth(), (int) scene.getHeight()));
+        scene.widthProperty().addListener((obs, oldValue, newValue) -> resizeDebounce.playFromStart());
+        scene.heightProperty().addListener((obs, oldValue, newValue) -> resizeDebounce.playFromStart());
+
         stage.setOnCloseRequest(event -> {
             processor.stop();
             stage.close();
@@ -125,7 +137,10 @@ public class YoloView {
         private volatile boolean isRunning = false;
         private volatile boolean isPaused = false;
         private FFmpegFrameGrabber grabber;
-        private VideoWebSocketClient wsClient;
+        private volatile VideoWebSocketClient wsClient;
+        private volatile int viewWidth;
+        private volatile int viewHeight;
+        private volatile double streamFps;
 
         VideoProcessor(String url, String camId, ImageView iv, Label lb) {
             this.url = url;
@@ -170,6 +185,15 @@ public class YoloView {
             return isPaused;
         }
 
+        void setViewSize(int width, int height) {
+            viewWidth = width;
+            viewHeight = height;
+            VideoWebSocketClient client = wsClient;
+            if (client != null) {
+                client.sendProfile(width, height, 0, streamFps);
+            }
+        }
+
         void seekForward(int seconds) {
             try {
                 long targetTimestamp = grabber.getTimestamp() + seconds * 1_000_000L;
@@ -203,10 +227,16 @@ public class YoloView {
                 // Sử dụng nano giây để có độ chính xác cao hơn
                 long frameDurationNanos = (long) (1_000_000_000.0 / fps);
 
-                wsClient = new VideoWebSocketClient(img -> {
+                streamFps = fps;
+
+                VideoWebSocketClient client = new VideoWebSocketClient(img -> {
                     Platform.runLater(() -> imageView.setImage(SwingFXUtils.toFXImage(img, null)));
                 });
-                wsClient.connect("ws://localhost:8000/ws/video?cam_id=" + camId);
+                // Profile ban đầu theo khung hiển thị và fps nguồn; không cần nhận nhanh hơn nguồn
+                client.connect(String.format(Locale.ROOT,
+                        "ws://localhost:8000/ws/video?cam_id=%s&width=%d&height=%d&fps=%s",
+                        camId, viewWidth, viewHeight, fps));
+                wsClient = client;
 
                 updateStatus("Streaming...");
 
@@ -33,7 +33,16 @@ public class VideoWebSocketClient extends WebSocketListener {
             webSocket.send(ByteString.of(jpegBytes));
         }
     }
-    
+
+    // Yêu cầu server gửi ảnh thu nhỏ / giảm chất lượng / giới hạn fps (0 = giữ mặc định)
+    public void sendProfile(int width, int height, int quality, double fps) {
+        if (webSocket != null) {
+            webSocket.send(String.format(java.util.Locale.ROOT,
+                    "{\"type\":\"profile\",\"width\":%d,\"height\":%d,\"quality\":%d,\"fps\":%s}",
+                    width, height, quality, fps));
+        }
+    }
+
     @Override
     public void onMessage(WebSocket webSocket, ByteString bytes) {
         try {